@@ -3,11 +3,37 @@
 """
 Init-fil för app-paketet.
 Gör det möjligt att importera modeller, dataläsare, loggning och analysfunktioner.
+
+Namnen nedan laddas först vid användning (PEP 562), så att t.ex. `from app.plots import ...`
+inte drar in pulp och pystoned/pyomo via paketets __init__.
 """
 
+import importlib
+
 # Gör centrala funktioner lättåtkomliga (valfritt)
-from .data_loader import load_data
-from .dea_model import run_dea_model
-from .pystoned_model import run_pystoned_model
-from .run_logger import save_run, load_run, list_runs
+_LATA_NAMN = {
+    "load_data": ".data_loader",
+    "load_asset_register": ".data_loader",
+    "run_dea_model": ".dea_model",
+    "run_pystoned_model": ".pystoned_model",
+    "run_partial_frontier_model": ".partial_frontier",
+    "run_kapitalbas": ".kapitalbas",
+    "run_peer_influence": ".peer_influence",
+    "save_run": ".run_logger",
+    "load_run": ".run_logger",
+    "list_runs": ".run_logger",
+}
+
+__all__ = list(_LATA_NAMN)
+
+
+def __getattr__(namn):
+    if namn in _LATA_NAMN:
+        värde = getattr(importlib.import_module(_LATA_NAMN[namn], __name__), namn)
+        globals()[namn] = värde
+        return värde
+    raise AttributeError(f"module {__name__!r} has no attribute {namn!r}")
+
 
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
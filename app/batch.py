@@ -0,0 +1,251 @@
+# app/batch.py
+
+"""
+Huvudlös batchkörning av modellerna för schemalagd produktion (t.ex. cron).
+
+Läser Data_modeller.xlsx (eller en ögonblicksbild) och kör de körningar som
+anges i en YAML-fil. Varje körning sparas i run store precis som från
+dashboardet, så att dashboardet bara behöver läsa färdiga resultat.
+
+Exempel på specifikation:
+
+    data: data/Data_modeller.xlsx     # valfritt, kan ersättas med --data
+    körningar:
+      - namn: dea_crs
+        modell: DEA
+        parametrar:
+          rts: crs
+      - namn: dea_vrs
+        modell: DEA
+        parametrar:
+          rts: vrs
+          output_cols: [CU, MW, NS]
+      - namn: stoned
+        modell: PyStoned
+        parametrar:
+          fun: cost
+          cet: addi
+      - namn: order_m
+        modell: PartiellFront
+        parametrar:
+          metod: order-m
+          m: 25
+      - namn: sfa
+        modell: SFA
+
+DEA, PyStoned och PartiellFront körs parallellt i en processpool. SFA körs en i taget i
+huvudprocessen eftersom R-skriptet använder fasta filer i output/.
+
+Kör med:
+    python -m app.batch körningar.yaml --jobb 4
+
+Returkoder:
+    0  alla körningar lyckades
+    1  minst en körning misslyckades
+    2  ogiltig specifikation eller data som inte kunde läsas
+"""
+
+import sys
+import time
+import inspect
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml # type: ignore
+
+DATA_FILE = "data/Data_modeller.xlsx"
+
+OK = 0
+FEL_KÖRNING = 1
+FEL_SPECIFIKATION = 2
+
+# modell → (modul, funktion); importeras först i den process som kör modellen
+MODELLER = {
+    "DEA": ("app.dea_model", "run_dea_model"),
+    "PyStoned": ("app.pystoned_model", "run_pystoned_model"),
+    "PartiellFront": ("app.partial_frontier", "run_partial_frontier_model"),
+    "SFA": ("Gammalt.sfa_model", "run_sfa_model"),
+}
+
+# Modeller som inte kan köras samtidigt (delade arbetsfiler)
+SERIELLA = {"SFA"}
+
+
+class SpecifikationsFel(ValueError):
+    """Batchspecifikationen är ogiltig."""
+
+
+def _modellfunktion(modell: str):
+    import importlib
+
+    modul, funktion = MODELLER[modell]
+    return getattr(importlib.import_module(modul), funktion)
+
+
+def läs_specifikation(sökväg: str) -> dict:
+    with open(sökväg) as f:
+        spec = yaml.safe_load(f) or {}
+    if not isinstance(spec, dict):
+        raise SpecifikationsFel("Specifikationen ska vara en mappning med nyckeln 'körningar'.")
+
+    körningar = spec.get("körningar")
+    if not isinstance(körningar, list) or not körningar:
+        raise SpecifikationsFel("Specifikationen saknar en lista 'körningar'.")
+
+    namn_sedda = set()
+    for i, körning in enumerate(körningar):
+        if not isinstance(körning, dict):
+            raise SpecifikationsFel(f"Körning {i + 1}: förväntade en mappning med 'modell', fick {körning!r}.")
+        modell = körning.get("modell")
+        if modell not in MODELLER:
+            raise SpecifikationsFel(f"Körning {i + 1}: okänd modell {modell!r}. Välj bland {list(MODELLER)}.")
+        körning["namn"] = str(körning.get("namn") or f"{modell.lower()}_{i + 1}")
+        if körning["namn"] in namn_sedda:
+            raise SpecifikationsFel(f"Körningsnamnet {körning['namn']!r} förekommer flera gånger.")
+        namn_sedda.add(körning["namn"])
+
+        parametrar = körning.setdefault("parametrar", {}) or {}
+        if not isinstance(parametrar, dict):
+            raise SpecifikationsFel(f"Körning {körning['namn']!r}: 'parametrar' ska vara en mappning.")
+        körning["parametrar"] = parametrar
+        # Kontrollera parameternamnen mot modellfunktionen innan något körs
+        tillåtna = set(inspect.signature(_modellfunktion(modell)).parameters) - {"df"}
+        okända = set(parametrar) - tillåtna
+        if okända:
+            raise SpecifikationsFel(
+                f"Körning {körning['namn']!r}: okända parametrar {sorted(okända)} för {modell}. "
+                f"Tillåtna: {sorted(tillåtna)}."
+            )
+    return spec
+
+
+_data_cache = {}
+
+
+def _läs_data(data_fil: str):
+    # En inläsning per arbetsprocess, oavsett hur många körningar den tar
+    if data_fil not in _data_cache:
+        from app.data_loader import load_data
+        _data_cache[data_fil] = load_data(data_fil)
+    return _data_cache[data_fil]
+
+
+def kör_en(körning: dict, data_fil: str) -> dict:
+    """Kör en specifikation och väntar tills resultatet ligger i run store."""
+    from app.run_logger import save_run, wait_for_run
+
+    start = time.perf_counter()
+    try:
+        df = _läs_data(data_fil)
+        resultat = _modellfunktion(körning["modell"])(df, **körning["parametrar"])
+        run_id = resultat.attrs.get("run_id")
+        if run_id is None:
+            # SFA sparar inte själv
+            run_id = save_run(körning["modell"], körning["parametrar"], resultat, vänta=True)
+        else:
+            wait_for_run(run_id)
+        return {
+            "namn": körning["namn"], "modell": körning["modell"], "status": "ok",
+            "run_id": run_id, "sekunder": time.perf_counter() - start,
+            "antal_företag": len(resultat),
+        }
+    except Exception as e:
+        return {
+            "namn": körning["namn"], "modell": körning["modell"], "status": "fel",
+            "fel": f"{type(e).__name__}: {e}", "detaljer": traceback.format_exc(),
+            "sekunder": time.perf_counter() - start,
+        }
+
+
+def kör_batch(spec: dict, data_fil: str, jobb: int = None) -> list:
+    körningar = spec["körningar"]
+    parallella = [k for k in körningar if k["modell"] not in SERIELLA]
+    seriella = [k for k in körningar if k["modell"] in SERIELLA]
+    utfall = []
+
+    if parallella:
+        # spawn: arbetsprocesserna ärver inga trådar (t.ex. run store-skrivaren)
+        with ProcessPoolExecutor(max_workers=jobb, mp_context=multiprocessing.get_context("spawn")) as pool:
+            framtider = {pool.submit(kör_en, k, data_fil): k for k in parallella}
+            for framtid in as_completed(framtider):
+                resultat = framtid.result()
+                _rapportera(resultat)
+                utfall.append(resultat)
+
+    for körning in seriella:
+        resultat = kör_en(körning, data_fil)
+        _rapportera(resultat)
+        utfall.append(resultat)
+
+    # Samma ordning som i specifikationen
+    ordning = {k["namn"]: i for i, k in enumerate(körningar)}
+    return sorted(utfall, key=lambda r: ordning[r["namn"]])
+
+
+def _rapportera(resultat: dict):
+    if resultat["status"] == "ok":
+        print(f"✔ {resultat['namn']} ({resultat['modell']}) klar på {resultat['sekunder']:.1f} s → {resultat['run_id']}", flush=True)
+    else:
+        print(f"✘ {resultat['namn']} ({resultat['modell']}) misslyckades: {resultat['fel']}", file=sys.stderr, flush=True)
+
+
+def sammanfattning(utfall: list, total_tid: float) -> str:
+    bredd = max(len("Körning"), *(len(r["namn"]) for r in utfall))
+    modellbredd = max(len("Modell"), *(len(r["modell"]) for r in utfall))
+    rader = [f"{'Körning':<{bredd}}  {'Modell':<{modellbredd}}  {'Status':<6} {'Tid (s)':>8}  run_id"]
+    for r in utfall:
+        rader.append(
+            f"{r['namn']:<{bredd}}  {r['modell']:<{modellbredd}}  {r['status']:<6} {r['sekunder']:>8.1f}"
+            f"  {r.get('run_id', '–')}"
+        )
+    antal_fel = sum(r["status"] != "ok" for r in utfall)
+    rader.append(f"\n{len(utfall) - antal_fel} av {len(utfall)} körningar lyckades på {total_tid:.1f} s (väggklocka).")
+    return "\n".join(rader)
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kör modellerna enligt en YAML-specifikation och spara i run store.")
+    parser.add_argument("specifikation", help="YAML-fil med körningar")
+    parser.add_argument("--data", help=f"Indatafil (default: specifikationens 'data' eller {DATA_FILE})")
+    parser.add_argument("--jobb", type=int, default=None, help="Antal parallella processer (default: antal kärnor)")
+    parser.add_argument("--rapport", help="Skriv utfallet som YAML till denna fil")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = läs_specifikation(args.specifikation)
+        data_fil = args.data or spec.get("data") or DATA_FILE
+        _läs_data(data_fil)  # fånga fel i indata innan några processer startas
+    except (OSError, yaml.YAMLError, SpecifikationsFel, RuntimeError, ValueError) as e:
+        print(f"Fel: {e}", file=sys.stderr)
+        return FEL_SPECIFIKATION
+
+    start = time.perf_counter()
+    utfall = kör_batch(spec, data_fil, args.jobb)
+    total_tid = time.perf_counter() - start
+
+    print()
+    print(sammanfattning(utfall, total_tid))
+
+    if args.rapport:
+        with open(args.rapport, "w") as f:
+            yaml.dump({
+                "data": data_fil,
+                "total_sekunder": round(total_tid, 2),
+                "körningar": [
+                    {k: round(v, 2) if k == "sekunder" else v for k, v in r.items() if k != "detaljer"}
+                    for r in utfall
+                ],
+            }, f, allow_unicode=True, sort_keys=False)
+
+    for r in utfall:
+        if r["status"] != "ok":
+            print(f"\n--- {r['namn']} ---\n{r['detaljer']}", file=sys.stderr)
+
+    return OK if all(r["status"] == "ok" for r in utfall) else FEL_KÖRNING
+
+
+if __name__ == "__main__":
+    sys.exit(main())
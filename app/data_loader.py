@@ -1,8 +1,11 @@
 import pandas as pd
+from app.instrumentation import Mätning
 
 def load_data(filepath):
+    mätning = Mätning("load_data")
     try:
-        df = pd.read_excel(filepath, sheet_name="Körning", engine="openpyxl")
+        with mätning.steg("läs Excel"):
+            df = pd.read_excel(filepath, sheet_name="Körning", engine="openpyxl")
     except Exception as e:
         raise RuntimeError(f"Fel vid inläsning av fil: {e}")
 
@@ -18,4 +21,55 @@ def load_data(filepath):
 
     # Ingen filtrering av nollor eller NaN – låt modellerna själva hantera det
     df.reset_index(drop=True, inplace=True)
+    mätning.avsluta()
+    return df
+
+
+# === Anläggningsregister (Kapitalbas) ===
+
+ASSET_COLS = ["REId", "Normvärde", "Ålder", "Livslängd"]
+ASSET_OPTIONAL_COLS = {"Antal": 1.0, "Prisindex": 1.0}
+
+
+def load_asset_register(filepath, sheet_name="Anläggningar"):
+    """
+    Läser ett anläggningsregister kolumnvis (en rad per komponent).
+
+    Bara kolumnerna som kapitalbasberäkningen behöver läses in. Parquet och CSV
+    läses kolumnvis direkt; Excel via openpyxl med usecols. REId lagras som
+    kategori och de numeriska kolumnerna som float64, så att registret kan
+    räknas på utan att gå via Python-objekt per rad.
+    """
+    import os
+
+    mätning = Mätning("load_asset_register")
+    kolumner = ASSET_COLS + list(ASSET_OPTIONAL_COLS)
+    ändelse = os.path.splitext(str(filepath))[1].lower()
+    try:
+        with mätning.steg("läs register"):
+            if ändelse == ".parquet":
+                import pyarrow.parquet as pq
+                finns = set(pq.read_schema(filepath).names)
+                df = pd.read_parquet(filepath, columns=[c for c in kolumner if c in finns])
+            elif ändelse == ".csv":
+                df = pd.read_csv(filepath, usecols=lambda c: c in kolumner, dtype={"REId": "category"})
+            else:
+                df = pd.read_excel(filepath, sheet_name=sheet_name, engine="openpyxl",
+                                   usecols=lambda c: c in kolumner)
+    except Exception as e:
+        raise RuntimeError(f"Fel vid inläsning av anläggningsregister: {e}")
+
+    missing_cols = [col for col in ASSET_COLS if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Följande kolumner saknas i anläggningsregistret: {missing_cols}")
+
+    with mätning.steg("typkonvertering"):
+        for col, standard in ASSET_OPTIONAL_COLS.items():
+            if col not in df.columns:
+                df[col] = standard
+        df["REId"] = df["REId"].astype(str).where(df["REId"].notna()).astype("category")
+        for col in kolumner[1:]:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        df = df[kolumner].reset_index(drop=True)
+    mätning.avsluta()
     return df
@@ -1,7 +1,19 @@
 import pandas as pd
 import numpy as np
+import time
 from pulp import LpProblem, LpVariable, LpMinimize, lpSum, value
 from app.run_logger import save_run
+from app.instrumentation import Mätning
+
+def effkrav_proc(theta, trunkering_min: float = 0.162416, trunkering_max: float = 0.3):
+    """
+    Årligt effektiviseringskrav från (super)effektivitet enligt EI:s metod.
+
+    Fungerar för både skalärer och numpy-arrayer.
+    """
+    revred = 1 - np.minimum(theta, 1)
+    revred_compress = np.clip(revred, trunkering_min, trunkering_max)
+    return ((1 + revred_compress / 4) ** 0.25) - 1
 
 def run_dea_model(
     df: pd.DataFrame,
@@ -14,21 +26,30 @@ def run_dea_model(
 ) -> pd.DataFrame:
     """
     Kör DEA med eller utan outlierfiltrering enligt EI:s metod.
+
+    Tid per steg (LP-bygge, lösare, outlierdetektering m.m.) sparas i körningens
+    metadata under "prestanda" och i df.attrs["prestanda"].
     """
-    df = df.copy()
-    df[input_cols] = df[input_cols].apply(pd.to_numeric, errors="coerce")
+    mätning = Mätning("DEA")
+    with mätning.steg("förbehandling"):
+        df = df.copy()
+        df[input_cols] = df[input_cols].apply(pd.to_numeric, errors="coerce")
 
-    inputs = df[input_cols].values
-    outputs = df[output_cols].values
+        inputs = df[input_cols].values
+        outputs = df[output_cols].values
 
-    def run_super_efficiency_dea(inputs, outputs, rts):
+    def run_super_efficiency_dea(inputs, outputs, rts, etapp, peers=None):
+        # peers: lista som fylls med (i, j, λ_j) för λ_j > 0 i varje lösning
         n = len(inputs)
+        bygg_tid = 0.0
+        lös_tid = 0.0
         eff = []
         for i in range(n):
             if np.any(np.isnan(inputs[i])) or np.any(np.isnan(outputs[i])):
                 eff.append("OUTLIER")
                 continue
 
+            t0 = time.perf_counter()
             model = LpProblem(name=f"DEA_SUPER_DMUi_{i}", sense=LpMinimize)
             theta = LpVariable("theta", lowBound=0)
             lambdas = [LpVariable(f"lambda_{j}", lowBound=0) for j in range(n)]
@@ -41,33 +62,60 @@ def run_dea_model(
                 model += lpSum(lambdas[j] * inputs[j][k] for j in range(n) if j != i) <= theta * inputs[i][k]
             if rts == "vrs":
                 model += lpSum(lambdas[j] for j in range(n) if j != i) == 1
+            t1 = time.perf_counter()
+            bygg_tid += t1 - t0
 
             try:
                 model.solve()
                 score = value(theta)
                 if score is None or np.isnan(score):
                     score = "OUTLIER"
+                elif peers is not None and model.status == 1:
+                    for j in range(n):
+                        if j != i:
+                            vikt = lambdas[j].varValue
+                            if vikt is not None and vikt > 1e-9:
+                                peers.append((i, j, vikt))
             except:
                 score = "OUTLIER"
+            lös_tid += time.perf_counter() - t1
 
             eff.append(score)
+
+        mätning.lägg_till(f"LP-bygge ({etapp})", bygg_tid)
+        mätning.lägg_till(f"lösare ({etapp})", lös_tid)
         return eff
 
     # === Första körning ===
-    eff1 = run_super_efficiency_dea(inputs, outputs, rts)
+    eff1 = run_super_efficiency_dea(inputs, outputs, rts, "körning 1")
     df["supereff1"] = eff1
 
-    theta_valid = [e for e in eff1 if isinstance(e, (int, float)) and not np.isnan(e)]
-    q75 = np.percentile(theta_valid, 75)
-    q25 = np.percentile(theta_valid, 25)
-    threshold = q75 + 2 * (q75 - q25)
-    df["is_outlier"] = [e > threshold if isinstance(e, (int, float)) else True for e in eff1]
+    with mätning.steg("outlierdetektering"):
+        theta_valid = [e for e in eff1 if isinstance(e, (int, float)) and not np.isnan(e)]
+        q75 = np.percentile(theta_valid, 75)
+        q25 = np.percentile(theta_valid, 25)
+        threshold = q75 + 2 * (q75 - q25)
+        df["is_outlier"] = [e > threshold if isinstance(e, (int, float)) else True for e in eff1]
 
     # === Andra körning (exkludera outliers) ===
     df_clean = df[~df["is_outlier"]].reset_index(drop=True)
     inputs_clean = df_clean[input_cols].values
     outputs_clean = df_clean[output_cols].values
-    eff2 = run_super_efficiency_dea(inputs_clean, outputs_clean, rts)
+    peers_clean = []
+    eff2 = run_super_efficiency_dea(inputs_clean, outputs_clean, rts, "körning 2", peers_clean)
+
+    # Peers (λ > 0) från andra körningen, med rader i resultatet – underlag för app/peer_influence.py
+    rad_clean = np.flatnonzero(~df["is_outlier"].to_numpy(dtype=bool))
+    peer_par = np.array(peers_clean, dtype=float).reshape(-1, 3)
+    df_peers = pd.DataFrame({
+        "rad": rad_clean[peer_par[:, 0].astype(int)],
+        "peer_rad": rad_clean[peer_par[:, 1].astype(int)],
+        "lambda": peer_par[:, 2],
+    })
+    if "Företag" in df.columns:
+        företag = df["Företag"].to_numpy()
+        df_peers.insert(1, "Företag", företag[df_peers["rad"]])
+        df_peers["Peer"] = företag[df_peers["peer_rad"]]
 
     result_effektivitet = []
     result_supereffektivitet = []
@@ -86,8 +134,7 @@ def run_dea_model(
             if isinstance(theta, (int, float)) and not np.isnan(theta):
                 effektivitet = min(theta, 1)
                 revred = 1 - effektivitet
-                revred_compress = np.clip(revred, trunkering_min, trunkering_max)
-                revred_compress_yearly = ((1 + revred_compress / 4) ** 0.25) - 1
+                revred_compress_yearly = effkrav_proc(theta, trunkering_min, trunkering_max)
 
                 result_effektivitet.append(effektivitet)
                 result_supereffektivitet.append(theta)
@@ -106,18 +153,25 @@ def run_dea_model(
     df["Effkrav_proc"] = result_effkrav_proc
 
     # Konvertera OUTLIER till NaN inför loggning (för pyarrow/feather-kompatibilitet)
-    df_for_loggning = df.copy()
-    for col in ["supereff1", "Effektivitet", "Supereffektivitet", "Effkrav_proc", "potential"]:
-        if col in df_for_loggning.columns:
-            df_for_loggning[col] = pd.to_numeric(df_for_loggning[col], errors="coerce")
-
-    save_run("DEA", {
+    with mätning.steg("förbered loggning"):
+        df_for_loggning = df.copy()
+        for col in ["supereff1", "Effektivitet", "Supereffektivitet", "Effkrav_proc", "potential"]:
+            if col in df_for_loggning.columns:
+                df_for_loggning[col] = pd.to_numeric(df_for_loggning[col], errors="coerce")
+
+    mätning.avsluta()
+    run_id = save_run("DEA", {
         "rts": rts,
         "input_cols": input_cols,
         "output_cols": output_cols,
         "trunkering_min": trunkering_min,
         "trunkering_max": trunkering_max,
         "outlier_filter": outlier_filter
-    }, df_for_loggning)
+    }, df_for_loggning, prestanda=mätning.som_dict(), artefakter={"peers": df_peers})
+
+    # Sparningen sker i bakgrunden – run_id följer med resultatet så att
+    # anropare kan vänta på den (wait_for_run) vid behov
+    df.attrs["run_id"] = run_id
+    df.attrs["prestanda"] = mätning.som_dict()
 
     return df
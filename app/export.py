@@ -0,0 +1,183 @@
+# app/export.py
+
+"""
+Export av resultat till Excel, Parquet och CSV.
+
+Filerna byggs först när användaren klickar på nedladdningsknappen (st.download_button
+med en funktion som data) och cachas per run_id och format, så att en rerun som bara
+visar resultat inte skriver någon arbetsbok.
+
+- Excel skrivs med xlsxwriter i constant_memory-läge: rad för rad, så att bara
+  aktuell rad hålls i minnet även för stora paneler.
+- Parquet och CSV skrivs direkt från körningens feather-fil i run store via pyarrow,
+  utan omväg över pandas, med typerna bevarade (NaN i stället för "OUTLIER").
+
+Exportera manuellt med:
+    python -m app.export <run_id> --format parquet
+"""
+
+import io
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from app.run_logger import load_run_table
+
+FORMAT = {
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+    "csv": ("CSV", "text/csv"),
+}
+
+# Samma kolumner som load_run visar som "OUTLIER" där värde saknas
+OUTLIER_KOLUMNER = ["Effektivitet", "Effkrav_proc", "Supereffektivitet", "potential"]
+
+_BATCHSTORLEK = 10_000
+
+
+def table_to_parquet(table) -> bytes:
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def table_to_csv(table) -> bytes:
+    import pyarrow.csv as pacsv
+
+    buffer = io.BytesIO()
+    pacsv.write_csv(table, buffer)
+    return buffer.getvalue()
+
+
+def _tabellrader(tabell, outlier_kolumner=()):
+    """Rubrik och rader (tupler) från en DataFrame eller Arrow-tabell, batch för batch."""
+    if isinstance(tabell, pd.DataFrame):
+        rubrik = [str(c) for c in tabell.columns]
+        batcher = (
+            tabell.iloc[start:start + _BATCHSTORLEK].itertuples(index=False, name=None)
+            for start in range(0, len(tabell), _BATCHSTORLEK)
+        )
+    else:
+        rubrik = list(tabell.column_names)
+        batcher = (
+            zip(*(kolumn.to_pylist() for kolumn in batch.columns))
+            for batch in tabell.to_batches(max_chunksize=_BATCHSTORLEK)
+        )
+
+    outlier_pos = {i for i, namn in enumerate(rubrik) if namn in outlier_kolumner}
+
+    def rader():
+        for batch in batcher:
+            for rad in batch:
+                yield [_cellvärde(v, i in outlier_pos) for i, v in enumerate(rad)]
+
+    return rubrik, rader()
+
+
+def _cellvärde(v, outlier: bool):
+    """
+    Värdet som det skrivs i Excel: saknade värden blir tomma (eller "OUTLIER") och
+    ±inf blir texten "inf"/"-inf" som med to_excel (xlsxwriter skriver inte NaN/inf).
+    """
+    if v is None or v is pd.NaT or v is pd.NA:
+        return "OUTLIER" if outlier else None
+    if isinstance(v, (float, np.floating)) and not math.isfinite(v):
+        if math.isnan(v):
+            return "OUTLIER" if outlier else None
+        return "inf" if v > 0 else "-inf"
+    return v
+
+
+def to_xlsx(blad: dict, outlier_kolumner=()) -> bytes:
+    """
+    Arbetsbok med ett blad per post i blad (bladnamn → DataFrame eller Arrow-tabell).
+
+    Skrivs i constant_memory-läge – varje rad skrivs färdigt innan nästa påbörjas.
+    """
+    import xlsxwriter
+
+    buffer = io.BytesIO()
+    arbetsbok = xlsxwriter.Workbook(buffer, {
+        "constant_memory": True,
+        "in_memory": False,
+        "default_date_format": "yyyy-mm-dd",
+        "remove_timezone": True,
+    })
+    fet = arbetsbok.add_format({"bold": True})
+    for namn, tabell in blad.items():
+        ark = arbetsbok.add_worksheet(namn[:31])
+        rubrik, rader = _tabellrader(tabell, outlier_kolumner)
+        ark.write_row(0, 0, rubrik, fet)
+        for r, rad in enumerate(rader, start=1):
+            ark.write_row(r, 0, rad)
+    arbetsbok.close()
+    return buffer.getvalue()
+
+
+def export_run(run_id: str, format: str = "xlsx") -> bytes:
+    """Körningens resultat från run store i valt format (xlsx, parquet eller csv)."""
+    tabell = load_run_table(run_id)
+    if format == "xlsx":
+        return to_xlsx({"Resultat": tabell}, outlier_kolumner=OUTLIER_KOLUMNER)
+    if format == "parquet":
+        return table_to_parquet(tabell)
+    if format == "csv":
+        return table_to_csv(tabell)
+    raise ValueError(f"Okänt format: {format}. Välj bland {list(FORMAT)}")
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_run_export(run_id: str, format: str = "xlsx") -> bytes:
+    # En körning ändras aldrig efter att den skrivits, så run_id räcker som nyckel
+    return export_run(run_id, format)
+
+
+def run_download_buttons(run_id: str, filnamn: str, etikett: str, format=("xlsx", "parquet", "csv")):
+    """Nedladdningsknappar för en sparad körning – filen byggs först vid klick."""
+    kolumner = st.columns(len(format))
+    for kolumn, fmt in zip(kolumner, format):
+        namn, mime = FORMAT[fmt]
+        kolumn.download_button(
+            label=f"{etikett} som {namn}",
+            data=lambda fmt=fmt: cached_run_export(run_id, fmt),
+            file_name=f"{filnamn}.{fmt}",
+            mime=mime,
+            on_click="ignore",
+            key=f"export_{run_id}_{fmt}",
+        )
+
+
+def xlsx_download_button(blad, filnamn: str, etikett: str, key: str = None):
+    """
+    Nedladdningsknapp för tabeller som inte är sparade körningar (t.ex. simuleringar).
+
+    blad är en dict (bladnamn → tabell) eller en funktion som returnerar en, så att
+    även tabellerna byggs först vid klick.
+    """
+    st.download_button(
+        label=etikett,
+        data=lambda: to_xlsx(blad() if callable(blad) else blad),
+        file_name=filnamn,
+        mime=FORMAT["xlsx"][1],
+        on_click="ignore",
+        key=key,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exportera en sparad körning från run store.")
+    parser.add_argument("run_id")
+    parser.add_argument("--format", choices=list(FORMAT), default="parquet")
+    parser.add_argument("--ut", help="Utfil (default: <run_id>.<format>)")
+    args = parser.parse_args()
+
+    ut = args.ut or f"{args.run_id}.{args.format}"
+    with open(ut, "wb") as f:
+        f.write(export_run(args.run_id, args.format))
+    print(f"{args.run_id} exporterad till {ut}")
@@ -0,0 +1,272 @@
+# app/geometry_store.py
+
+"""
+Förbehandlat geometrilager för Ei:s shapefil över nätföretagens del- och verksamhetsområden.
+
+Byggsteget läser shapefilen en gång, delar upp kolumnen Redovisnin i REId och skriver:
+- polygoner.parquet: en rad per unik polygon (geom_id, geometry) som GeoParquet
+- reid_geom.feather: en rad per REId och polygon (REId, geom_id, poly_idx samt shapefilens attribut)
+- geojson_<nivå>.json: förenklade polygoner i WGS84 för webbkartan, en fil per detaljnivå
+- meta.yaml: formatversion och källfilens storlek/ändringstid
+
+geom_id är en innehållsbaserad hash av polygonens normaliserade WKB och är därmed
+stabil mellan processer och omstarter (Pythons hash() är saltad per process).
+Lagret byggs om automatiskt när källfilen ändrats.
+
+Förenklingen bevarar topologin (gemensamma gränser förenklas lika för grannpolygoner
+när polygonerna bildar en giltig täckning) och koordinaterna kvantiseras till
+KVANTISERING_DECIMALER decimaler i grader (~1 m). GeoJSON-filerna bär bara geom_id som egenskap – indikatorn
+skickas separat som en liten tabell geom_id → värde.
+
+poly_idx är polygonens radnummer i polygoner.parquet. Med den blir medelvärdet av en
+indikator per polygon två np.bincount över vanliga arrayer (polygon_means), utan att
+geometrin behöver följa med i någon merge eller groupby.
+
+Bygg manuellt med:
+    python -m app.geometry_store
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from dataclasses import dataclass
+
+import yaml # type: ignore
+import numpy as np
+import pandas as pd
+
+SHP_PATH = "data/Samtliga nätföretags del- och verksamhetsområden.shp"
+STORE_DIR = "data/geometri"
+STORE_VERSION = 3
+
+# Förenklingstolerans i meter (SWEREF99 TM) per detaljnivå
+DETALJNIVÅER = {"låg": 2000, "medel": 500, "hög": 100}
+KVANTISERING_DECIMALER = 5
+
+POLYGON_FILE = "polygoner.parquet"
+REID_FILE = "reid_geom.feather"
+META_FILE = "meta.yaml"
+
+# Ett bygge i taget per process (sessioner i samma server delar katalogen)
+_BYGGLÅS = threading.RLock()
+
+
+@dataclass(frozen=True)
+class GeometryStore:
+    """Inläst geometrilager: unika polygoner och kopplingstabellen REId → geom_id."""
+    polygoner: "gpd.GeoDataFrame"
+    reid: pd.DataFrame
+    katalog: str
+
+    @property
+    def crs(self):
+        return self.polygoner.crs
+
+    @property
+    def poly_idx(self) -> np.ndarray:
+        return self.reid["poly_idx"].to_numpy()
+
+    def row_geometries(self):
+        """Polygonens geometri för varje rad i reid (delar geometriobjekten, kopierar inga)."""
+        return self.polygoner.geometry.values.take(self.poly_idx)
+
+    def exploded(self):
+        """En rad per REId och polygon – samma form som den gamla load_shapes."""
+        import geopandas as gpd
+
+        df = self.reid.merge(self.polygoner[["geom_id", "geometry"]], on="geom_id", how="left")
+        return gpd.GeoDataFrame(df, geometry="geometry", crs=self.crs)
+
+
+def _source_signature(shp_path: str) -> dict:
+    stat = os.stat(shp_path)
+    return {"storlek": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def geom_ids(geometrier) -> list:
+    """Stabilt, innehållsbaserat id per geometri (16 hextecken)."""
+    import shapely
+
+    wkb = shapely.to_wkb(shapely.normalize(geometrier))
+    return [hashlib.blake2b(w, digest_size=8).hexdigest() for w in wkb]
+
+
+def simplify_geometries(geometrier, tolerans: float):
+    import shapely
+
+    if shapely.coverage_is_valid(geometrier):
+        return shapely.coverage_simplify(geometrier, tolerans)
+    # Överlappande polygoner är ingen täckning – förenkla varje polygon för sig
+    return shapely.simplify(geometrier, tolerans, preserve_topology=True)
+
+
+def _geojson_text(geom_id, geometrier) -> str:
+    import shapely
+    from shapely.geometry import mapping
+
+    # Kvantisera till ett rutnät (håller polygonerna giltiga) och avrunda vid
+    # utskrift så att varje koordinat blir så kort som möjligt i JSON
+    geometrier = shapely.set_precision(geometrier, 10.0 ** -KVANTISERING_DECIMALER)
+    geometrier = shapely.transform(geometrier, lambda c: c.round(KVANTISERING_DECIMALER))
+
+    features = [
+        {"type": "Feature", "properties": {"geom_id": gid}, "geometry": mapping(g)}
+        for gid, g in zip(geom_id, geometrier)
+        if g is not None and not g.is_empty
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+
+
+def _write_simplified(polygoner, katalog: str):
+    for nivå, tolerans in DETALJNIVÅER.items():
+        förenklade = simplify_geometries(polygoner.geometry.values, tolerans)
+        wgs84 = polygoner.set_geometry(förenklade).to_crs(epsg=4326)
+        text = _geojson_text(wgs84["geom_id"], wgs84.geometry.values)
+        with open(os.path.join(katalog, f"geojson_{nivå}.json"), "w") as f:
+            f.write(text)
+
+
+def build_geometry_store(shp_path: str = SHP_PATH, store_dir: str = STORE_DIR) -> GeometryStore:
+    with _BYGGLÅS:
+        return _build_geometry_store(shp_path, store_dir)
+
+
+def _build_geometry_store(shp_path: str, store_dir: str) -> GeometryStore:
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shp_path)
+
+    # Dela upp rader med flera REId
+    gdf["REId"] = gdf["Redovisnin"].astype(str).str.split(",")
+    gdf = gdf.explode("REId").reset_index(drop=True)
+    gdf["REId"] = gdf["REId"].str.strip()
+    gdf["geom_id"] = geom_ids(gdf.geometry.values)
+
+    polygoner = (
+        gdf[["geom_id", "geometry"]]
+        .drop_duplicates(subset="geom_id")
+        .reset_index(drop=True)
+    )
+    polygoner = gpd.GeoDataFrame(polygoner, geometry="geometry", crs=gdf.crs)
+    reid = pd.DataFrame(gdf.drop(columns=["geometry"]))
+    reid["poly_idx"] = pd.Index(polygoner["geom_id"]).get_indexer(reid["geom_id"]).astype(np.int32)
+
+    # Skriv till en unik temporär katalog bredvid lagret och byt namn, så att
+    # läsare aldrig ser ett halvskrivet lager
+    föräldrakatalog = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(föräldrakatalog, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(store_dir)}.tmp-", dir=föräldrakatalog)
+    try:
+        polygoner.to_parquet(os.path.join(tmp_dir, POLYGON_FILE), index=False)
+        reid.to_feather(os.path.join(tmp_dir, REID_FILE))
+        _write_simplified(polygoner, tmp_dir)
+        with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+            yaml.dump({
+                "version": STORE_VERSION,
+                "källa": os.path.basename(shp_path),
+                **_source_signature(shp_path),
+            }, f, allow_unicode=True)
+
+        os.chmod(tmp_dir, 0o755)  # mkdtemp skapar katalogen med 0700
+        if os.path.isdir(store_dir):
+            old_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(store_dir)}.old-", dir=föräldrakatalog)
+            os.rename(store_dir, os.path.join(old_dir, "lager"))
+            os.rename(tmp_dir, store_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.rename(tmp_dir, store_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return GeometryStore(polygoner=polygoner, reid=reid, katalog=store_dir)
+
+
+def _is_current(store_dir: str, shp_path: str) -> bool:
+    meta_path = os.path.join(store_dir, META_FILE)
+    if not os.path.isfile(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = yaml.safe_load(f) or {}
+    if meta.get("version") != STORE_VERSION:
+        return False
+    # Utan källfil (t.ex. driftmiljö med bara lagret) används lagret som det är
+    if not os.path.isfile(shp_path):
+        return True
+    signatur = _source_signature(shp_path)
+    return all(meta.get(k) == v for k, v in signatur.items())
+
+
+def load_geometry_store(store_dir: str = STORE_DIR, shp_path: str = SHP_PATH) -> GeometryStore:
+    """Läser geometrilagret kolumnärt och bygger det först om det saknas eller är inaktuellt."""
+    import geopandas as gpd
+
+    if not _is_current(store_dir, shp_path):
+        with _BYGGLÅS:
+            # En annan tråd kan ha byggt klart medan vi väntade på låset
+            if not _is_current(store_dir, shp_path):
+                return build_geometry_store(shp_path, store_dir)
+
+    polygoner = gpd.read_parquet(os.path.join(store_dir, POLYGON_FILE))
+    reid = pd.read_feather(os.path.join(store_dir, REID_FILE))
+    return GeometryStore(polygoner=polygoner, reid=reid, katalog=store_dir)
+
+
+def _reid_sums(store: GeometryStore, df_resultat: pd.DataFrame, indikator: str):
+    """Summa och antal giltiga värden per rad i store.reid (0 där REId saknas i resultatet)."""
+    värden = pd.DataFrame({
+        "REId": df_resultat["REId"].astype(str).str.strip(),
+        "v": pd.to_numeric(df_resultat[indikator], errors="coerce"),
+    })
+    per_reid = värden.groupby("REId")["v"].agg(["sum", "count"])
+    pos = per_reid.index.get_indexer(store.reid["REId"])
+    träff = pos >= 0
+    summor = np.where(träff, per_reid["sum"].to_numpy()[pos], 0.0)
+    antal = np.where(träff, per_reid["count"].to_numpy()[pos], 0)
+    return summor, antal
+
+
+def row_values(store: GeometryStore, df_resultat: pd.DataFrame, indikator: str) -> np.ndarray:
+    """Indikatorn för varje rad i store.reid (NaN där REId saknas i resultatet)."""
+    summor, antal = _reid_sums(store, df_resultat, indikator)
+    return np.divide(summor, antal, out=np.full(len(summor), np.nan), where=antal > 0)
+
+
+def polygon_means(store: GeometryStore, df_resultat: pd.DataFrame, indikator: str) -> np.ndarray:
+    """
+    Medelvärde av indikatorn per unik polygon (i polygonernas ordning).
+
+    Motsvarar merge på REId följt av groupby("geom_id").mean(), men räknas med
+    np.bincount över poly_idx – geometrin rörs inte.
+    """
+    summor, antal = _reid_sums(store, df_resultat, indikator)
+    n = len(store.polygoner)
+    s = np.bincount(store.poly_idx, weights=summor, minlength=n)
+    c = np.bincount(store.poly_idx, weights=antal, minlength=n)
+    return np.divide(s, c, out=np.full(n, np.nan), where=c > 0)
+
+
+def load_geojson(store: GeometryStore, nivå: str = "medel") -> str:
+    """Förenklad GeoJSON (WGS84, bara geom_id som egenskap) för given detaljnivå."""
+    if nivå not in DETALJNIVÅER:
+        raise ValueError(f"Okänd detaljnivå: {nivå}. Välj bland {list(DETALJNIVÅER)}")
+    with open(os.path.join(store.katalog, f"geojson_{nivå}.json")) as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bygg geometrilagret från shapefilen.")
+    parser.add_argument("--shp", default=SHP_PATH, help="Sökväg till shapefilen")
+    parser.add_argument("--ut", default=STORE_DIR, help="Katalog för geometrilagret")
+    args = parser.parse_args()
+
+    store = build_geometry_store(args.shp, args.ut)
+    print(f"Geometrilager skrivet till {store.katalog}")
+    print("Unika polygoner (geom_id):", len(store.polygoner))
+    print("Rader REId × polygon:", len(store.reid))
+    print("Unika REId:", store.reid["REId"].nunique())
@@ -0,0 +1,141 @@
+# app/import_profile.py
+
+"""
+Mäter importtiden för dashboardens vyer vid kallstart.
+
+Varje vy importeras i en ny Python-process med `python -X importtime`, så att
+inga moduler är cachade sedan tidigare; den snabbaste av några mätningar redovisas.
+Rapporten visar total importtid per vy, tillägget utöver basen (det som alla vyer
+laddar) och de toppnivåpaket som kostar mest.
+
+Basen och vyerna läses ur sidornas källkod med ast, så att listorna följer sidan:
+- bas: importerna på toppnivå i pages/Effektiviseringskrav.py
+- vy: importerna i grenen `modellval == "<vy>"` (på valfritt djup)
+- övriga sidor (t.ex. Kapitalbas) räknas som en vy med alla sina importer
+
+Kör från projektroten med:
+    python -m app.import_profile
+    python -m app.import_profile --topp 20 heatmap_view
+"""
+
+import os
+import ast
+import sys
+import subprocess
+from collections import defaultdict
+
+ROT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIDA = os.path.join(ROT, "pages", "Effektiviseringskrav.py")
+ANDRA_SIDOR = {"Kapitalbas": os.path.join(ROT, "pages", "Kapitalbas.py")}
+
+
+def _importer(noder) -> list:
+    """Modulnamn i import-satserna bland noderna (och deras barn), i ordning och utan dubbletter."""
+    moduler = []
+    for nod in noder:
+        for del_nod in ast.walk(nod):
+            if isinstance(del_nod, ast.Import):
+                moduler += [alias.name for alias in del_nod.names]
+            elif isinstance(del_nod, ast.ImportFrom) and del_nod.module and not del_nod.level:
+                moduler.append(del_nod.module)
+    return list(dict.fromkeys(moduler))
+
+
+def _vyval(test) -> str:
+    """Vyns namn om villkoret är modellval == "<vy>", annars None."""
+    if (
+        isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.left.id == "modellval"
+        and len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq)
+        and isinstance(test.comparators[0], ast.Constant)
+    ):
+        return test.comparators[0].value
+    return None
+
+
+def sidans_importer(sida: str = SIDA, andra_sidor: dict = ANDRA_SIDOR):
+    """(bas, vyer) ur sidans källkod – se modulens docstring."""
+    with open(sida, encoding="utf-8") as f:
+        träd = ast.parse(f.read())
+
+    bas = _importer(n for n in träd.body if isinstance(n, (ast.Import, ast.ImportFrom)))
+    vyer = {}
+    for nod in träd.body:
+        # if/elif-kedjan över modellval; elif ligger som ensam If i orelse
+        while isinstance(nod, ast.If) and _vyval(nod.test) is not None:
+            vyer[_vyval(nod.test)] = [m for m in _importer(nod.body) if m not in bas]
+            nod = nod.orelse[0] if len(nod.orelse) == 1 else None
+
+    for namn, sökväg in andra_sidor.items():
+        with open(sökväg, encoding="utf-8") as f:
+            vyer[namn] = [m for m in _importer([ast.parse(f.read())]) if m not in bas]
+    return bas, vyer
+
+
+# Det som Effektiviseringskrav-sidan laddar oavsett vy, och det som respektive vy laddar utöver basen
+BAS, VYER = sidans_importer()
+
+
+def mät_import(moduler) -> dict:
+    """Egen importtid (µs) per modul när modulerna importeras i en ny process."""
+    kod = "; ".join(f"import {m}" for m in moduler)
+    miljö = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROT, os.getcwd(), os.environ.get("PYTHONPATH")])))
+    körning = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", kod],
+        capture_output=True, text=True, env=miljö,
+    )
+    if körning.returncode != 0:
+        raise RuntimeError(f"Import misslyckades för {moduler}:\n{körning.stderr.strip().splitlines()[-1]}")
+
+    tider = {}
+    for rad in körning.stderr.splitlines():
+        if not rad.startswith("import time:"):
+            continue
+        delar = rad[len("import time:"):].split("|")
+        if len(delar) != 3 or not delar[0].strip().isdigit():
+            continue  # rubrikraden
+        tider[delar[2].strip()] = int(delar[0])
+    return tider
+
+
+def bästa_mätning(moduler, upprepningar: int = 3) -> dict:
+    """Den snabbaste av flera mätningar – minskar bruset från disk och andra processer."""
+    return min((mät_import(moduler) for _ in range(upprepningar)), key=lambda t: sum(t.values()))
+
+
+def per_paket(tider: dict) -> dict:
+    summor = defaultdict(int)
+    for modul, tid in tider.items():
+        summor[modul.split(".")[0]] += tid
+    return dict(sorted(summor.items(), key=lambda p: p[1], reverse=True))
+
+
+def rapport(vyer: dict, topp: int = 10, upprepningar: int = 3) -> None:
+    bas = bästa_mätning(BAS, upprepningar)
+    bas_ms = sum(bas.values()) / 1000
+    print(f"Bas ({', '.join(BAS)}): {bas_ms:.0f} ms")
+
+    for namn, moduler in vyer.items():
+        try:
+            tider = bästa_mätning(BAS + moduler, upprepningar)
+        except RuntimeError as e:
+            print(f"\n{namn}: {e}")
+            continue
+        # Tillägget räknas på moduler som basen inte laddar, inte som skillnad mellan två brusiga totaler
+        tillägg = {m: t for m, t in tider.items() if m not in bas}
+        totalt_ms = sum(tider.values()) / 1000
+        print(f"\n{namn}: {totalt_ms:.0f} ms totalt, +{sum(tillägg.values()) / 1000:.0f} ms utöver basen")
+
+        for paket, tid in list(per_paket(tillägg).items())[:topp]:
+            print(f"  {tid / 1000:8.1f} ms  {paket}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mät importtid per vy vid kallstart.")
+    parser.add_argument("moduler", nargs="*", help="Egna moduler att mäta (i stället för vyerna)")
+    parser.add_argument("--topp", type=int, default=10, help="Antal paket att visa per vy")
+    parser.add_argument("--upprepningar", type=int, default=3, help="Mätningar per vy (den snabbaste redovisas)")
+    args = parser.parse_args()
+
+    rapport({m: [m] for m in args.moduler} if args.moduler else VYER, args.topp, args.upprepningar)
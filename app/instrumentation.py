@@ -0,0 +1,113 @@
+# app/instrumentation.py
+
+"""
+Lätt instrumentering av tid och minne per steg i modellkörningar och inläsning.
+
+    mätning = Mätning("DEA")
+    with mätning.steg("outlierdetektering"):
+        ...
+    mätning.lägg_till("lösare", sekunder)   # för tider som samlas i en loop
+    mätning.avsluta()                        # sparas bland senaste_mätningar()
+
+Tiden mäts alltid (perf_counter, försumbar kostnad). Minnestopp per steg mäts
+med tracemalloc bara när minnesmätning är påslagen (aktivera_minnesmätning eller
+miljövariabeln DASHBOARD_TRACEMALLOC=1), eftersom tracemalloc gör Python-
+allokeringar märkbart långsammare.
+
+Modellkörningar sparar sin mätning i körningens params.yaml under "prestanda";
+övriga mätningar finns kvar i processen och visas i sidopanelen "Prestanda".
+"""
+
+import os
+import time
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+MAX_SPARADE = 50
+
+_lock = threading.Lock()
+_senaste = deque(maxlen=MAX_SPARADE)
+_minnesmätning = os.environ.get("DASHBOARD_TRACEMALLOC") == "1"
+
+
+def aktivera_minnesmätning(på: bool = True) -> None:
+    """Slår på/av tracemalloc för efterföljande mätningar i processen."""
+    global _minnesmätning
+    _minnesmätning = på
+    if på and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not på and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def minnesmätning_aktiv() -> bool:
+    return _minnesmätning
+
+
+class Mätning:
+    """Tider (och ev. minnestoppar) per namngivet steg för en körning eller inläsning."""
+
+    def __init__(self, namn: str):
+        self.namn = namn
+        self.steg_lista = []
+        self._index = {}
+        self._start = time.perf_counter()
+        self.totalt_s = None
+        if _minnesmätning and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def lägg_till(self, namn: str, sekunder: float, topp_mb: float = None) -> None:
+        """Lägger till tid på ett steg (summeras om steget redan finns)."""
+        if namn in self._index:
+            steg = self.steg_lista[self._index[namn]]
+            steg["sekunder"] += sekunder
+            if topp_mb is not None:
+                steg["topp_mb"] = max(steg.get("topp_mb") or 0.0, topp_mb)
+            return
+        self._index[namn] = len(self.steg_lista)
+        steg = {"steg": namn, "sekunder": sekunder}
+        if topp_mb is not None:
+            steg["topp_mb"] = topp_mb
+        self.steg_lista.append(steg)
+
+    @contextmanager
+    def steg(self, namn: str):
+        minne = _minnesmätning and tracemalloc.is_tracing()
+        if minne:
+            # Topp relativt stegets början (mätningar i flera trådar delar tracemalloc)
+            tracemalloc.reset_peak()
+            bas = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            sekunder = time.perf_counter() - start
+            topp_mb = (tracemalloc.get_traced_memory()[1] - bas) / 1e6 if minne else None
+            self.lägg_till(namn, sekunder, topp_mb)
+
+    def avsluta(self) -> "Mätning":
+        if self.totalt_s is None:
+            self.totalt_s = time.perf_counter() - self._start
+            with _lock:
+                _senaste.append(self)
+        return self
+
+    def som_dict(self) -> dict:
+        """Serialiserbar form (för params.yaml)."""
+        totalt = self.totalt_s if self.totalt_s is not None else time.perf_counter() - self._start
+        return {
+            "totalt_s": round(totalt, 4),
+            "minnesmätning": any("topp_mb" in s for s in self.steg_lista),
+            "steg": [
+                {k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}
+                for s in self.steg_lista
+            ],
+        }
+
+
+def senaste_mätningar() -> list:
+    """De senaste avslutade mätningarna i processen, nyast först."""
+    with _lock:
+        return list(reversed(_senaste))
@@ -0,0 +1,173 @@
+# app/kapitalbas.py
+
+"""
+Kapitalbas och kapitalkostnad per REId från ett anläggningsregister.
+
+Registret har en rad per komponent (se load_asset_register i app/data_loader.py):
+- REId
+- Normvärde (kr per enhet)
+- Antal
+- Prisindex (omräkning till aktuell prisnivå)
+- Ålder (år)
+- Livslängd (ekonomisk livslängd, år)
+
+Beräkningen sker kolumnvis i NumPy för alla komponenter samtidigt och summeras
+per REId med np.bincount på REId-kategorins koder. Ingen Python-loop per rad.
+
+Per komponent:
+    NUAK        = Normvärde × Antal × Prisindex
+    kvar        = max(Livslängd − Ålder, 0)          återstående livslängd
+
+Real annuitet (kalkylränta r):
+    annuitet    = NUAK × r / (1 − (1 + r)^−Livslängd)
+    kapitalbas  = annuitet × (1 − (1 + r)^−kvar) / r  nuvärdet av återstående annuiteter
+    avkastning  = r × kapitalbas
+    avskrivning = annuitet − avkastning
+
+Real linjär:
+    kapitalbas  = NUAK × kvar / Livslängd
+    avskrivning = NUAK / Livslängd
+    avkastning  = r × kapitalbas
+
+Avskrivningen begränsas till kapitalbasen, så att en komponent med mindre än ett
+år kvar inte skrivs av med mer än sitt restvärde. Fullt avskrivna komponenter
+(kvar = 0) ger ingen kapitalkostnad. Med r = 0 blir annuitetsmetoden linjär.
+Rader som saknar värden eller har Livslängd ≤ 0 räknas inte och redovisas som ogiltiga.
+Rader utan REId redovisas på en egen rad med REId saknat (bara om sådana finns).
+
+Resultatet sparas i samma run store som effektivitetsmodellerna (modellnamn "Kapitalbas").
+
+Kör med:
+    python -m app.kapitalbas data/Anläggningsregister.xlsx --metod linjär --ränta 0.0453
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.run_logger import save_run
+from app.instrumentation import Mätning
+
+METODER = ("annuitet", "linjär")
+
+# Kolumner i resultatet (en rad per REId)
+RESULTAT_KOLUMNER = [
+    "REId", "Antal komponenter", "Ogiltiga rader", "NUAK", "Kapitalbas",
+    "Avskrivning", "Avkastning", "Kapitalkostnad", "Andel fullt avskrivet", "Medelålder",
+]
+
+
+def kapitalkostnad(nuak, ålder, livslängd, kalkylränta: float = 0.0453, metod: str = "annuitet"):
+    """
+    Kapitalbas, avskrivning och avkastning per komponent (numpy-arrayer).
+
+    Returnerar (kapitalbas, avskrivning, avkastning) med samma form som indata.
+    """
+    if metod not in METODER:
+        raise ValueError(f"Okänd metod {metod!r}. Välj bland {METODER}.")
+    nuak = np.asarray(nuak, dtype=float)
+    livslängd = np.asarray(livslängd, dtype=float)
+    kvar = np.clip(livslängd - np.asarray(ålder, dtype=float), 0.0, livslängd)
+    r = float(kalkylränta)
+
+    if metod == "linjär" or r == 0.0:
+        kapitalbas = nuak * kvar / livslängd
+        avskrivning = nuak / livslängd
+    else:
+        annuitet = nuak * r / -np.expm1(-livslängd * np.log1p(r))
+        kapitalbas = annuitet * -np.expm1(-kvar * np.log1p(r)) / r
+        avskrivning = annuitet - r * kapitalbas
+
+    avskrivning = np.minimum(avskrivning, kapitalbas)
+    avkastning = r * kapitalbas
+    return kapitalbas, avskrivning, avkastning
+
+
+def run_kapitalbas(
+    df: pd.DataFrame,
+    metod: str = "annuitet",
+    kalkylränta: float = 0.0453,
+    använd_prisindex: bool = True,
+    spara: bool = True,
+) -> pd.DataFrame:
+    """
+    Beräknar kapitalbas och kapitalkostnad per REId för ett anläggningsregister.
+
+    Tid per steg sparas i körningens metadata under "prestanda" och i
+    df.attrs["prestanda"]; run_id (om spara=True) i df.attrs["run_id"].
+    """
+    mätning = Mätning("Kapitalbas")
+    with mätning.steg("förbehandling"):
+        reid = df["REId"].astype("category")
+        koder = reid.cat.codes.to_numpy()
+        antal_reid = len(reid.cat.categories)
+        # Rader utan REId samlas i en extra grupp sist (kod antal_reid)
+        utan_reid = koder < 0
+        koder = np.where(utan_reid, antal_reid, koder)
+
+        nuak = df["Normvärde"].to_numpy(dtype=float) * df["Antal"].to_numpy(dtype=float)
+        if använd_prisindex:
+            nuak = nuak * df["Prisindex"].to_numpy(dtype=float)
+        ålder = df["Ålder"].to_numpy(dtype=float)
+        livslängd = df["Livslängd"].to_numpy(dtype=float)
+
+        giltig = ~utan_reid & np.isfinite(nuak) & np.isfinite(ålder) & np.isfinite(livslängd) & (livslängd > 0)
+        ogiltiga = np.bincount(koder[~giltig], minlength=antal_reid + 1)
+        koder = koder[giltig]
+        nuak, ålder, livslängd = nuak[giltig], ålder[giltig], livslängd[giltig]
+
+    with mätning.steg("beräkning per komponent"):
+        kapitalbas, avskrivning, avkastning = kapitalkostnad(nuak, ålder, livslängd, kalkylränta, metod)
+        fullt_avskrivet = nuak * (ålder >= livslängd)
+
+    with mätning.steg("summering per REId"):
+        def summa(vikter=None):
+            return np.bincount(koder, weights=vikter, minlength=antal_reid + 1)
+
+        nuak_summa = summa(nuak)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resultat = pd.DataFrame({
+                "REId": np.append(np.asarray(reid.cat.categories, dtype=object), None),
+                "Antal komponenter": summa().astype(np.int64),
+                "Ogiltiga rader": ogiltiga.astype(np.int64),
+                "NUAK": nuak_summa,
+                "Kapitalbas": summa(kapitalbas),
+                "Avskrivning": summa(avskrivning),
+                "Avkastning": summa(avkastning),
+                "Kapitalkostnad": summa(avskrivning + avkastning),
+                "Andel fullt avskrivet": summa(fullt_avskrivet) / nuak_summa,
+                "Medelålder": summa(ålder * nuak) / nuak_summa,  # viktad med NUAK
+            })
+        if not utan_reid.any():
+            resultat = resultat.iloc[:-1]
+
+    mätning.avsluta()
+    if spara:
+        run_id = save_run("Kapitalbas", {
+            "metod": metod,
+            "kalkylränta": float(kalkylränta),
+            "använd_prisindex": bool(använd_prisindex),
+            "antal_komponenter": int(len(df)),
+        }, resultat.copy(), prestanda=mätning.som_dict())  # resultat lämnas ut till anroparen
+        resultat.attrs["run_id"] = run_id
+    resultat.attrs["prestanda"] = mätning.som_dict()
+    return resultat
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.data_loader import load_asset_register
+    from app.run_logger import wait_for_run
+
+    parser = argparse.ArgumentParser(description="Beräkna kapitalbas per REId och spara i run store.")
+    parser.add_argument("register", help="Anläggningsregister (.xlsx, .parquet eller .csv)")
+    parser.add_argument("--metod", choices=METODER, default="annuitet")
+    parser.add_argument("--ränta", type=float, default=0.0453, help="Real kalkylränta (andel)")
+    parser.add_argument("--utan-prisindex", action="store_true")
+    args = parser.parse_args()
+
+    resultat = run_kapitalbas(
+        load_asset_register(args.register), args.metod, args.ränta, not args.utan_prisindex
+    )
+    wait_for_run(resultat.attrs["run_id"])
+    print(resultat.to_string(index=False, max_rows=30))
+    print(f"\nSparad som {resultat.attrs['run_id']} ({resultat.attrs['prestanda']['totalt_s']:.2f} s)")
@@ -0,0 +1,217 @@
+# app/peer_influence.py
+
+"""
+Peer-påverkan i DEA: hur mycket varje effektivt företag (peer) styr fronten.
+
+Analysen tar bort en peer i taget och ser hur de andra företagens effektivitet och
+effektiviseringskrav ändras ("leave-one-peer-out"). Den bygger på peers som
+run_dea_model sparar med varje körning (artefakten "peers": rad, peer_rad och λ
+från andra körningen, alltså utan outliers).
+
+Bara de företag som refererade till peern behöver lösas om. Att ta bort en
+kolumn ur ett minimeringsproblem kan inte sänka optimum, och ett företag vars
+sparade lösning inte använder peern har fortfarande samma lösning kvar. Dess θ
+är alltså oförändrat. För peer p löses därför bara
+
+    A_p = { i : λ_ip > 0 }
+
+mot referensgruppen R \\ {i, p}. R är körningens icke-outliers. LP:n är densamma
+som i run_dea_model: inputorienterad supereffektivitet, CRS eller VRS enligt
+körningen. Den löses med HiGHS (samma skalade matrisform som scenariorutnätet).
+En LP byggs per peer och företagen löses parallellt. Blir VRS-problemet
+ogenomförbart ligger företaget utanför den nya fronten och får θ = inf
+(Effektivitet 1).
+
+"Före" löses om med samma LP mot R \\ {i} i stället för att läsas ur körningen
+(pulp/CBC), så att skillnaden mellan lösarna inte redovisas som påverkan.
+
+Resultatet:
+- påverkan: en rad per (peer, företag) med effektivitet och krav före och efter
+- influensmatris(): företag × peer med Δ Effektivitet (eller annat mått)
+- rangordning(): en rad per peer, sorterad efter summerad påverkan
+
+Kräver en DEA-körning som sparats med peers (körningar från före analysen saknar
+artefakten och måste köras om).
+
+Kör med:
+    python -m app.peer_influence dea_2025-... --bas TOTEX --ut peer_påverkan.xlsx
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.dea_model import effkrav_proc
+from app.run_logger import RUNS_DIR, load_run_artifact, load_run_table
+from app.scenario_grid import _SuperEffektivitetLP
+
+KR_BASER = ("OPEXp", "TOTEX")
+
+
+def _parametrar(run_id: str) -> dict:
+    import yaml # type: ignore
+
+    with open(os.path.join(RUNS_DIR, run_id, "params.yaml")) as f:
+        return (yaml.safe_load(f) or {}).get("parametrar", {})
+
+
+def har_peers(run_id: str) -> bool:
+    """Om körningen sparades med peers (krävs för analysen)."""
+    return os.path.isfile(os.path.join(RUNS_DIR, run_id, "peers.feather"))
+
+
+@dataclass(frozen=True)
+class Peerpåverkan:
+    """Leave-one-peer-out för en DEA-körning."""
+
+    run_id: str
+    påverkan: pd.DataFrame   # en rad per (peer, refererande företag)
+    antal_lp: int
+    sekunder: float
+
+    def influensmatris(self, värde: str = "Δ Effektivitet") -> pd.DataFrame:
+        """Företag (rader) × peer (kolumner); tomt där företaget inte refererade till peern."""
+        return self.påverkan.pivot(index="Företag", columns="Peer", values=värde)
+
+    def rangordning(self) -> pd.DataFrame:
+        """En rad per peer, störst summerad effektivitetsändring först."""
+        grupper = self.påverkan.groupby(["Peer", "peer_rad"], sort=False)
+        tabell = grupper.agg(**{
+            "Antal refererande": ("Företag", "size"),
+            "Summa λ": ("lambda", "sum"),
+            "Summa Δ Effektivitet": ("Δ Effektivitet", "sum"),
+            "Max Δ Effektivitet": ("Δ Effektivitet", "max"),
+            "Summa Δ Effkrav (pp)": ("Δ Effkrav (pp)", "sum"),
+            "Summa Δ Effkrav (kr)": ("Δ Effkrav (kr)", "sum"),
+        }).reset_index()
+        return tabell.sort_values(
+            ["Summa Δ Effektivitet", "Antal refererande"], ascending=False, ignore_index=True
+        )
+
+    def för_företag(self, företag: str) -> pd.DataFrame:
+        """Företagets peers med λ och vad borttagningen av var och en betyder."""
+        return self.påverkan[self.påverkan["Företag"] == företag].sort_values("lambda", ascending=False)
+
+
+def run_peer_influence(run_id: str, kr_bas_col: str = "OPEXp", n_jobs: int = None) -> Peerpåverkan:
+    """
+    Leave-one-peer-out för alla peers i körningen.
+
+    kr_bas_col är kostnaden som Δ Effkrav (kr) räknas på (TOTEX = OPEXp + CAPEX om
+    kolumnen saknas). Tid per steg mäts med Mätning.
+    """
+    from app.instrumentation import Mätning
+
+    if kr_bas_col not in KR_BASER:
+        raise ValueError(f"Okänd kostnadsbas {kr_bas_col!r}. Välj bland {KR_BASER}.")
+
+    mätning = Mätning("Peer-påverkan")
+    with mätning.steg("läs run store"):
+        parametrar = _parametrar(run_id)
+        peers = load_run_artifact(run_id, "peers")
+        if peers is None:
+            raise ValueError(f"{run_id} saknar sparade peers – kör DEA-modellen igen.")
+        df = load_run_table(run_id).to_pandas()
+
+    with mätning.steg("referensgrupp"):
+        input_cols = parametrar.get("input_cols", ["CAPEX", "OPEXp"])
+        output_cols = parametrar.get("output_cols", ["CU", "MW", "NS", "MWhl", "MWhh"])
+        rts = parametrar.get("rts", "crs")
+        trunkering_min = parametrar.get("trunkering_min", 0.162416)
+        trunkering_max = parametrar.get("trunkering_max", 0.3)
+
+        X = df[input_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        Y = df[output_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        komplett = np.all(np.isfinite(X), axis=1) & np.all(np.isfinite(Y), axis=1)
+        outlier = df["is_outlier"].fillna(True).to_numpy(dtype=bool) if "is_outlier" in df.columns else np.zeros(len(df), bool)
+        referens = np.flatnonzero(komplett & ~outlier)
+
+        if "Företag" in df.columns:
+            namn = df["Företag"].astype(str).to_numpy()
+        elif "REId" in df.columns:
+            namn = df["REId"].astype(str).to_numpy()
+        else:
+            namn = np.arange(len(df)).astype(str)
+
+        if kr_bas_col == "TOTEX" and "TOTEX" not in df.columns:
+            kr_bas = pd.to_numeric(df["OPEXp"], errors="coerce") + pd.to_numeric(df["CAPEX"], errors="coerce")
+        else:
+            kr_bas = pd.to_numeric(df[kr_bas_col], errors="coerce")
+        kr_bas = kr_bas.to_numpy(dtype=float)
+
+    with mätning.steg("LP-bygge"):
+        # En referensgrupp (R utan peern) per peer; företaget själv utesluts vid lösningen
+        lp_före = _SuperEffektivitetLP(X[referens], Y[referens], rts)
+        position_före = {int(r): k for k, r in enumerate(referens)}
+        lp_per_peer, position = {}, {}
+        for p in np.unique(peers["peer_rad"].to_numpy()):
+            ref = referens[referens != p]
+            lp_per_peer[p] = _SuperEffektivitetLP(X[ref], Y[ref], rts)
+            position[p] = {int(r): k for k, r in enumerate(ref)}
+
+    with mätning.steg("lösare (omlösning av refererande)"):
+        rad = peers["rad"].to_numpy(dtype=int)
+        peer_rad = peers["peer_rad"].to_numpy(dtype=int)
+
+        unika, index_före = np.unique(rad, return_inverse=True)
+
+        def lös(i, p):
+            return lp_per_peer[p].lös(X[i], Y[i], utesluten=position[p].get(i))
+
+        def lös_före(i):
+            return lp_före.lös(X[i], Y[i], utesluten=position_före.get(i))
+
+        with ThreadPoolExecutor(max_workers=n_jobs or min(os.cpu_count() or 1, 8)) as pool:
+            efter = np.fromiter(pool.map(lös, rad, peer_rad), dtype=float, count=len(rad))
+            före = np.fromiter(pool.map(lös_före, unika), dtype=float, count=len(unika))[index_före]
+
+    with mätning.steg("sammanställning"):
+        krav_före = effkrav_proc(före, trunkering_min, trunkering_max)
+        krav_efter = effkrav_proc(efter, trunkering_min, trunkering_max)
+        påverkan = pd.DataFrame({
+            "Peer": namn[peer_rad],
+            "Företag": namn[rad],
+            "peer_rad": peer_rad,
+            "rad": rad,
+            "lambda": peers["lambda"].to_numpy(dtype=float),
+            "Supereffektivitet före": före,
+            "Supereffektivitet efter": efter,
+            "Effektivitet före": np.minimum(före, 1),
+            "Effektivitet efter": np.minimum(efter, 1),
+            "Effkrav (%) före": krav_före * 100,
+            "Effkrav (%) efter": krav_efter * 100,
+        })
+        påverkan["Δ Effektivitet"] = påverkan["Effektivitet efter"] - påverkan["Effektivitet före"]
+        påverkan["Δ Effkrav (pp)"] = påverkan["Effkrav (%) efter"] - påverkan["Effkrav (%) före"]
+        påverkan["Δ Effkrav (kr)"] = (krav_efter - krav_före) * kr_bas[rad]
+
+    mätning.avsluta()
+    return Peerpåverkan(
+        run_id=run_id,
+        påverkan=påverkan,
+        antal_lp=len(rad) + len(unika),
+        sekunder=mätning.som_dict()["totalt_s"],
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Leave-one-peer-out-analys för en sparad DEA-körning.")
+    parser.add_argument("run_id")
+    parser.add_argument("--bas", choices=KR_BASER, default="OPEXp", help="Kostnad som Δ Effkrav (kr) räknas på")
+    parser.add_argument("--ut", help="Skriv påverkan, matris och rangordning till en xlsx-fil")
+    args = parser.parse_args()
+
+    resultat = run_peer_influence(args.run_id, args.bas)
+    print(resultat.rangordning().to_string(index=False, max_rows=30))
+    print(f"\n{resultat.antal_lp} omlösningar på {resultat.sekunder:.2f} s")
+    if args.ut:
+        with pd.ExcelWriter(args.ut) as writer:
+            resultat.rangordning().to_excel(writer, sheet_name="Rangordning", index=False)
+            resultat.influensmatris().to_excel(writer, sheet_name="Influensmatris")
+            resultat.påverkan.to_excel(writer, sheet_name="Påverkan", index=False)
+        print(f"Skrivet till {args.ut}")
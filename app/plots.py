@@ -1,41 +1,259 @@
 # plots.py
 
-import matplotlib.pyplot as plt
+import io
+import hashlib
+import numpy as np
 import streamlit as st
 import pandas as pd
 
-def plot_efficiency_histogram(eff_series, title="Effektivitet"):
-    # Filtrera numeriska
-    eff_series = pd.to_numeric(eff_series, errors="coerce").dropna()
+# Figurerna ritas med matplotlibs objektorienterade API (ingen global plt-state)
+# och cachas som PNG-bytes per datahash och plotparametrar. En identisk rerun
+# hoppar därmed över matplotlib helt, och samtidiga sessioner delar inget
+# ritläge. matplotlib importeras först när en figur faktiskt ritas.
+
+def _data_hash(*arrays) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=float)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+def _figure_to_png(fig) -> bytes:
+    buffer = io.BytesIO()
+    # Samma upplösning och beskärning som st.pyplot använder
+    fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _render_histogram(data_hash, _values, title, bins):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+    ax.hist(_values, bins=bins, edgecolor='black')
+    ax.set_title(title)
+    ax.set_xlabel("Värde")
+    ax.set_ylabel("Antal företag")
+    ax.grid(True)
+    return _figure_to_png(fig)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _render_boxplot(data_hash, _values, title):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    ax.boxplot(_values, vert=False)
+    ax.set_title(title)
+    ax.set_xlabel("Effektivitet")
+    return _figure_to_png(fig)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _render_scatter(data_hash, _x, _y, title, xlabel, ylabel):
+    from matplotlib.figure import Figure
 
-    plt.figure(figsize=(8, 5))
-    plt.hist(eff_series, bins=15, edgecolor='black')
-    plt.title(title)
-    plt.xlabel("Värde")
-    plt.ylabel("Antal företag")
-    plt.grid(True)
-    st.pyplot(plt)
-    plt.close()
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+    ax.scatter(_x, _y, alpha=0.7)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    return _figure_to_png(fig)
+
+def plot_efficiency_histogram(eff_series, title="Effektivitet", bins=15):
+    # Filtrera numeriska
+    values = pd.to_numeric(eff_series, errors="coerce").dropna().to_numpy(dtype=float)
+    png = _render_histogram(_data_hash(values), values, title, bins)
+    st.image(png, width="stretch")
 
 def plot_efficiency_boxplot(eff_series, title="Effektivitet (boxplot)"):
-    eff_series = pd.to_numeric(eff_series, errors="coerce").dropna()
-    plt.figure(figsize=(6, 4))
-    plt.boxplot(eff_series, vert=False)
-    plt.title(title)
-    plt.xlabel("Effektivitet")
-    st.pyplot(plt)
-    plt.close()
-
-def plot_efficiency_vs_size(df, size_col="MWhl", eff_col="Effektivitet"):
+    values = pd.to_numeric(eff_series, errors="coerce").dropna().to_numpy(dtype=float)
+    png = _render_boxplot(_data_hash(values), values, title)
+    st.image(png, width="stretch")
+
+def plot_efficiency_vs_size(df, size_col="MWhl", eff_col="Effektivitet", interaktiv=False):
     df = df.dropna(subset=[size_col, eff_col])
-    x = pd.to_numeric(df[size_col], errors="coerce")
-    y = pd.to_numeric(df[eff_col], errors="coerce")
-
-    plt.figure(figsize=(8, 5))
-    plt.scatter(x, y, alpha=0.7)
-    plt.title("Effektivitet i förhållande till levererad energi (MWhl)")
-    plt.xlabel("MWhl")
-    plt.ylabel("Effektivitet")
-    plt.grid(True)
-    st.pyplot(plt)
-    plt.close()
+    if interaktiv:
+        plot_scatter_interactive(
+            df, size_col, eff_col,
+            title="Effektivitet i förhållande till levererad energi (MWhl)",
+            x_title="MWhl", y_title="Effektivitet"
+        )
+        return
+
+    x = pd.to_numeric(df[size_col], errors="coerce").to_numpy(dtype=float)
+    y = pd.to_numeric(df[eff_col], errors="coerce").to_numpy(dtype=float)
+
+    png = _render_scatter(
+        _data_hash(x, y), x, y,
+        "Effektivitet i förhållande till levererad energi (MWhl)", "MWhl", "Effektivitet"
+    )
+    st.image(png, width="stretch")
+
+
+# === Interaktiv scatter (renderas i webbläsaren) ===
+# Data skickas som kolumnär Arrow-tabell till Vega-Lite. Över INTERAKTIV_MAX_PUNKTER
+# aggregeras punkterna till ett 2D-rutnät med antal per ruta, så att storleken på
+# det som skickas begränsas av antalet rutor i stället för antalet punkter.
+
+INTERAKTIV_MAX_PUNKTER = 5000
+
+def _bin_scatter(x, y, labels, bins, max_labels=3):
+    x_edges = np.linspace(np.nanmin(x), np.nanmax(x), bins + 1)
+    y_edges = np.linspace(np.nanmin(y), np.nanmax(y), bins + 1)
+    ix = np.clip(np.searchsorted(x_edges, x, side="right") - 1, 0, bins - 1)
+    iy = np.clip(np.searchsorted(y_edges, y, side="right") - 1, 0, bins - 1)
+
+    df_bin = pd.DataFrame({"ix": ix, "iy": iy, "Företag": labels})
+    grouped = df_bin.groupby(["ix", "iy"], sort=False)
+    df_agg = grouped.size().rename("Antal").reset_index()
+    urval = grouped["Företag"].agg(lambda s: ", ".join(map(str, s.unique()[:max_labels])))
+    df_agg["Företag"] = urval.to_numpy()
+
+    df_agg["x"] = x_edges[df_agg["ix"]]
+    df_agg["x2"] = x_edges[df_agg["ix"] + 1]
+    df_agg["y"] = y_edges[df_agg["iy"]]
+    df_agg["y2"] = y_edges[df_agg["iy"] + 1]
+    return df_agg.drop(columns=["ix", "iy"])
+
+def plot_scatter_interactive(
+    df,
+    x_col,
+    y_col,
+    label_col="Företag",
+    title=None,
+    x_title=None,
+    y_title=None,
+    diagonal=False,
+    domain=None,
+    max_points=INTERAKTIV_MAX_PUNKTER,
+    bins=60,
+):
+    """
+    Interaktiv scatterplot med hover för företagsnamn.
+
+    - diagonal: ritar linjen y = x över angiven domain (eller datans spann).
+    - domain: (min, max) som används för båda axlarna.
+    - Fler punkter än max_points ritas som täthetsrutnät (antal per ruta)
+      där hover visar antal och ett urval av företagen i rutan.
+    """
+    x = pd.to_numeric(df[x_col], errors="coerce").to_numpy(dtype=float)
+    y = pd.to_numeric(df[y_col], errors="coerce").to_numpy(dtype=float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    labels = df[label_col].to_numpy()[ok] if label_col in df.columns else np.full(ok.sum(), "")
+    x, y = x[ok], y[ok]
+    if len(x) == 0:
+        st.info("Inga punkter att visa.")
+        return
+
+    x_title = x_title or x_col
+    y_title = y_title or y_col
+    scale = {"domain": list(domain), "zero": False} if domain else {"zero": False}
+
+    if len(x) > max_points:
+        data = _bin_scatter(x, y, labels, bins)
+        layer = {
+            "mark": {"type": "rect", "clip": bool(domain)},
+            "encoding": {
+                "x": {"field": "x", "type": "quantitative", "title": x_title, "scale": scale},
+                "x2": {"field": "x2"},
+                "y": {"field": "y", "type": "quantitative", "title": y_title, "scale": scale},
+                "y2": {"field": "y2"},
+                "color": {"field": "Antal", "type": "quantitative", "scale": {"type": "log", "scheme": "blues"}},
+                "tooltip": [
+                    {"field": "Antal", "type": "quantitative"},
+                    {"field": "Företag", "type": "nominal", "title": "Företag (urval)"},
+                ],
+            },
+        }
+    else:
+        data = pd.DataFrame({"x": x, "y": y, "Företag": labels})
+        layer = {
+            "mark": {"type": "circle", "opacity": 0.7, "clip": bool(domain)},
+            "encoding": {
+                "x": {"field": "x", "type": "quantitative", "title": x_title, "scale": scale},
+                "y": {"field": "y", "type": "quantitative", "title": y_title, "scale": scale},
+                "tooltip": [
+                    {"field": "Företag", "type": "nominal"},
+                    {"field": "x", "type": "quantitative", "title": x_title, "format": ".4f"},
+                    {"field": "y", "type": "quantitative", "title": y_title, "format": ".4f"},
+                ],
+            },
+        }
+
+    layers = [layer]
+    if diagonal:
+        lo, hi = domain if domain else (float(min(x.min(), y.min())), float(max(x.max(), y.max())))
+        layers.append({
+            "data": {"values": [{"x": lo, "y": lo}, {"x": hi, "y": hi}]},
+            "mark": {"type": "line", "color": "gray", "strokeDash": [4, 4]},
+            "encoding": {
+                "x": {"field": "x", "type": "quantitative"},
+                "y": {"field": "y", "type": "quantitative"},
+            },
+        })
+
+    spec = {"layer": layers}
+    if title:
+        spec["title"] = title
+    st.vega_lite_chart(data, spec, width="stretch")
+
+def plot_response_surface(df, x_col, value_col, y_col=None, title=None, value_format=".4f", omvänd=False):
+    """
+    Responsyta från ett scenariorutnät: värmekarta över två variabler,
+    eller linje när bara en variabel varieras. omvänd=True när höga värden är sämre.
+    """
+    tooltip = [{"field": x_col, "type": "quantitative"}]
+    if y_col:
+        tooltip.append({"field": y_col, "type": "quantitative"})
+    tooltip.append({"field": value_col, "type": "quantitative", "format": value_format})
+
+    if y_col:
+        spec = {
+            "mark": "rect",
+            "encoding": {
+                "x": {"field": x_col, "type": "ordinal", "sort": "ascending"},
+                "y": {"field": y_col, "type": "ordinal", "sort": "descending"},
+                "color": {"field": value_col, "type": "quantitative", "scale": {"scheme": "redyellowgreen", "reverse": omvänd}},
+                "tooltip": tooltip,
+            },
+        }
+    else:
+        spec = {
+            "mark": {"type": "line", "point": True},
+            "encoding": {
+                "x": {"field": x_col, "type": "quantitative"},
+                "y": {"field": value_col, "type": "quantitative", "scale": {"zero": False}},
+                "tooltip": tooltip,
+            },
+        }
+    if title:
+        spec["title"] = title
+    kolumner = [c for c in (x_col, y_col, value_col) if c]
+    st.vega_lite_chart(df[kolumner], spec, width="stretch")
+
+
+def plot_influence_matrix(matris: pd.DataFrame, värde: str = "Δ Effektivitet", title=None, value_format=".4f", omvänd=False):
+    """
+    Influensmatris (företag × peer) som värmekarta; tomma celler (ingen referens) visas inte.
+    omvänd=True när höga värden är sämre.
+    """
+    lång = matris.rename_axis(index="Företag", columns="Peer").stack().rename(värde).reset_index()
+    spec = {
+        "mark": "rect",
+        "encoding": {
+            "x": {"field": "Peer", "type": "nominal", "sort": list(matris.columns)},
+            "y": {"field": "Företag", "type": "nominal", "sort": list(matris.index)},
+            "color": {"field": värde, "type": "quantitative", "scale": {"scheme": "redyellowgreen", "reverse": omvänd}},
+            "tooltip": [
+                {"field": "Företag", "type": "nominal"},
+                {"field": "Peer", "type": "nominal"},
+                {"field": värde, "type": "quantitative", "format": value_format},
+            ],
+        },
+    }
+    if title:
+        spec["title"] = title
+    st.vega_lite_chart(lång, spec, width="stretch")
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from pystoned import CNLS, StoNED
 from app.run_logger import save_run
+from app.instrumentation import Mätning
 
 def run_pystoned_model(
     df: pd.DataFrame,
@@ -22,39 +23,46 @@ def run_pystoned_model(
     - Effektivitet θ = 1 / (1 + u_hat) beräknas via KDE.
     - Outliers identifieras via boxplotregel på θ.
     - Outliers får sina krav baserat på θ1 (första körningen).
+    - Tid per steg (CNLS, KDE, outlierdetektering m.m.) sparas under "prestanda".
     """
+    mätning = Mätning("PyStoned")
     df = df.copy()
     x = df[input_cols].to_numpy()
     y = df[output_cols].to_numpy()
 
     # Första skattning (alla med)
-    cnls1 = CNLS.CNLS(y=y, x=x, rts=rts, fun=fun, cet=cet)
-    cnls1.optimize(solver="local" if cet == "mult" else None)
-    stoned1 = StoNED.StoNED(cnls1)
-    stoned1.get_technical_inefficiency(method="QLE")
-    u_hat1 = stoned1.get_technical_inefficiency(method="KDE")
-    theta1 = 1 / (1 + u_hat1)
+    with mätning.steg("CNLS (körning 1)"):
+        cnls1 = CNLS.CNLS(y=y, x=x, rts=rts, fun=fun, cet=cet)
+        cnls1.optimize(solver="local" if cet == "mult" else None)
+    with mätning.steg("StoNED/KDE (körning 1)"):
+        stoned1 = StoNED.StoNED(cnls1)
+        stoned1.get_technical_inefficiency(method="QLE")
+        u_hat1 = stoned1.get_technical_inefficiency(method="KDE")
+        theta1 = 1 / (1 + u_hat1)
 
     # Outlieridentifiering
-    if outlier_filter:
-        q25 = np.percentile(theta1, 25)
-        q75 = np.percentile(theta1, 75)
-        threshold = q25 - 2 * (q75 - q25)
-        mask = theta1 >= threshold
-        df["is_outlier"] = ~mask
-    else:
-        mask = np.ones(len(df), dtype=bool)
-        df["is_outlier"] = False
+    with mätning.steg("outlierdetektering"):
+        if outlier_filter:
+            q25 = np.percentile(theta1, 25)
+            q75 = np.percentile(theta1, 75)
+            threshold = q25 - 2 * (q75 - q25)
+            mask = theta1 >= threshold
+            df["is_outlier"] = ~mask
+        else:
+            mask = np.ones(len(df), dtype=bool)
+            df["is_outlier"] = False
 
     # Andra skattning utan outliers
     x_clean = x[mask]
     y_clean = y[mask]
-    cnls2 = CNLS.CNLS(y=y_clean, x=x_clean, rts=rts, fun=fun, cet=cet)
-    cnls2.optimize(solver="local" if cet == "mult" else None)
-    stoned2 = StoNED.StoNED(cnls2)
-    stoned2.get_technical_inefficiency(method="QLE")
-    u_hat2 = stoned2.get_technical_inefficiency(method="KDE")
-    theta2 = 1 / (1 + u_hat2)
+    with mätning.steg("CNLS (körning 2)"):
+        cnls2 = CNLS.CNLS(y=y_clean, x=x_clean, rts=rts, fun=fun, cet=cet)
+        cnls2.optimize(solver="local" if cet == "mult" else None)
+    with mätning.steg("StoNED/KDE (körning 2)"):
+        stoned2 = StoNED.StoNED(cnls2)
+        stoned2.get_technical_inefficiency(method="QLE")
+        u_hat2 = stoned2.get_technical_inefficiency(method="KDE")
+        theta2 = 1 / (1 + u_hat2)
 
     # Tilldela theta och krav
     result_theta = []
@@ -92,12 +100,14 @@ def run_pystoned_model(
     df["Kravmetod"] = kravmetod
 
     # Konvertera till float för loggning
-    df_for_loggning = df.copy()
-    for col in ["Effektivitet", "Effkrav_proc"]:
-        if col in df_for_loggning.columns:
-            df_for_loggning[col] = pd.to_numeric(df_for_loggning[col], errors="coerce")
+    with mätning.steg("förbered loggning"):
+        df_for_loggning = df.copy()
+        for col in ["Effektivitet", "Effkrav_proc"]:
+            if col in df_for_loggning.columns:
+                df_for_loggning[col] = pd.to_numeric(df_for_loggning[col], errors="coerce")
 
-    save_run("PyStoned", {
+    mätning.avsluta()
+    run_id = save_run("PyStoned", {
         "rts": rts,
         "fun": fun,
         "cet": cet,
@@ -107,6 +117,9 @@ def run_pystoned_model(
         "trunkering_max": trunkering_max,
         "outlier_filter": outlier_filter,
         "kravmetod": kravmetod
-    }, df_for_loggning)
+    }, df_for_loggning, prestanda=mätning.som_dict())
+
+    df.attrs["run_id"] = run_id
+    df.attrs["prestanda"] = mätning.som_dict()
 
     return df
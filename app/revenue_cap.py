@@ -0,0 +1,226 @@
+# app/revenue_cap.py
+
+"""
+Projektion av effektiviseringskravets effekt på intäktsramen över tillsynsperioden.
+
+Varje sparad körning (DEA, PyStoned, SFA …) är ett scenario. För alla företag och
+alla scenarier räknas samtidigt, som arrayer scenario × företag × år:
+
+    påverkbar_t  = kostnadsbas × (1 − Effkrav_proc)^t          t = 1 … PERIODLÄNGD
+    Effkrav (kr) = kostnadsbas − påverkbar_t                    ackumulerat krav år t
+    Intäktsram_t = påverkbar_t + kapitalkostnad (om den inte ingår i kostnadsbasen)
+
+Kostnadsbas:
+- OPEXp: kravet läggs på de påverkbara driftskostnaderna; kapitalkostnaden läggs till oförändrad.
+- TOTEX: kravet läggs på OPEXp + kapitalkostnad (samma bas som "Bas för krav i kr"
+  i Företagsanalys).
+
+Kapitalkostnaden tas antingen från körningens CAPEX eller från en Kapitalbas-körning
+(Kapitalkostnad per REId, se app/kapitalbas.py).
+
+Körningarna läses direkt ur run store med bara de kolumner som behövs (pyarrow).
+Beräkningen är en enda vektoriserad operation över hela arrayen.
+
+Kör med:
+    python -m app.revenue_cap dea_2025-... pystoned_2025-... --bas TOTEX
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.run_logger import RUNS_DIR, load_run_table
+
+PERIODLÄNGD = 4
+KOSTNADSBASER = ("OPEXp", "TOTEX")
+
+
+def _läs_kolumner(run_id: str, kolumner: list) -> pd.DataFrame:
+    """Bara de kolumner som finns och behövs ur körningens feather-fil."""
+    return load_run_table(run_id, kolumner).to_pandas()
+
+
+def _modellnamn(run_id: str) -> str:
+    import yaml # type: ignore
+
+    with open(os.path.join(RUNS_DIR, run_id, "params.yaml")) as f:
+        return (yaml.safe_load(f) or {}).get("modell", run_id.split("_", 1)[0])
+
+
+@dataclass(frozen=True)
+class Projektion:
+    """Intäktsramsprojektion som arrayer scenario × företag × år."""
+
+    scenarier: list          # run_id per scenario
+    modeller: list           # modellnamn per scenario
+    reid: np.ndarray         # företag (REId)
+    företag: np.ndarray      # företagsnamn per REId
+    år: np.ndarray           # kalenderår i perioden
+    kostnadsbas: str
+    effkrav_proc: np.ndarray  # scenario × företag
+    bas: np.ndarray           # scenario × företag, kostnad som kravet läggs på
+    kapital: np.ndarray       # scenario × företag, kapitalkostnad utanför kravet
+    påverkbar: np.ndarray     # scenario × företag × år
+    krav_kr: np.ndarray       # scenario × företag × år
+    intäktsram: np.ndarray    # scenario × företag × år
+
+    def lång(self) -> pd.DataFrame:
+        """En rad per scenario, företag och år."""
+        s, f, t = self.intäktsram.shape
+        return pd.DataFrame({
+            "Scenario": np.repeat(self.scenarier, f * t),
+            "Modell": np.repeat(self.modeller, f * t),
+            "REId": np.tile(np.repeat(self.reid, t), s),
+            "Företag": np.tile(np.repeat(self.företag, t), s),
+            "År": np.tile(self.år, s * f),
+            "Effkrav (%)": np.repeat(self.effkrav_proc.ravel() * 100, t),
+            "Påverkbara kostnader": self.påverkbar.ravel(),
+            "Effkrav (kr)": self.krav_kr.ravel(),
+            "Intäktsram": self.intäktsram.ravel(),
+        })
+
+    def för_företag(self, reid: str) -> pd.DataFrame:
+        """Ett företags rader (scenario × år) direkt ur arrayerna, utan att bygga lång()."""
+        träff = np.flatnonzero(self.reid == reid)
+        if len(träff) == 0:
+            raise KeyError(f"{reid!r} finns inte i projektionen.")
+        f = int(träff[0])
+        s, _, t = self.intäktsram.shape
+        return pd.DataFrame({
+            "Scenario": np.repeat(self.scenarier, t),
+            "Modell": np.repeat(self.modeller, t),
+            "År": np.tile(self.år, s),
+            "Effkrav (%)": np.repeat(self.effkrav_proc[:, f] * 100, t),
+            "Påverkbara kostnader": self.påverkbar[:, f].ravel(),
+            "Effkrav (kr)": self.krav_kr[:, f].ravel(),
+            "Intäktsram": self.intäktsram[:, f].ravel(),
+        })
+
+    def per_år(self) -> pd.DataFrame:
+        """Summa över företagen per scenario och år (företag utan krav räknas inte)."""
+        s, _, t = self.intäktsram.shape
+        return pd.DataFrame({
+            "Scenario": np.repeat(self.scenarier, t),
+            "Modell": np.repeat(self.modeller, t),
+            "År": np.tile(self.år, s),
+            "Antal företag": np.repeat(np.isfinite(self.effkrav_proc).sum(axis=1), t),
+            "Effkrav (kr)": np.nansum(self.krav_kr, axis=1).ravel(),
+            "Intäktsram": np.nansum(self.intäktsram, axis=1).ravel(),
+        })
+
+    def periodsumma(self, värde: str = "Effkrav (kr)") -> pd.DataFrame:
+        """Summan över perioden per företag (rader) och scenario (kolumner)."""
+        data = {"Effkrav (kr)": self.krav_kr, "Intäktsram": self.intäktsram}[värde]
+        with np.errstate(invalid="ignore"):
+            summa = np.where(np.isfinite(self.effkrav_proc), np.nansum(data, axis=2), np.nan)
+        tabell = pd.DataFrame(summa.T, columns=self.scenarier)
+        tabell.insert(0, "Företag", self.företag)
+        tabell.insert(0, "REId", self.reid)
+        return tabell
+
+
+def _kapital_från_kapitalbas(run_id: str, reid: pd.Index) -> np.ndarray:
+    tabell = _läs_kolumner(run_id, ["REId", "Kapitalkostnad"])
+    serie = tabell.groupby("REId", observed=True)["Kapitalkostnad"].sum()
+    return serie.reindex(reid).to_numpy(dtype=float)
+
+
+def project_revenue_cap(
+    run_ids: list,
+    kostnadsbas: str = "OPEXp",
+    kapitalbas_run_id: str = None,
+    startår: int = 2024,
+    periodlängd: int = PERIODLÄNGD,
+) -> Projektion:
+    """
+    Intäktsramsprojektion för alla företag i de angivna körningarna.
+
+    Företag som saknas i en körning eller saknar Effkrav_proc (t.ex. NaN från
+    modellen) får NaN i det scenariot. Med kapitalbas_run_id hämtas
+    kapitalkostnaden från Kapitalbas-körningen i stället för körningarnas CAPEX.
+    """
+    from app.instrumentation import Mätning
+
+    if kostnadsbas not in KOSTNADSBASER:
+        raise ValueError(f"Okänd kostnadsbas {kostnadsbas!r}. Välj bland {KOSTNADSBASER}.")
+    if not run_ids:
+        raise ValueError("Minst en körning krävs.")
+
+    mätning = Mätning("Intäktsramsprojektion")
+    with mätning.steg("läs run store"):
+        tabeller = [_läs_kolumner(r, ["REId", "Företag", "Effkrav_proc", "OPEXp", "CAPEX"]) for r in run_ids]
+        modeller = [_modellnamn(r) for r in run_ids]
+
+    with mätning.steg("ordna scenario × företag"):
+        # Gemensam företagsaxel: alla REId som förekommer i någon körning
+        alla = pd.concat(tabeller, keys=range(len(tabeller)), names=["scenario", None])
+        alla = alla.dropna(subset=["REId"]).reset_index(level=0)
+        reid = pd.Index(pd.unique(alla["REId"].astype(str)))
+        if "Företag" in alla.columns:
+            namn = alla.drop_duplicates("REId").set_index("REId")["Företag"].reindex(reid)
+        else:
+            namn = pd.Series(reid, index=reid)
+
+        s, f = len(run_ids), len(reid)
+        rad = alla["scenario"].to_numpy()
+        kolumn = reid.get_indexer(alla["REId"].astype(str))
+
+        def matris(kolumnnamn):
+            m = np.full((s, f), np.nan)
+            if kolumnnamn in alla.columns:
+                m[rad, kolumn] = pd.to_numeric(alla[kolumnnamn], errors="coerce").to_numpy(dtype=float)
+            return m
+
+        effkrav = matris("Effkrav_proc")
+        opex = matris("OPEXp")
+        if kapitalbas_run_id is not None:
+            kapital = np.broadcast_to(_kapital_från_kapitalbas(kapitalbas_run_id, reid), (s, f)).copy()
+        else:
+            kapital = matris("CAPEX")
+
+    with mätning.steg("projektion"):
+        if kostnadsbas == "TOTEX":
+            bas, utanför = opex + kapital, np.zeros_like(kapital)
+        else:
+            bas, utanför = opex, kapital
+        t = np.arange(1, periodlängd + 1, dtype=float)
+        faktor = (1.0 - effkrav[:, :, None]) ** t  # scenario × företag × år
+        påverkbar = bas[:, :, None] * faktor
+        krav_kr = bas[:, :, None] - påverkbar
+        intäktsram = påverkbar + utanför[:, :, None]
+
+    mätning.avsluta()
+    return Projektion(
+        scenarier=list(run_ids),
+        modeller=modeller,
+        reid=reid.to_numpy(dtype=object),
+        företag=namn.to_numpy(dtype=object),
+        år=np.arange(startår, startår + periodlängd),
+        kostnadsbas=kostnadsbas,
+        effkrav_proc=effkrav,
+        bas=bas,
+        kapital=utanför,
+        påverkbar=påverkbar,
+        krav_kr=krav_kr,
+        intäktsram=intäktsram,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Intäktsramsprojektion över tillsynsperioden för sparade körningar.")
+    parser.add_argument("run_ids", nargs="+")
+    parser.add_argument("--bas", choices=KOSTNADSBASER, default="OPEXp")
+    parser.add_argument("--kapitalbas", help="run_id för en Kapitalbas-körning")
+    parser.add_argument("--startår", type=int, default=2024)
+    parser.add_argument("--ut", help="Skriv alla rader (scenario × företag × år) som CSV")
+    args = parser.parse_args()
+
+    projektion = project_revenue_cap(args.run_ids, args.bas, args.kapitalbas, args.startår)
+    print(projektion.per_år().to_string(index=False))
+    if args.ut:
+        projektion.lång().to_csv(args.ut, index=False)
+        print(f"\nSkrivet till {args.ut}")
@@ -1,40 +1,227 @@
 # app/run_logger.py
 
 import os
+import uuid
+import shutil
+import atexit
+import queue
+import logging
+import threading
+import time
+from collections import OrderedDict
 import yaml # type: ignore
 import pandas as pd
 from datetime import datetime
 
 RUNS_DIR = "runs"
+# Högst så många oavhämtade skrivfel sparas (äldsta släpps först)
+MAX_SKRIVFEL = 100
 
-def save_run(modellnamn: str, parametrar: dict, df_resultat: pd.DataFrame):
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    run_id = f"{modellnamn.lower()}_{timestamp}"
+logger = logging.getLogger(__name__)
+
+
+class RunWriteError(RuntimeError):
+    """Körningen kunde inte skrivas till disk av bakgrundsskrivaren."""
+
+
+class _RunWriter:
+    """
+    Bakgrundstråd som skriver modellkörningar till RUNS_DIR.
+
+    Modellerna lämnar över sitt resultat och får tillbaka ett run_id direkt,
+    så att sidan kan visa resultaten medan YAML och feather skrivs i bakgrunden.
+    Kvarvarande körningar töms vid avslut (atexit).
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Bara körningar som väntar på skrivning ligger i _done; misslyckade ligger
+        # i _errors tills wait eller pop_errors har hämtat dem (högst MAX_SKRIVFEL).
+        # Ingen av dem växer alltså med antalet körningar under serverns livstid.
+        self._done = {}              # run_id -> threading.Event
+        self._errors = OrderedDict()  # run_id -> Exception
+        self._thread = None
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="run-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, run_id, meta, df_resultat, artefakter=None):
+        with self._lock:
+            self._done[run_id] = threading.Event()
+        self._ensure_thread()
+        self._queue.put((run_id, meta, df_resultat, artefakter))
+
+    def _loop(self):
+        while True:
+            run_id, meta, df_resultat, artefakter = self._queue.get()
+            try:
+                _write_run(run_id, meta, df_resultat, artefakter)
+            except Exception as e:
+                logger.exception("Kunde inte spara körning %s", run_id)
+                with self._lock:
+                    self._errors[run_id] = e
+                    while len(self._errors) > MAX_SKRIVFEL:
+                        self._errors.popitem(last=False)
+            finally:
+                # Väntande anropare har redan sin Event; senare anrop ser katalogen (eller felet)
+                with self._lock:
+                    self._done.pop(run_id).set()
+                self._queue.task_done()
+
+    def wait(self, run_id, timeout=None):
+        with self._lock:
+            event = self._done.get(run_id)
+        if event is not None and not event.wait(timeout):
+            return False
+        with self._lock:
+            error = self._errors.pop(run_id, None)
+        if error is not None:
+            raise RunWriteError(f"Körning {run_id} kunde inte sparas: {error}") from error
+        # Skriven – eller okänd för skrivaren och i så fall antingen på disk eller aldrig sparad
+        return event is not None or os.path.isdir(os.path.join(RUNS_DIR, run_id))
+
+    def flush(self, timeout=None):
+        with self._lock:
+            pending = list(self._done.values())
+        return all(event.wait(timeout) for event in pending)
+
+    def pending(self):
+        with self._lock:
+            return set(self._done)
+
+    def pop_errors(self, run_ids):
+        with self._lock:
+            return [(r, self._errors.pop(r)) for r in run_ids if r in self._errors]
+
+
+_writer = _RunWriter()
+atexit.register(_writer.flush)
+
+
+def _new_run_id(modellnamn: str, timestamp: str) -> str:
+    # Sekundupplösningen räcker inte när flera sessioner kör samma modell
+    # samtidigt – ett slumpat suffix gör id:t unikt utan låsning
+    return f"{modellnamn.lower()}_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+
+def _write_run(run_id: str, meta: dict, df_resultat: pd.DataFrame, artefakter: dict = None):
+    """
+    Skriver körningen till en temporär katalog och byter sedan namn på den.
+
+    Namnbytet är atomärt, så läsare ser antingen en komplett körning eller
+    ingen alls och behöver inga lås. Temporära kataloger (punkt-prefix)
+    ignoreras av list_runs. Artefakter skrivs som <namn>.feather bredvid resultatet.
+    """
+    os.makedirs(RUNS_DIR, exist_ok=True)
+    tmp_path = os.path.join(RUNS_DIR, f".tmp-{run_id}-{os.getpid()}")
     path = os.path.join(RUNS_DIR, run_id)
-    os.makedirs(path, exist_ok=True)
+    os.makedirs(tmp_path)
+
+    try:
+        # Resultat
+        start = time.perf_counter()
+        df_resultat.to_feather(os.path.join(tmp_path, "result.feather"))
+        for namn, df_artefakt in (artefakter or {}).items():
+            df_artefakt.to_feather(os.path.join(tmp_path, f"{namn}.feather"))
+        if "prestanda" in meta:
+            # Nya dictar – anroparens prestanda-dict ändras inte
+            skrivning = {"steg": "save_run (skrivning)", "sekunder": round(time.perf_counter() - start, 4)}
+            meta = {**meta, "prestanda": {**meta["prestanda"], "steg": [*meta["prestanda"]["steg"], skrivning]}}
+
+        # YAML (skrivs sist så att skrivtiden kommer med)
+        with open(os.path.join(tmp_path, "params.yaml"), "w") as f:
+            yaml.dump(meta, f, allow_unicode=True)
+
+        os.rename(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def save_run(
+    modellnamn: str,
+    parametrar: dict,
+    df_resultat: pd.DataFrame,
+    vänta: bool = False,
+    prestanda: dict = None,
+    artefakter: dict = None,
+) -> str:
+    """
+    Lämnar över en körning till bakgrundsskrivaren och returnerar dess run_id.
+
+    df_resultat och artefakterna lämnas över utan kopiering och får inte ändras
+    av anroparen efteråt (inte heller df.attrs) – modellerna lämnar över en egen
+    df_for_loggning. Med vänta=True blockerar anropet tills körningen ligger på
+    disk (se även wait_for_run).
+    prestanda (Mätning.som_dict() från app.instrumentation) sparas i metadata;
+    bakgrundsskrivaren lägger till tiden för själva skrivningen.
+    artefakter (namn → DataFrame) sparas som extra tabeller i körningen, t.ex.
+    DEA:s peers; läs dem med load_run_artifact.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    run_id = _new_run_id(modellnamn, timestamp)
 
-    # YAML
     meta = {
         "modell": modellnamn,
         "timestamp": timestamp,
         "parametrar": parametrar,
     }
-    with open(os.path.join(path, "params.yaml"), "w") as f:
-        yaml.dump(meta, f)
+    if prestanda is not None:
+        meta["prestanda"] = prestanda
+    if artefakter:
+        meta["artefakter"] = sorted(artefakter)
+    _writer.submit(run_id, meta, df_resultat, artefakter)
 
-    # Resultat
-    df_resultat.to_feather(os.path.join(path, "result.feather"))
+    if vänta:
+        wait_for_run(run_id)
+    return run_id
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import os
-import yaml # type: ignore
 
-def list_runs():
-    return sorted(os.listdir("runs"))
+def wait_for_run(run_id: str, timeout: float = None) -> bool:
+    """
+    Väntar tills körningen är skriven. Returnerar False vid timeout och
+    kastar RunWriteError om skrivningen misslyckades.
+    """
+    return _writer.wait(run_id, timeout)
+
+
+def flush_runs(timeout: float = None) -> bool:
+    """Väntar tills alla inlämnade körningar är skrivna (eller har misslyckats)."""
+    return _writer.flush(timeout)
+
+
+def pending_runs() -> set:
+    """run_id för körningar som ännu inte är skrivna."""
+    return _writer.pending()
+
+
+def pop_write_errors(run_ids) -> list:
+    """
+    Returnerar (run_id, fel) för de av run_ids vars skrivning misslyckats och som
+    ännu inte rapporterats. Felen är processgemensamma – varje session hämtar bara
+    sina egna körningar.
+    """
+    return _writer.pop_errors(run_ids)
+
+def list_runs(modeller=None):
+    # Endast färdiga körningar – pågående skrivningar ligger i .tmp-kataloger.
+    # modeller begränsar till vissa modellnamn (run_id börjar med modellnamnet).
+    if not os.path.isdir(RUNS_DIR):
+        return []
+    prefix = tuple(f"{m.lower()}_" for m in modeller) if modeller else ("",)
+    return sorted(
+        name for name in os.listdir(RUNS_DIR)
+        if not name.startswith(".") and name.startswith(prefix)
+        and os.path.isfile(os.path.join(RUNS_DIR, name, "params.yaml"))
+    )
 
 def load_run(run_id):
-    path = os.path.join("runs", run_id)
+    wait_for_run(run_id)
+    path = os.path.join(RUNS_DIR, run_id)
     with open(os.path.join(path, "params.yaml")) as f:
         params = yaml.safe_load(f)
     df = pd.read_feather(os.path.join(path, "result.feather"))
@@ -43,6 +230,34 @@ def load_run(run_id):
             df[col] = df[col].where(df[col].notna(), "OUTLIER")
     return params, df
 
+def load_run_table(run_id, kolumner=None):
+    """
+    Körningens resultat som Arrow-tabell, utan omväg över pandas.
+
+    Typerna bevaras (NaN i stället för "OUTLIER"). Med kolumner läses bara de
+    angivna kolumner som finns i körningen (minnesmappad fil).
+    """
+    import pyarrow.ipc as ipc
+    import pyarrow.feather as feather
+
+    wait_for_run(run_id)
+    sökväg = os.path.join(RUNS_DIR, run_id, "result.feather")
+    if kolumner is not None:
+        with ipc.open_file(sökväg) as läsare:
+            finns = set(läsare.schema.names)
+        kolumner = [k for k in kolumner if k in finns]
+    return feather.read_table(sökväg, columns=kolumner, memory_map=True)
+
+
+def load_run_artifact(run_id, namn):
+    """En extra tabell som sparats med körningen (save_run(artefakter=...)), eller None."""
+    wait_for_run(run_id)
+    sökväg = os.path.join(RUNS_DIR, run_id, f"{namn}.feather")
+    if not os.path.isfile(sökväg):
+        return None
+    return pd.read_feather(sökväg)
+
+
 def compare_runs(run_id_a, run_id_b):
     params_a, df_a = load_run(run_id_a)
     params_b, df_b = load_run(run_id_b)
@@ -67,6 +282,8 @@ def compare_runs(run_id_a, run_id_b):
     print(merged.sort_values("Diff", key=abs, ascending=False).head())
 
     # Scatterplot
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(6, 6))
     plt.scatter(merged["Eff_A"], merged["Eff_B"], alpha=0.7)
     plt.xlabel("Effektivitet - Körning A")
@@ -0,0 +1,171 @@
+# app/scenario_grid.py
+
+"""
+Scenariorutnät för Företagsanalys (DEA).
+
+I stället för en full modellkörning per simulering definieras procentuella
+variationer för ett eller flera indatafält (t.ex. OPEXp −20…+20 % i steg om 5 %
+korsat med CAPEX). Alla kombinationer utvärderas mot en fast referensgrupp:
+de företag i vald körning som inte är outliers, med det analyserade företaget
+borttaget (supereffektivitet enligt samma LP som run_dea_model).
+
+LP:erna delar bivillkorsmatris – bara företagets egen kolumn (θ·x₀) och
+högerledet (y₀) skiljer mellan scenarierna – så matrisen byggs en gång och
+scenarierna löses parallellt med HiGHS (scipy.optimize.linprog).
+
+Resultatet är en responsyta för Effektivitet, Effkrav (%) och Effkrav (kr).
+Eftersom fronten hålls fast är resultatet jämförbart med ursprungskörningen,
+men outlierklassningen görs inte om per scenario.
+"""
+
+import os
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.dea_model import effkrav_proc
+
+MAX_SCENARIER = 5000
+
+
+def procentsteg(från: float, till: float, steg: float) -> list:
+    """Procentuella förändringar från–till (inklusive) i givna steg, t.ex. (-20, 20, 5)."""
+    antal = int(round((till - från) / steg)) + 1
+    return [round(från + i * steg, 10) for i in range(max(antal, 1))]
+
+
+def scenario_grid(bas: dict, variationer: dict) -> pd.DataFrame:
+    """
+    Alla kombinationer av variationerna (kolumn → lista med procent) applicerade på bas.
+
+    Returnerar en rad per scenario med kolumnerna "Δ <kolumn> (%)" och de nya
+    absoluta värdena för samtliga fält i bas. TOTEX räknas om när den finns.
+    """
+    kolumner = list(variationer)
+    kombinationer = list(itertools.product(*(variationer[k] for k in kolumner)))
+    if len(kombinationer) > MAX_SCENARIER:
+        raise ValueError(f"{len(kombinationer)} scenarier – max är {MAX_SCENARIER}. Minska intervallen eller öka steget.")
+
+    procent = np.array(kombinationer, dtype=float).reshape(len(kombinationer), len(kolumner))
+    grid = pd.DataFrame({f"Δ {k} (%)": procent[:, i] for i, k in enumerate(kolumner)})
+    for fält, värde in bas.items():
+        grid[fält] = float(värde)
+    for i, k in enumerate(kolumner):
+        grid[k] = float(bas[k]) * (1 + procent[:, i] / 100)
+    if "TOTEX" in grid.columns and "TOTEX" not in variationer:
+        grid["TOTEX"] = grid["OPEXp"] + grid["CAPEX"]
+    return grid
+
+
+class _SuperEffektivitetLP:
+    """
+    Inputorienterad supereffektivitet mot en fast referensgrupp, matrisform för HiGHS.
+
+    Varje input- och outputkolumn skalas med sitt medelvärde i referensgruppen.
+    θ påverkas inte av skalningen, men utan den blandas MWh-värden kring 1e7 med
+    små inputs i samma matris och HiGHS landar i suboptimala lösningar.
+    """
+
+    def __init__(self, X_ref: np.ndarray, Y_ref: np.ndarray, rts: str = "crs"):
+        m = len(X_ref)
+        n_in, n_out = X_ref.shape[1], Y_ref.shape[1]
+        self.skala_x = self._skala(X_ref)
+        self.skala_y = self._skala(Y_ref)
+        # Variabler: [θ, λ_1 … λ_m]
+        self.c = np.zeros(m + 1)
+        self.c[0] = 1.0
+        self.A_ub = np.zeros((n_out + n_in, m + 1))
+        self.A_ub[:n_out, 1:] = -(Y_ref / self.skala_y).T   # Σ λ_j y_jr ≥ y_0r
+        self.A_ub[n_out:, 1:] = (X_ref / self.skala_x).T    # Σ λ_j x_jk ≤ θ x_0k
+        self.n_out = n_out
+        if rts == "vrs":
+            self.A_eq = np.concatenate([[0.0], np.ones(m)])[None, :]
+            self.b_eq = np.array([1.0])
+        else:
+            self.A_eq = None
+            self.b_eq = None
+
+    @staticmethod
+    def _skala(M: np.ndarray) -> np.ndarray:
+        skala = np.abs(M).mean(axis=0) if len(M) else np.ones(M.shape[1])
+        return np.where(np.isfinite(skala) & (skala > 0), skala, 1.0)
+
+    def lös(self, x0: np.ndarray, y0: np.ndarray, utesluten: int = None) -> float:
+        """θ för (x0, y0); utesluten är en rad i referensgruppen vars λ låses till 0."""
+        from scipy.optimize import linprog
+
+        if np.any(np.isnan(x0)) or np.any(np.isnan(y0)):
+            return np.nan
+        x0 = np.asarray(x0, dtype=float) / self.skala_x
+        y0 = np.asarray(y0, dtype=float) / self.skala_y
+        A_ub = self.A_ub.copy()
+        A_ub[self.n_out:, 0] = -x0
+        b_ub = np.concatenate([-y0, np.zeros(len(x0))])
+        bounds = (0, None)
+        if utesluten is not None:
+            bounds = [(0, None)] * len(self.c)
+            bounds[utesluten + 1] = (0, 0)
+        res = linprog(self.c, A_ub=A_ub, b_ub=b_ub, A_eq=self.A_eq, b_eq=self.b_eq, bounds=bounds, method="highs")
+        if res.status == 0:
+            return float(res.x[0])
+        if res.status == 2:
+            # Ogenomförbart under VRS: företaget ligger utanför referensgruppens front
+            # (fullt effektivt) – ger Effektivitet 1 och lägsta krav
+            return np.inf
+        raise RuntimeError(f"Supereffektivitets-LP:n kunde inte lösas (HiGHS status {res.status}): {res.message}")
+
+
+def referensgrupp(df_run: pd.DataFrame, företag: str) -> pd.DataFrame:
+    """Körningens icke-outliers utom det analyserade företaget."""
+    ref = df_run[df_run["Företag"] != företag]
+    if "is_outlier" in ref.columns:
+        ref = ref[~ref["is_outlier"].fillna(True).astype(bool)]
+    return ref
+
+
+def run_scenario_grid(
+    df_run: pd.DataFrame,
+    företag: str,
+    variationer: dict,
+    bas: dict = None,
+    rts: str = "crs",
+    input_cols: list = ["CAPEX", "OPEXp"],
+    output_cols: list = ["CU", "MW", "NS", "MWhl", "MWhh"],
+    trunkering_min: float = 0.162416,
+    trunkering_max: float = 0.3,
+    kr_bas_col: str = "OPEXp",
+    n_jobs: int = None,
+) -> pd.DataFrame:
+    """
+    Utvärderar alla scenarier för företaget mot körningens fasta referensgrupp.
+
+    - bas: företagets utgångsvärden (default: raden i df_run)
+    - variationer: kolumn → lista med procentuella förändringar
+    """
+    if bas is None:
+        rad = df_run[df_run["Företag"] == företag].iloc[0]
+        fält = list(dict.fromkeys(input_cols + output_cols + [k for k in ["OPEXp", "CAPEX", "TOTEX"] if k in df_run.columns]))
+        bas = {k: rad[k] for k in fält}
+
+    grid = scenario_grid(bas, variationer)
+
+    ref = referensgrupp(df_run, företag)
+    X_ref = ref[input_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    Y_ref = ref[output_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    komplett = ~(np.isnan(X_ref).any(axis=1) | np.isnan(Y_ref).any(axis=1))
+    lp = _SuperEffektivitetLP(X_ref[komplett], Y_ref[komplett], rts)
+
+    X = grid[input_cols].to_numpy(dtype=float)
+    Y = grid[output_cols].to_numpy(dtype=float)
+    with ThreadPoolExecutor(max_workers=n_jobs or min(os.cpu_count() or 1, 8)) as pool:
+        theta = np.fromiter(pool.map(lp.lös, X, Y), dtype=float, count=len(grid))
+
+    grid["Supereffektivitet"] = theta
+    grid["Effektivitet"] = np.minimum(theta, 1)
+    grid["Effkrav_proc"] = effkrav_proc(theta, trunkering_min, trunkering_max)
+    grid["Effkrav (%)"] = grid["Effkrav_proc"] * 100
+    grid["Effkrav (kr)"] = grid["Effkrav_proc"] * grid[kr_bas_col]
+    grid.attrs["referensgrupp"] = int(komplett.sum())
+    return grid
@@ -0,0 +1,243 @@
+# app/shared_cache.py
+
+"""
+Processgemensamma, skrivskyddade cacher för indata, anläggningsregister,
+geometrilager och sparade körningar.
+
+st.cache_data picklar och kopierar värdet vid varje träff, så varje session får
+en egen kopia av t.ex. en GeoDataFrame. Här delar alla sessioner i processen
+samma objekt. Varje anropare får en grund kopia (df.copy(deep=False)), så att
+nya eller ersatta kolumner bara syns i anroparens kopia, medan själva datat delas.
+
+Varje cache har en övre gräns för både antal poster och uppskattat minne och
+kastar ut den minst nyligen använda posten (LRU). Minnet håller sig därmed
+konstant när antalet sessioner växer. Gränserna kan sättas med miljövariabler
+(DASHBOARD_CACHE_<NAMN>_MB).
+
+Nycklarna innehåller källfilens storlek och ändringstid, så en ny Excel-fil
+eller ett ombyggt geometrilager ger en ny post i stället för inaktuella data.
+Körningar ändras aldrig efter att de skrivits och nycklas på run_id.
+
+Regeln för anropare: ändra aldrig värden på plats (df.loc[...] = ..., inplace=True)
+i det som returneras – lägg till eller ersätt hela kolumner i stället.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def _storlek_bytes(värde) -> int:
+    """Ungefärlig minnesstorlek för värden som läggs i cachen."""
+    if isinstance(värde, pd.DataFrame):
+        storlek = int(värde.memory_usage(index=True, deep=True).sum())
+        geometri = getattr(värde, "_geometry_column_name", None)
+        if geometri in värde.columns:
+            # deep=True räknar bara pekarna till shapely-objekten
+            import shapely
+            storlek += int(shapely.get_num_coordinates(värde[geometri].values).sum()) * 16
+        return storlek
+    if isinstance(värde, (tuple, list)):
+        return sum(_storlek_bytes(v) for v in värde)
+    if isinstance(värde, dict):
+        return sum(_storlek_bytes(v) for v in värde.values()) + sys.getsizeof(värde)
+    if hasattr(värde, "nbytes"):
+        return int(värde.nbytes)  # numpy-arrayer och Arrow-tabeller
+    if hasattr(värde, "__dataclass_fields__"):
+        return sum(_storlek_bytes(getattr(värde, f)) for f in värde.__dataclass_fields__)
+    return sys.getsizeof(värde)
+
+
+def _grund_kopia(värde):
+    if isinstance(värde, pd.DataFrame):
+        kopia = värde.copy(deep=False)
+        kopia.attrs = dict(värde.attrs)
+        return kopia
+    if isinstance(värde, tuple):
+        return tuple(_grund_kopia(v) for v in värde)
+    if isinstance(värde, dict):
+        return dict(värde)
+    return värde
+
+
+class SharedLRU:
+    """
+    Trådsäker LRU-cache delad av alla sessioner i processen.
+
+    get_or_load laddar ett värde högst en gång per nyckel även när flera
+    sessioner frågar samtidigt; övriga väntar på samma laddning.
+    """
+
+    def __init__(self, namn: str, max_bytes: int, max_poster: int):
+        self.namn = namn
+        self.max_bytes = max_bytes
+        self.max_poster = max_poster
+        self._poster = OrderedDict()  # nyckel -> (värde, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._laddar = {}  # nyckel -> threading.Lock
+        self.träffar = 0
+        self.missar = 0
+
+    def get_or_load(self, nyckel, laddare, kopia: bool = True):
+        with self._lock:
+            if nyckel in self._poster:
+                self._poster.move_to_end(nyckel)
+                self.träffar += 1
+                värde = self._poster[nyckel][0]
+                return _grund_kopia(värde) if kopia else värde
+            nyckellås = self._laddar.setdefault(nyckel, threading.Lock())
+
+        with nyckellås:
+            # En annan tråd kan ha hunnit ladda medan vi väntade
+            with self._lock:
+                if nyckel in self._poster:
+                    self._poster.move_to_end(nyckel)
+                    self.träffar += 1
+                    värde = self._poster[nyckel][0]
+                    return _grund_kopia(värde) if kopia else värde
+                self.missar += 1
+            try:
+                värde = laddare()
+                self._lägg_in(nyckel, värde)
+            finally:
+                with self._lock:
+                    self._laddar.pop(nyckel, None)
+        return _grund_kopia(värde) if kopia else värde
+
+    def _lägg_in(self, nyckel, värde):
+        storlek = _storlek_bytes(värde)
+        with self._lock:
+            if storlek > self.max_bytes:
+                return  # större än hela cachen – lämnas ut men behålls inte
+            self._poster[nyckel] = (värde, storlek)
+            self._bytes += storlek
+            while self._poster and (len(self._poster) > self.max_poster or self._bytes > self.max_bytes):
+                _, (_, utkastad) = self._poster.popitem(last=False)
+                self._bytes -= utkastad
+
+    def rensa(self):
+        with self._lock:
+            self._poster.clear()
+            self._bytes = 0
+
+    def statistik(self) -> dict:
+        with self._lock:
+            return {
+                "cache": self.namn,
+                "poster": len(self._poster),
+                "max_poster": self.max_poster,
+                "MB": round(self._bytes / 1e6, 1),
+                "max_MB": round(self.max_bytes / 1e6, 1),
+                "träffar": self.träffar,
+                "missar": self.missar,
+            }
+
+
+def _gräns_mb(namn: str, standard: int) -> int:
+    return int(float(os.environ.get(f"DASHBOARD_CACHE_{namn.upper()}_MB", standard)) * 1e6)
+
+
+INDATA = SharedLRU("indata", _gräns_mb("indata", 128), max_poster=4)
+GEOMETRI = SharedLRU("geometri", _gräns_mb("geometri", 512), max_poster=2)
+KÖRNINGAR = SharedLRU("körningar", _gräns_mb("körningar", 256), max_poster=32)
+
+
+def _filsignatur(sökväg: str) -> tuple:
+    stat = os.stat(sökväg)
+    return (os.path.abspath(sökväg), stat.st_size, stat.st_mtime_ns)
+
+
+def delad_data(filepath: str) -> pd.DataFrame:
+    """load_data delad mellan sessioner (ny post när filen ändras)."""
+    from app.data_loader import load_data
+
+    return INDATA.get_or_load(_filsignatur(filepath), lambda: load_data(filepath))
+
+
+def delat_anläggningsregister(filepath: str) -> pd.DataFrame:
+    """load_asset_register delad mellan sessioner (ny post när filen ändras)."""
+    from app.data_loader import load_asset_register
+
+    return INDATA.get_or_load(("register",) + _filsignatur(filepath), lambda: load_asset_register(filepath))
+
+
+def _lagernyckel(store_dir: str, shp_path: str) -> tuple:
+    from app.geometry_store import META_FILE
+
+    # Källfilens signatur fångar ändringar som kräver ombyggnad, metafilens ett redan ombyggt lager
+    return (store_dir,) + tuple(
+        _filsignatur(sökväg) if os.path.isfile(sökväg) else None
+        for sökväg in (shp_path, os.path.join(store_dir, META_FILE))
+    )
+
+
+def geometrilagrets_nyckel(store_dir: str = None, shp_path: str = None) -> tuple:
+    """Nyckel som ändras när geometrilagret byggs om – för cacher som bygger på lagret."""
+    from app.geometry_store import STORE_DIR, SHP_PATH
+
+    return _lagernyckel(store_dir or STORE_DIR, shp_path or SHP_PATH)
+
+
+def delat_geometrilager(store_dir: str = None, shp_path: str = None):
+    """Geometrilagret delat mellan sessioner; ett ombyggt lager får en ny post."""
+    from app.geometry_store import load_geometry_store, STORE_DIR, SHP_PATH
+
+    store_dir = store_dir or STORE_DIR
+    shp_path = shp_path or SHP_PATH
+    # Lagret är en fryst dataclass som aldrig ändras – ingen kopia behövs
+    return GEOMETRI.get_or_load(
+        geometrilagrets_nyckel(store_dir, shp_path), lambda: load_geometry_store(store_dir, shp_path), kopia=False
+    )
+
+
+def delade_former(laddare, store_dir: str = None, shp_path: str = None):
+    """Geometrilagrets REId × polygon-tabell (load_shapes) delad mellan sessioner."""
+    nyckel = ("former",) + geometrilagrets_nyckel(store_dir, shp_path)
+    return GEOMETRI.get_or_load(nyckel, laddare)
+
+
+def delad_körning(run_id: str):
+    """load_run delad mellan sessioner: (params, df) där df är en grund kopia."""
+    from app.run_logger import load_run
+
+    return KÖRNINGAR.get_or_load(run_id, lambda: load_run(run_id))
+
+
+def delad_körningstabell(run_id: str, kolumner: list = None):
+    """
+    Körningens resultat som Arrow-tabell delad mellan sessioner.
+
+    Arrow-tabeller är oföränderliga och delas utan kopia; att välja kolumner
+    är nollkopierande.
+    """
+    from app.run_logger import load_run_table
+
+    tabell = KÖRNINGAR.get_or_load(("arrow", run_id), lambda: load_run_table(run_id), kopia=False)
+    if kolumner is None:
+        return tabell
+    return tabell.select([k for k in kolumner if k in tabell.column_names])
+
+
+def delad_projektion(run_ids: tuple, kostnadsbas: str, kapitalbas_run_id: str = None, startår: int = 2024):
+    """
+    project_revenue_cap delad mellan sessioner.
+
+    Körningar ändras aldrig efter att de skrivits, så argumenten räcker som nyckel.
+    Projektionen är en fryst dataclass och delas utan kopia.
+    """
+    from app.revenue_cap import project_revenue_cap
+
+    nyckel = ("intäktsram", tuple(run_ids), kostnadsbas, kapitalbas_run_id, int(startår))
+    return KÖRNINGAR.get_or_load(
+        nyckel,
+        lambda: project_revenue_cap(list(run_ids), kostnadsbas, kapitalbas_run_id, int(startår)),
+        kopia=False,
+    )
+
+
+def cachestatistik() -> list:
+    return [cache.statistik() for cache in (INDATA, GEOMETRI, KÖRNINGAR)]
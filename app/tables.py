@@ -0,0 +1,164 @@
+# app/tables.py
+
+"""
+Arrow-baserade, sidindelade resultattabeller för dashboardet.
+
+st.dataframe på en hel DataFrame serialiserar alla rader till webbläsaren vid varje
+omkörning, och pandas Styler (t.ex. background_gradient) räknar stil för varje cell.
+Här hålls tabellen som pyarrow.Table (direkt från run store via load_run_table
+eller delad_körningstabell). Sökning, sortering och sidindelning görs på servern
+med pyarrow.compute:
+
+- filtrering: match_substring över textkolumnerna
+- sortering: sort_indices, alltså en indexvektor i stället för en sorterad kopia
+- sidindelning: take på den aktuella sidans index
+
+Bara den synliga sidan konverteras till pandas. Styler körs bara på den sidan.
+Färgskalor (gradient) får sina gränser från hela den filtrerade kolumnen, så att
+färgerna är jämförbara mellan sidor.
+
+Användning:
+    paged_table(delad_körningstabell(run_id), key="resultat", gradient=["Effektivitet"])
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+SIDSTORLEKAR = (25, 50, 100, 250)
+_INGEN_SORTERING = "(ingen)"
+
+
+def to_arrow(data) -> pa.Table:
+    """Arrow-tabell från en Arrow-tabell eller DataFrame (geometri och index tas inte med)."""
+    if isinstance(data, pa.Table):
+        return data
+    df = data
+    geometri = getattr(df, "_geometry_column_name", None)
+    if geometri in df.columns:
+        df = pd.DataFrame(df.drop(columns=[geometri]))
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Blandade objektkolumner, t.ex. "OUTLIER" bland tal från load_run
+        df = df.copy()
+        for kolumn in df.columns[df.dtypes == object]:
+            if df[kolumn].isin(["OUTLIER"]).any():
+                df[kolumn] = pd.to_numeric(df[kolumn], errors="coerce")
+            else:
+                df[kolumn] = df[kolumn].astype(str)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _är_text(typ) -> bool:
+    if pa.types.is_dictionary(typ):
+        typ = typ.value_type
+    return pa.types.is_string(typ) or pa.types.is_large_string(typ)
+
+
+def filtrera(tabell: pa.Table, sök: str) -> pa.Table:
+    """Rader där någon textkolumn innehåller sök (skiftlägesokänsligt)."""
+    if not sök:
+        return tabell
+    mask = None
+    for namn, typ in zip(tabell.column_names, tabell.schema.types):
+        if not _är_text(typ):
+            continue
+        träff = pc.fill_null(pc.match_substring(tabell[namn].cast(pa.string()), sök, ignore_case=True), False)
+        mask = träff if mask is None else pc.or_(mask, träff)
+    return tabell if mask is None else tabell.filter(mask)
+
+
+def sorteringsindex(tabell: pa.Table, kolumn: str = None, fallande: bool = False) -> pa.Array:
+    """Radindex i sorteringsordning (saknade värden sist, pyarrows standard)."""
+    if kolumn is None:
+        return pa.array(np.arange(tabell.num_rows))
+    ordning = "descending" if fallande else "ascending"
+    return pc.sort_indices(tabell, sort_keys=[(kolumn, ordning)])
+
+
+def _gränser(kolumn) -> tuple:
+    värden = kolumn.to_numpy(zero_copy_only=False).astype(float)
+    värden = värden[np.isfinite(värden)]
+    return (värden.min(), värden.max()) if len(värden) else (None, None)
+
+
+def style_page(sida: pd.DataFrame, format=None, gradient=(), cmap="RdYlGn", gränser=None):
+    """Styler för en sida; gradientgränser skickas in från hela tabellen."""
+    stil = sida.style
+    if format:
+        stil = stil.format(format, na_rep="–")
+    for kolumn in gradient:
+        vmin, vmax = (gränser or {}).get(kolumn, (None, None))
+        stil = stil.background_gradient(cmap=cmap, subset=[kolumn], vmin=vmin, vmax=vmax)
+    return stil
+
+
+def paged_table(
+    data,
+    key: str,
+    sidstorlek: int = 25,
+    format=None,
+    gradient=(),
+    cmap: str = "RdYlGn",
+    sortering: str = None,
+    fallande: bool = False,
+    sökbar: bool = True,
+):
+    """
+    Visar en Arrow-tabell (eller DataFrame) med sökning, sortering och sidor.
+
+    key skiljer tabellens widgetar åt i sessionen. format går till Styler.format
+    och gradient är kolumner som färgas med background_gradient – båda bara på
+    den synliga sidan. Returnerar den filtrerade Arrow-tabellen.
+    """
+    tabell = to_arrow(data)
+    kolumner = tabell.column_names
+
+    k1, k2, k3, k4 = st.columns([3, 2, 1, 1])
+    sök = k1.text_input("Sök", key=f"{key}_sök", placeholder="Filtrera på text") if sökbar else ""
+    alternativ = [_INGEN_SORTERING] + kolumner
+    sortera = k2.selectbox(
+        "Sortera efter", alternativ, key=f"{key}_sortera",
+        index=alternativ.index(sortering) if sortering in kolumner else 0,
+    )
+    fall = k3.toggle("Fallande", value=fallande, key=f"{key}_fallande")
+    storlek = k4.selectbox(
+        "Rader per sida", SIDSTORLEKAR, key=f"{key}_storlek",
+        index=SIDSTORLEKAR.index(sidstorlek) if sidstorlek in SIDSTORLEKAR else 0,
+    )
+
+    urval = filtrera(tabell, sök)
+    antal = urval.num_rows
+    antal_sidor = max(1, math.ceil(antal / storlek))
+
+    # Ny sökning, sortering eller sidstorlek börjar om på första sidan
+    signatur = (sök, sortera, fall, storlek, tabell.num_rows)
+    if st.session_state.get(f"{key}_signatur") != signatur:
+        st.session_state[f"{key}_signatur"] = signatur
+        st.session_state[f"{key}_sida"] = 1
+    sidnr = min(int(st.session_state.get(f"{key}_sida", 1)), antal_sidor)
+    st.session_state[f"{key}_sida"] = sidnr
+
+    index = sorteringsindex(urval, None if sortera == _INGEN_SORTERING else sortera, fall)
+    start = (sidnr - 1) * storlek
+    sida = urval.take(index.slice(start, storlek)).to_pandas()
+
+    gränser = {kolumn: _gränser(urval[kolumn]) for kolumn in gradient if kolumn in kolumner}
+    if format or gränser:
+        st.dataframe(style_page(sida, format, list(gränser), cmap, gränser), hide_index=True, width="stretch")
+    else:
+        st.dataframe(sida, hide_index=True, width="stretch")
+
+    f1, f2 = st.columns([1, 4])
+    if antal_sidor > 1:
+        f1.number_input("Sida", min_value=1, max_value=antal_sidor, step=1, key=f"{key}_sida")
+    text = f"Rad {start + 1 if antal else 0}–{min(start + storlek, antal)} av {antal}"
+    if antal < tabell.num_rows:
+        text += f" (filtrerat från {tabell.num_rows})"
+    f2.caption(text)
+    return urval
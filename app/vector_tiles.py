@@ -0,0 +1,180 @@
+# app/vector_tiles.py
+
+"""
+Lokala vektortiles (MVT) för nätområdespolygonerna i geometrilagret.
+
+Tiles genereras i förväg till TILE_DIR/{z}/{x}/{y}.pbf med ett lager (LAYER_NAME)
+där varje polygon bara bär egenskapen geom_id. Streamlit serverar katalogen som
+statiska filer (server.enableStaticServing i .streamlit/config.toml), så kartan
+hämtar endast de tiles som syns och färgsätter dem i webbläsaren utifrån en liten
+uppslagstabell geom_id → värde. Ingen extern tiletjänst behövs.
+
+Kräver:
+- mapbox-vector-tile
+
+Generera manuellt med:
+    python -m app.vector_tiles
+"""
+
+import os
+import math
+import shutil
+import tempfile
+import threading
+
+import yaml # type: ignore
+
+from app.geometry_store import META_FILE, simplify_geometries
+
+TILE_DIR = "static/tiles"
+TILE_URL = "/app/static/tiles/{z}/{x}/{y}.pbf"
+LAYER_NAME = "omraden"
+MIN_ZOOM = 4
+MAX_ZOOM = 10
+EXTENT = 4096
+BUFFER = 64  # tileenheter utanför kanten, så att linjer inte klipps synligt
+
+_HALV_VÄRLD = 20037508.342789244  # EPSG:3857
+
+# Ett bygge i taget per process – sessioner som kommer samtidigt väntar och
+# ser sedan färdiga tiles (se ensure_vector_tiles)
+_BYGGLÅS = threading.RLock()
+
+
+def _tile_bounds(z: int, x: int, y: int):
+    storlek = 2 * _HALV_VÄRLD / 2 ** z
+    minx = -_HALV_VÄRLD + x * storlek
+    maxy = _HALV_VÄRLD - y * storlek
+    return minx, maxy - storlek, minx + storlek, maxy
+
+
+def _tile_range(bounds, z: int):
+    minx, miny, maxx, maxy = bounds
+    n = 2 ** z
+    storlek = 2 * _HALV_VÄRLD / n
+    x0 = max(int(math.floor((minx + _HALV_VÄRLD) / storlek)), 0)
+    x1 = min(int(math.floor((maxx + _HALV_VÄRLD) / storlek)), n - 1)
+    y0 = max(int(math.floor((_HALV_VÄRLD - maxy) / storlek)), 0)
+    y1 = min(int(math.floor((_HALV_VÄRLD - miny) / storlek)), n - 1)
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def _store_signature(store_katalog: str) -> dict:
+    with open(os.path.join(store_katalog, META_FILE)) as f:
+        return yaml.safe_load(f) or {}
+
+
+def tiles_are_current(store, tile_dir: str = TILE_DIR) -> bool:
+    meta_path = os.path.join(tile_dir, "tiles.yaml")
+    if not os.path.isfile(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = yaml.safe_load(f) or {}
+    return meta.get("geometrilager") == _store_signature(store.katalog)
+
+
+def build_vector_tiles(store, tile_dir: str = TILE_DIR, min_zoom: int = MIN_ZOOM, max_zoom: int = MAX_ZOOM) -> int:
+    """Genererar tiles för alla zoomnivåer och returnerar antalet skrivna tiles."""
+    with _BYGGLÅS:
+        föräldrakatalog = os.path.dirname(os.path.abspath(tile_dir))
+        os.makedirs(föräldrakatalog, exist_ok=True)
+        # Unik temporär katalog bredvid tile_dir (samma filsystem, så att namnbytet är atomärt)
+        tmp_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(tile_dir)}.tmp-", dir=föräldrakatalog)
+        try:
+            antal = _write_tiles(store, tmp_dir, min_zoom, max_zoom)
+            _byt_katalog(tmp_dir, tile_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    return antal
+
+
+def _byt_katalog(tmp_dir: str, tile_dir: str):
+    """Byter katalog i ett svep så att kartan aldrig ser en halvfärdig uppsättning."""
+    os.chmod(tmp_dir, 0o755)  # mkdtemp skapar katalogen med 0700
+    if os.path.isdir(tile_dir):
+        old_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(tile_dir)}.old-", dir=os.path.dirname(tmp_dir))
+        os.rename(tile_dir, os.path.join(old_dir, "tiles"))
+        os.rename(tmp_dir, tile_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.rename(tmp_dir, tile_dir)
+
+
+def _write_tiles(store, tmp_dir: str, min_zoom: int, max_zoom: int) -> int:
+    import shapely
+    import mapbox_vector_tile
+
+    polygoner = store.polygoner.to_crs(epsg=3857)
+    geom_id = polygoner["geom_id"].to_numpy()
+    bounds = polygoner.total_bounds
+    antal = 0
+
+    for z in range(min_zoom, max_zoom + 1):
+        storlek = 2 * _HALV_VÄRLD / 2 ** z
+        # Förenkla till ungefär en tileenhet på denna zoomnivå
+        geometrier = simplify_geometries(polygoner.geometry.values, storlek / EXTENT)
+        tree = shapely.STRtree(geometrier)
+        marginal = storlek * BUFFER / EXTENT
+
+        xs, ys = _tile_range(bounds, z)
+        for x in xs:
+            for y in ys:
+                minx, miny, maxx, maxy = _tile_bounds(z, x, y)
+                träffar = tree.query(shapely.box(minx, miny, maxx, maxy))
+                if len(träffar) == 0:
+                    continue
+
+                klippta = shapely.clip_by_rect(
+                    geometrier[träffar], minx - marginal, miny - marginal, maxx + marginal, maxy + marginal
+                )
+                features = [
+                    {"geometry": g, "properties": {"geom_id": gid}}
+                    for g, gid in zip(klippta, geom_id[träffar])
+                    if not g.is_empty
+                ]
+                if not features:
+                    continue
+
+                data = mapbox_vector_tile.encode(
+                    [{"name": LAYER_NAME, "features": features}],
+                    default_options={"quantize_bounds": (minx, miny, maxx, maxy), "extents": EXTENT},
+                )
+                os.makedirs(os.path.join(tmp_dir, str(z), str(x)), exist_ok=True)
+                with open(os.path.join(tmp_dir, str(z), str(x), f"{y}.pbf"), "wb") as f:
+                    f.write(data)
+                antal += 1
+
+    with open(os.path.join(tmp_dir, "tiles.yaml"), "w") as f:
+        yaml.dump({
+            "min_zoom": min_zoom,
+            "max_zoom": max_zoom,
+            "lager": LAYER_NAME,
+            "geometrilager": _store_signature(store.katalog),
+        }, f, allow_unicode=True)
+    return antal
+
+
+def ensure_vector_tiles(store, tile_dir: str = TILE_DIR) -> None:
+    if tiles_are_current(store, tile_dir):
+        return
+    with _BYGGLÅS:
+        # En annan session kan ha byggt klart medan vi väntade på låset
+        if not tiles_are_current(store, tile_dir):
+            build_vector_tiles(store, tile_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.geometry_store import load_geometry_store, STORE_DIR
+
+    parser = argparse.ArgumentParser(description="Generera vektortiles från geometrilagret.")
+    parser.add_argument("--lager", default=STORE_DIR, help="Katalog för geometrilagret")
+    parser.add_argument("--ut", default=TILE_DIR, help="Katalog för tiles")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    args = parser.parse_args()
+
+    store = load_geometry_store(args.lager)
+    antal = build_vector_tiles(store, args.ut, args.min_zoom, args.max_zoom)
+    print(f"{antal} tiles skrivna till {args.ut}")
@@ -0,0 +1,204 @@
+# benchmarks/rerun_latency.py
+
+"""
+Mäter användarupplevd latens för hela omkörningar av pages/Effektiviseringskrav.py.
+
+Sidan körs huvudlöst med Streamlits AppTest. Ett skript av interaktioner spelas upp:
+- kallstart
+- ändra en DEA-slider
+- kör DEA
+- växla till Geografisk karta
+- ändra k
+- byt karttyp
+
+För varje interaktion mäts väggklocktid, minnestopp och kvarvarande minne jämfört med
+före omkörningen (tracemalloc, Python-allokeringar).
+
+Allt körs mot en syntetisk fixtur i en temporär arbetskatalog:
+- data/Data_modeller.xlsx med N företag
+- en rutnätsshapefil där varje ruta redovisas på ett eller två REId
+- ett förbyggt geometrilager
+- en tom runs/
+
+Sidans relativa sökvägar pekar därmed på fixturen och inte på riktiga data.
+Streamlits cacher (st.cache_data/st.cache_resource) och de delade cacherna i
+app/shared_cache.py töms före varje upprepning.
+Importerade moduler ligger kvar, så bara första varvets kallstart inkluderar importtiden
+(den mäts separat med python -m app.import_profile).
+
+Kör från projektroten med:
+    python benchmarks/rerun_latency.py
+    python benchmarks/rerun_latency.py --företag 300 --upprepningar 5 --ut latens.csv
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = os.path.join(REPO, "pages", "Effektiviseringskrav.py")
+sys.path.insert(0, REPO)
+
+
+# === Fixtur ===
+
+def skapa_fixtur(katalog: str, antal_företag: int = 150, seed: int = 1) -> None:
+    """Skriver syntetiska indata, shapefil och geometrilager under katalog."""
+    import geopandas as gpd
+    from shapely.geometry import box
+    from app.geometry_store import SHP_PATH, STORE_DIR, build_geometry_store
+
+    rng = np.random.default_rng(seed)
+    n = antal_företag
+    df = pd.DataFrame({
+        "DMU": np.arange(n),
+        "REId": [f"RE{i:04d}" for i in range(n)],
+        "Företag": [f"Företag {i}" for i in range(n)],
+    })
+    for kolumn in ["CU", "MW", "NS", "MWhl", "MWhh"]:
+        df[kolumn] = rng.lognormal(4, 1, n)
+    df["OPEXp"] = df["CU"] * rng.uniform(1, 2, n)
+    df["CAPEX"] = df["MW"] * rng.uniform(1, 2, n)
+    os.makedirs(os.path.join(katalog, "data"), exist_ok=True)
+    df.to_excel(os.path.join(katalog, "data", "Data_modeller.xlsx"), sheet_name="Körning", index=False)
+
+    # Ungefär två rutor per företag i ett rutnät över mellersta Sverige (SWEREF99 TM)
+    sida = int(np.ceil(np.sqrt(2 * n)))
+    storlek = 20_000
+    rutor, redovisning = [], []
+    for i in range(sida * sida):
+        x0 = 400_000 + (i % sida) * storlek
+        y0 = 6_500_000 + (i // sida) * storlek
+        rutor.append(box(x0, y0, x0 + storlek, y0 + storlek))
+        reid = [df["REId"][i % n]]
+        if rng.random() < 0.1:
+            reid.append(df["REId"][rng.integers(n)])
+        redovisning.append(",".join(reid))
+    shapes = gpd.GeoDataFrame({"Redovisnin": redovisning}, geometry=rutor, crs="EPSG:3006")
+    shapes.to_file(os.path.join(katalog, SHP_PATH))
+
+    build_geometry_store(os.path.join(katalog, SHP_PATH), os.path.join(katalog, STORE_DIR))
+    os.makedirs(os.path.join(katalog, "runs"), exist_ok=True)
+
+
+# === Interaktioner ===
+
+def _widget(element_lista, etikett: str):
+    for element in element_lista:
+        if element.label == etikett:
+            return element
+    raise LookupError(f"Hittade ingen widget med etiketten {etikett!r}")
+
+
+def _kör_dea(at):
+    [b for b in at.sidebar.button if "Kör DEA" in b.label][0].click()
+
+
+INTERAKTIONER = [
+    ("kallstart", lambda at: None),
+    ("DEA: ändra minsta trunkering", lambda at: _widget(at.sidebar.slider, "Minsta trunkering").set_value(0.15)),
+    ("DEA: kör modellen", _kör_dea),
+    ("växla till Geografisk karta", lambda at: _widget(at.sidebar.selectbox, "Välj modell").set_value("Geografisk karta")),
+    ("karta: ändra k", lambda at: _widget(at.slider, "Antal närmaste grannar (k)").set_value(6)),
+    ("karta: karttyp Dynamisk", lambda at: _widget(at.selectbox, "Välj karttyp").set_value("Dynamisk")),
+]
+
+
+def _töm_cacher():
+    import streamlit as st
+    from app.shared_cache import INDATA, GEOMETRI, KÖRNINGAR
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    for cache in (INDATA, GEOMETRI, KÖRNINGAR):
+        cache.rensa()
+
+
+def kör_scenario(timeout: float = 600) -> list:
+    """Spelar upp INTERAKTIONER en gång och returnerar en mätning per interaktion."""
+    from streamlit.testing.v1 import AppTest
+
+    _töm_cacher()
+    at = AppTest.from_file(PAGE, default_timeout=timeout)
+    at.session_state["access_granted"] = True
+    at.secrets["password"] = "benchmark"  # ersätter .streamlit/secrets.toml
+
+    mätningar = []
+    for namn, åtgärd in INTERAKTIONER:
+        if namn != "kallstart":
+            åtgärd(at)
+        tracemalloc.reset_peak()
+        före = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        at.run()
+        sekunder = time.perf_counter() - start
+        efter, topp = tracemalloc.get_traced_memory()
+        if at.exception:
+            raise RuntimeError(f"{namn}: {at.exception[0].value}")
+        mätningar.append({
+            "interaktion": namn,
+            "sekunder": sekunder,
+            "topp_mb": (topp - före) / 1e6,   # högsta extra minne under omkörningen
+            "kvar_mb": (efter - före) / 1e6,  # det som ligger kvar efteråt (cacher, session)
+        })
+    return mätningar
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Latens per interaktion för Effektiviseringskrav-sidan (AppTest).")
+    parser.add_argument("--företag", type=int, default=150, help="Antal företag i fixturen")
+    parser.add_argument("--upprepningar", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600, help="Max sekunder per omkörning")
+    parser.add_argument("--ut", help="Skriv alla mätningar som CSV")
+    parser.add_argument("--behåll", action="store_true", help="Behåll fixturkatalogen")
+    args = parser.parse_args(argv)
+
+    katalog = tempfile.mkdtemp(prefix="dashboard_bench_")
+    ursprunglig = os.getcwd()
+    try:
+        print(f"Skapar fixtur med {args.företag} företag i {katalog} ...")
+        skapa_fixtur(katalog, args.företag)
+        os.chdir(katalog)
+
+        tracemalloc.start()
+        rader = []
+        for varv in range(1, args.upprepningar + 1):
+            for mätning in kör_scenario(args.timeout):
+                rader.append({"varv": varv, **mätning})
+                print(
+                    f"varv {varv}  {mätning['interaktion']:<32} {mätning['sekunder']:7.2f} s"
+                    f"  topp {mätning['topp_mb']:7.1f} MB  kvar {mätning['kvar_mb']:7.1f} MB",
+                    flush=True,
+                )
+            # Nästa varv börjar med tom run store, så att kartan visar samma körning
+            shutil.rmtree("runs", ignore_errors=True)
+            os.makedirs("runs")
+        tracemalloc.stop()
+    finally:
+        os.chdir(ursprunglig)
+        if not args.behåll:
+            shutil.rmtree(katalog, ignore_errors=True)
+
+    df = pd.DataFrame(rader)
+    sammanfattning = df.groupby("interaktion", sort=False).agg(
+        median_s=("sekunder", "median"), min_s=("sekunder", "min"), max_s=("sekunder", "max"),
+        topp_mb=("topp_mb", "max"), kvar_mb=("kvar_mb", "median"),
+    )
+    print()
+    print(sammanfattning.round(3).to_string())
+    if args.ut:
+        df.to_csv(args.ut, index=False)
+        print(f"\nMätningar skrivna till {args.ut}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,41 +7,52 @@ Motivering:
 Geografisk visualisering ger intuitiv översikt av var i landet elnätsföretag är mer eller mindre effektiva
 eller utsatta för höga effektiviseringskrav.
 
+Kartvyer:
+- Statisk: matplotlib-bild av alla polygoner.
+- Dynamisk: folium-karta med förenklad GeoJSON.
+- Vektortiles: folium-karta som hämtar lokalt genererade MVT-tiles för det synliga
+  området och färgsätter dem i webbläsaren (se app/vector_tiles.py).
+
 Kräver:
 - geopandas
 - folium
 - streamlit_folium
+- mapbox-vector-tile (endast för Vektortiles)
 """
 
+import logging
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
 
-@st.cache_data
+logger = logging.getLogger(__name__)
+
 def load_shapes():
-    import geopandas as gpd
+    # Läser det förbehandlade geometrilagret (byggs vid behov från shapefilen).
+    # Tabellen delas mellan sessioner; varje anropare får en grund kopia.
+    from app.shared_cache import delade_former
 
-    shp_path = "data/Samtliga nätföretags del- och verksamhetsområden.shp"
-    gdf = gpd.read_file(shp_path)
+    return delade_former(_load_shapes)
 
-    print("\n🗺️ SHAPEFILE LÄST IN")
-    print("Kolumner:", list(gdf.columns))
-    print("Antal rader före explosion:", len(gdf))
 
-    # Dela upp rader med flera REId
-    gdf["REId_list"] = gdf["Redovisnin"].astype(str).str.split(",")
-    gdf = gdf.explode("REId_list").reset_index(drop=True)
-    gdf["REId"] = gdf["REId_list"].str.strip()
-    gdf = gdf.drop(columns=["REId_list"])
+def _load_shapes():
+    from app.instrumentation import Mätning
 
-    # Skapa ett unikt ID per polygon (baserat på geometrin)
-    gdf["geom_id"] = gdf["geometry"].apply(lambda g: hash(g.wkb))
+    mätning = Mätning("load_shapes")
+    with mätning.steg("läs geometrilager"):
+        store = load_store()
+    with mätning.steg("explode REId × polygon"):
+        gdf = store.exploded()
+    mätning.avsluta()
 
-    print("Antal rader efter explosion:", len(gdf))
-    print("Unika REId:", gdf["REId"].nunique())
-    print("Unika polygoner (geom_id):", gdf["geom_id"].nunique())
+    logger.info(
+        "Geometrilager inläst: %d rader (REId × polygon), %d unika REId, %d unika polygoner",
+        len(gdf), gdf["REId"].nunique(), len(store.polygoner),
+    )
 
     return gdf
 
@@ -61,66 +72,273 @@ def debug_reid_matchning(gdf_shapes, df_resultat):
     print("Exempel:", list(saknas_i_shapefile)[:5])
 
 
-def show_heatmap(df_resultat, karttyp="Statisk", indikator="Effektivitet"):
-    st.subheader("Geografisk heatmap")
+def load_store():
+    # Delas mellan sessioner med storleksgräns (app/shared_cache.py)
+    from app.shared_cache import delat_geometrilager
+    return delat_geometrilager()
+
+
+def _lagernyckel():
+    # Ändras när geometrilagret byggs om (källfil eller meta.yaml) – ingår i nyckeln
+    # för alla cacher nedan som bygger på lagret, så att de inte visar gamla polygoner
+    from app.shared_cache import geometrilagrets_nyckel
+    return geometrilagrets_nyckel()
+
+
+def load_simplified_geojson(detaljnivå="medel"):
+    return _simplified_geojson(detaljnivå, _lagernyckel())
+
+
+@st.cache_resource(max_entries=6, show_spinner=False)
+def _simplified_geojson(detaljnivå, lagernyckel):
+    # cache_resource: strängen är oföränderlig och på flera MB, så den delas utan kopia
+    from app.geometry_store import load_geojson
+    return load_geojson(load_store(), detaljnivå)
+
+
+# Samma klassgränser som choropleth-kartan
+KLASSGRÄNSER = [0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def _klassgränser(värden):
+    """
+    KLASSGRÄNSER med yttergränserna utvidgade till datats min och max.
+
+    folium.Choropleth kräver att varje värde faller i en klass, och Effektivitet
+    under 0.6 eller Supereffektivitet över 1 förekommer i riktiga körningar.
+    """
+    värden = np.asarray(värden, dtype=float)
+    ändliga = värden[np.isfinite(värden)]
+    if len(ändliga) == 0:
+        return list(KLASSGRÄNSER)
+    return [
+        min(KLASSGRÄNSER[0], float(ändliga.min())),
+        *KLASSGRÄNSER[1:-1],
+        max(KLASSGRÄNSER[-1], float(ändliga.max())),
+    ]
+
+
+def _värden_per_polygon(store, df_resultat, indikator):
+    from app.geometry_store import polygon_means
+
+    return pd.DataFrame({
+        "geom_id": store.polygoner["geom_id"].to_numpy(),
+        indikator: polygon_means(store, df_resultat, indikator),
+    })
+
+
+def grann_koordinater():
+    """Polygonens centroid för varje rad i grann_underlag (beräknas en gång per lager och process)."""
+    return _grann_koordinater(_lagernyckel())
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _grann_koordinater(lagernyckel):
+    import shapely
+
+    store = load_store()
+    centroider = shapely.centroid(store.polygoner.geometry.values)
+    return shapely.get_coordinates(centroider)[store.poly_idx]
+
+
+def grann_kontiguitet(typ="queen"):
+    """Queen-/rook-grannar för raderna i grann_underlag (cachas på disk i geometrilagret)."""
+    return _grann_kontiguitet(typ, _lagernyckel())
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _grann_kontiguitet(typ, lagernyckel):
+    from spatial_analysis import hämta_kontiguitet
+    return hämta_kontiguitet(load_store(), typ)
+
+
+def grann_underlag(df_resultat, indikator="Effektivitet"):
+    """
+    GeoDataFrame med en rad per REId och polygon för grannanalysen.
+
+    Värdena slås upp via geometrilagrets REId-index och geometrierna delas
+    med lagret i stället för att kopieras via en merge.
+    """
+    from app.geometry_store import row_values
 
-    # Ladda shapefilen
-    gdf_shapes = load_shapes()
+    store = load_store()
+    return gpd.GeoDataFrame(
+        {"REId": store.reid["REId"].to_numpy(), indikator: row_values(store, df_resultat, indikator)},
+        geometry=store.row_geometries(),
+        crs=store.crs,
+    )
 
-    # Förbered modellresultat
-    df = df_resultat[["REId", indikator]].copy()
-    df["REId"] = df["REId"].str.strip()
 
-    # Mergning: koppla effektivitet till varje REId i geometrin
-    gdf = gdf_shapes.merge(df, on="REId", how="left")
+def _vector_tile_layer(värden, indikator, gränser=KLASSGRÄNSER):
+    """VectorGrid-lager som färgsätter tiles i webbläsaren från en geom_id → värde-tabell."""
+    import json
+    import branca.colormap as cm
+    from folium.plugins import VectorGridProtobuf
+    from app.vector_tiles import TILE_URL, LAYER_NAME, MAX_ZOOM
 
-    # Aggregera: medelvärde per unik polygon
-    gdf_agg = gdf.groupby("geom_id").agg({
-        "geometry": "first",
-        indikator: "mean"
-    }).reset_index()
+    skala = cm.linear.BuPu_09.scale(gränser[0], gränser[-1]).to_step(index=gränser)
+    skala.caption = indikator
+    färger = [skala.rgb_hex_str((lo + hi) / 2) for lo, hi in zip(gränser[:-1], gränser[1:])]
 
-    gdf_agg = gpd.GeoDataFrame(gdf_agg, geometry="geometry", crs=gdf.crs)
+    giltiga = värden.dropna(subset=[indikator])
+    uppslag = dict(zip(giltiga["geom_id"], giltiga[indikator].round(4)))
+
+    # Uttrycket utvärderas en gång i webbläsaren; uppslagstabellen delas av alla tiles
+    options = f"""(function() {{
+        var uppslag = {json.dumps(uppslag)};
+        var gränser = {json.dumps(gränser[1:-1])};
+        var färger = {json.dumps(färger)};
+        return {{
+            "maxNativeZoom": {MAX_ZOOM},
+            "interactive": true,
+            "getFeatureId": function(f) {{ return f.properties.geom_id; }},
+            "vectorTileLayerStyles": {{
+                "{LAYER_NAME}": function(properties, zoom) {{
+                    var v = uppslag[properties.geom_id];
+                    var färg = "gray";
+                    if (v !== undefined) {{
+                        var i = 0;
+                        while (i < gränser.length && v >= gränser[i]) {{ i++; }}
+                        färg = färger[i];
+                    }}
+                    return {{fill: true, fillColor: färg, fillOpacity: 0.7, color: "#999", weight: 0.3, opacity: 0.5}};
+                }}
+            }}
+        }};
+    }})()"""
+    return VectorGridProtobuf(TILE_URL, "Nätområden", options), skala
+
+
+# === Statisk karta: polygonerna ritas en gång, därefter byts bara färgerna ===
+
+class _StatiskKarta:
+    """
+    Matplotlib-figur med en PathCollection över geometrilagrets polygoner.
+
+    Figuren byggs en gång per geometrilager. En rendering sätter bara om
+    färgvektorn, färgskalan och titeln och kodar om bilden. Figuren delas
+    mellan sessioner, därför sker renderingen under ett lås.
+    """
+
+    def __init__(self, store):
+        import threading
+        from matplotlib.figure import Figure
+        from matplotlib.collections import PathCollection
+        from matplotlib.patches import Patch
+        import matplotlib as mpl
+
+        self._lock = threading.Lock()
+        self.fig = Figure(figsize=(10, 12))
+        self.ax = self.fig.subplots()
+
+        cmap = mpl.colormaps["BuPu"].copy()
+        cmap.set_bad("lightgray")
+        self.collection = PathCollection(
+            [_polygon_path(g) for g in store.polygoner.geometry.values],
+            cmap=cmap,
+            linewidths=0.2,
+            edgecolors="0.8",
+        )
+        self.collection.set_array(np.ma.masked_all(len(store.polygoner)))
+        self.ax.add_collection(self.collection)
+
+        minx, miny, maxx, maxy = store.polygoner.total_bounds
+        self.ax.set_xlim(minx, maxx)
+        self.ax.set_ylim(miny, maxy)
+        self.ax.set_aspect("equal")
+        self.ax.axis("off")
+        self.colorbar = self.fig.colorbar(self.collection, ax=self.ax)
+        self.ax.legend(handles=[Patch(facecolor="lightgray", edgecolor="white", label="Ingen data")], loc="lower right")
+
+    def render(self, värden, indikator) -> bytes:
+        import io
+
+        värden = np.ma.masked_invalid(np.asarray(värden, dtype=float))
+        with self._lock:
+            self.collection.set_array(värden)
+            if värden.count() > 0:
+                self.collection.set_clim(värden.min(), värden.max())
+            self.colorbar.update_normal(self.collection)
+            self.ax.set_title(f"{indikator} per geografiskt verksamhetsområde (medel om flera REId)", fontsize=13)
+
+            buffer = io.BytesIO()
+            self.fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+        return buffer.getvalue()
+
+
+def _polygon_path(geom):
+    from matplotlib.path import Path
+
+    polygoner = getattr(geom, "geoms", [geom])
+    ringar = [r for p in polygoner for r in (p.exterior, *p.interiors)]
+    return Path.make_compound_path(*[Path(np.asarray(r.coords)[:, :2], closed=True) for r in ringar])
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _static_map(lagernyckel):
+    return _StatiskKarta(load_store())
+
+
+def _värdehash(värden) -> str:
+    import hashlib
+    return hashlib.blake2b(np.ascontiguousarray(värden, dtype=float).tobytes(), digest_size=16).hexdigest()
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _render_static_map(lagernyckel, nyckel, indikator, _värden):
+    # Cachas per (geometrilager, körning, indikator); _värden hashas inte av Streamlit
+    return _static_map(lagernyckel).render(_värden, indikator)
+
+
+def show_heatmap(df_resultat, karttyp="Statisk", indikator="Effektivitet", detaljnivå="medel", run_id=None):
+    st.subheader("Geografisk heatmap")
+
+    # Medelvärde per unik polygon via geometrilagrets REId-index – bara
+    # värdevektorn räknas om per körning och indikator
+    store = load_store()
+    värden = _värden_per_polygon(store, df_resultat, indikator)
 
     statisk_vy = (karttyp == "Statisk")
 
     if statisk_vy:
-        import matplotlib.pyplot as plt
-        fig, ax = plt.subplots(figsize=(10, 12))
-        gdf_agg.plot(
-            column=indikator,
-            cmap="BuPu",
-            linewidth=0.2,
-            ax=ax,
-            edgecolor="0.8",
-            legend=True,
-            missing_kwds={
-                "color": "lightgray",
-                "edgecolor": "white",
-                "label": "Ingen data"
-            }
-        )
-        ax.set_title(f"{indikator} per geografiskt verksamhetsområde (medel om flera REId)", fontsize=13)
-        ax.axis("off")
-        st.pyplot(fig)
+        nyckel = run_id if run_id is not None else _värdehash(värden[indikator].to_numpy())
+        png = _render_static_map(_lagernyckel(), nyckel, indikator, värden[indikator].to_numpy())
+        st.image(png, width="stretch")
 
     else:
         import folium
         from streamlit_folium import st_folium
 
+        # Webbkartan får förenklad, kvantiserad geometri med bara geom_id som
+        # egenskap; indikatorn skickas separat som geom_id → medelvärde
         m = folium.Map(location=[62.0, 15.0], zoom_start=5, tiles="cartodb positron")
 
+        # ±inf (supereffektivitet under VRS) visas som saknat värde; klasserna täcker övriga värden
+        värden[indikator] = värden[indikator].where(np.isfinite(värden[indikator]))
+        gränser = _klassgränser(värden[indikator])
+
+        if karttyp == "Vektortiles":
+            from app.vector_tiles import ensure_vector_tiles
+
+            with st.spinner("Förbereder vektortiles..."):
+                ensure_vector_tiles(store)
+            lager, skala = _vector_tile_layer(värden, indikator, gränser)
+            lager.add_to(m)
+            skala.add_to(m)
+            st_folium(m, use_container_width=True)
+            return
+
         folium.Choropleth(
-            geo_data=gdf_agg,
+            geo_data=load_simplified_geojson(detaljnivå),
             name="Choropleth",
-            data=gdf_agg,
+            data=värden,
             columns=["geom_id", indikator],
             key_on="feature.properties.geom_id",
             fill_color="BuPu",
             fill_opacity=0.7,
             line_opacity=0.2,
             nan_fill_color="gray",
-            threshold_scale=[0.6, 0.7, 0.8, 0.9, 1.0],
+            threshold_scale=gränser,
             legend_name=indikator
         ).add_to(m)
 
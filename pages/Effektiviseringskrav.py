@@ -2,21 +2,21 @@
 
 import streamlit as st
 import pandas as pd
-import io
 import numpy as np
-import geopandas as gpd
 
-from app.data_loader import load_data
-from app.dea_model import run_dea_model
-from Gammalt.sfa_model import run_sfa_model
-from app.pystoned_model import run_pystoned_model
+# Tunga beroenden (pulp, pystoned/pyomo, geopandas, folium, scipy) importeras i
+# den gren som använder dem, så att en kallstart bara laddar vald vy.
+from app.shared_cache import delad_data, delad_körning, delad_körningstabell, delad_projektion, cachestatistik
+from app.tables import paged_table, to_arrow
 from app.plots import (
     plot_efficiency_histogram,
     plot_efficiency_boxplot,
     plot_efficiency_vs_size,
+    plot_scatter_interactive,
 )
-from app.run_logger import list_runs, load_run
-from spatial_analysis import lägg_till_grannsnitt
+from app.run_logger import list_runs, flush_runs, pop_write_errors, pending_runs
+from app.export import run_download_buttons, xlsx_download_button
+from app.instrumentation import senaste_mätningar, aktivera_minnesmätning, minnesmätning_aktiv
 
 if "access_granted" not in st.session_state or not st.session_state.access_granted:
     st.stop()
@@ -27,16 +27,72 @@ st.markdown("Välj modell och se effektivitet, krav och utfall för olika föret
 
 # --- Ladda data ---
 data_file = "data/Data_modeller.xlsx"
-df = load_data(data_file)
+# Run store delas med Kapitalbas-sidan – här visas bara effektivitetsmodellernas körningar
+EFFEKTIVITETSMODELLER = ["DEA", "PyStoned", "SFA", "PartiellFront"]
+df = delad_data(data_file)  # delas mellan sessioner, se app/shared_cache.py
 
 # --- Modellval ---
 modellval = st.sidebar.selectbox(
     "Välj modell",
-    ["DEA", "SFA", "PyStoned", "Jämför körningar", "Företagsanalys", "Geografisk karta"]
+    ["DEA", "SFA", "PyStoned", "Partiell front", "Jämför körningar", "Företagsanalys", "Peer-analys (DEA)", "Intäktsram", "Geografisk karta"]
 )
 
+# Körningar sparas i bakgrunden – rapportera skrivfel för sessionens egna körningar.
+# Körningar som inte längre väntar och inte misslyckades är skrivna och glöms.
+egna_körningar = st.session_state.setdefault("egna_körningar", set())
+väntande = pending_runs()
+for failed_run_id, fel in pop_write_errors(egna_körningar):
+    st.sidebar.error(f"Körningen {failed_run_id} kunde inte sparas: {fel}")
+egna_körningar &= väntande
+
+
+def egen_körning(result):
+    """Registrerar körningen som sessionens egen, så att skrivfel visas här."""
+    egna_körningar.add(result.attrs["run_id"])
+    return result
+
+# --- Prestanda (tid och minne per steg) ---
+prestanda_panel = st.sidebar.expander("⏱️ Prestanda")
+
+
+def visa_prestanda(prestanda, rubrik):
+    if not prestanda:
+        return
+    prestanda_panel.markdown(f"**{rubrik}** – {prestanda['totalt_s']:.2f} s")
+    prestanda_panel.dataframe(pd.DataFrame(prestanda["steg"]), hide_index=True, width="stretch")
+
+
+def resultattabell(körd, run_id, kolumner):
+    """
+    Resultat som Arrow-tabell. På omkörningen som körde modellen används resultatet
+    i minnet – run store läses först vid senare omkörningar, så att bakgrunds-
+    skrivningen inte hamnar i svarstiden.
+    """
+    if körd is not None:
+        return to_arrow(körd[[k for k in kolumner if k in körd.columns]])
+    return delad_körningstabell(run_id, kolumner)
+
+
+with prestanda_panel:
+    minne = st.checkbox(
+        "Mät minnestopp (tracemalloc)", value=minnesmätning_aktiv(),
+        help="Gör körningarna något långsammare. Gäller alla sessioner i processen."
+    )
+    if minne != minnesmätning_aktiv():
+        aktivera_minnesmätning(minne)
+    st.caption("Delade cacher (alla sessioner):")
+    st.dataframe(pd.DataFrame(cachestatistik()), hide_index=True, width="stretch")
+    st.caption("Senaste mätningen per steg i processen (nyast först):")
+visade_mätningar = set()
+for mätning in senaste_mätningar():
+    if mätning.namn not in visade_mätningar:
+        visade_mätningar.add(mätning.namn)
+        visa_prestanda(mätning.som_dict(), mätning.namn)
+
 
 if modellval == "DEA":
+    from app.dea_model import run_dea_model
+
     st.header("DEA-modell")
 
     st.sidebar.subheader("DEA-parametrar")
@@ -69,8 +125,9 @@ if modellval == "DEA":
     # --- Körmodellknapp ---
     run_model = st.sidebar.button("🔁 Kör DEA-modellen")
 
+    körd = None
     if run_model:
-        result = run_dea_model(
+        result = egen_körning(run_dea_model(
             df,
             rts=dea_rts,
             trunkering_min=dea_trunk_min,
@@ -78,7 +135,16 @@ if modellval == "DEA":
             input_cols=input_cols,
             output_cols=output_cols,
             outlier_filter=use_outlier_filter
-        )
+        ))
+        st.session_state["senaste_dea"] = result.attrs["run_id"]
+        körd = result
+        visa_prestanda(result.attrs.get("prestanda"), "Denna DEA-körning")
+
+    # Vid senare omkörningar (t.ex. bläddring) läses resultatet som Arrow från run store
+    if st.session_state.get("senaste_dea"):
+        run_id = st.session_state["senaste_dea"]
+        tabell = resultattabell(körd, run_id, ["Företag", "Effektivitet", "Supereffektivitet", "Effkrav_proc", "is_outlier"])
+        result = tabell.to_pandas()
 
         df_outliers = result[result["is_outlier"] == True][["Företag", "Effektivitet", "Supereffektivitet", "Effkrav_proc"]]
         df_outliers["Effkrav_proc"] = df_outliers["Effkrav_proc"].round(4)
@@ -90,37 +156,32 @@ if modellval == "DEA":
         else:
             st.info("Inga outliers identifierades i denna körning.")
 
-        st.dataframe(result[["Företag", "Effektivitet", "Supereffektivitet", "Effkrav_proc"]])
+        paged_table(tabell.drop_columns(["is_outlier"]), key="dea_resultat")
         df_plot = result[result["is_outlier"] == False]
         plot_efficiency_histogram(df_plot["Effektivitet"], title="DEA: Effektivitet (utan outliers)")
         plot_efficiency_histogram(df_plot["Supereffektivitet"], title="DEA: Supereffektivitet (utan outliers)")
         plot_efficiency_histogram(df_plot["Effkrav_proc"] * 100, title="DEA: Årligt effektiviseringskrav (%) (utan outliers)")
         
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            result.to_excel(writer, sheet_name="Resultat", index=False)
-
-        st.download_button(
-            label="📥 Ladda ned resultat för DEA-modellen som Excel",
-            data=buffer.getvalue(),
-            file_name="resultat_dea.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
+        run_download_buttons(run_id, "resultat_dea", "📥 Ladda ned resultat för DEA-modellen")
     else:
         st.info("⚙️ Välj modellspecifikationer och klicka på 'Kör DEA-modellen' för att se resultat.")
 
 
 elif modellval == "SFA":
+    from Gammalt.sfa_model import run_sfa_model
+
     st.header("SFA-modell")
     result = run_sfa_model(df)
-    st.dataframe(result[["Företag", "Effektivitet", "Effkrav_proc"]])
+    paged_table(result[["Företag", "Effektivitet", "Effkrav_proc"]], key="sfa_resultat")
     plot_efficiency_histogram(result["Effektivitet"], title="SFA: Effektivitet")
     plot_efficiency_histogram(result["Effkrav_proc"] * 100, title="SFA: Årligt effektiviseringskrav (%)")
     plot_efficiency_boxplot(result["Effektivitet"], title="SFA: Effektivitet (boxplot)")
-    plot_efficiency_vs_size(result, size_col="MWhl", eff_col="Effektivitet")
+    plot_efficiency_vs_size(result, size_col="MWhl", eff_col="Effektivitet", interaktiv=True)
 
 
 elif modellval == "PyStoned":
+    from app.pystoned_model import run_pystoned_model
+
     st.header("PyStoned-modell")
 
     st.sidebar.subheader("PyStoned-parametrar")
@@ -172,8 +233,9 @@ elif modellval == "PyStoned":
         st.warning("Teknologin 'mult' kräver solvern 'ipopt', som inte är tillgänglig i din miljö. Välj 'addi' istället.")
         st.stop()
 
+    körd = None
     if run_model:
-        result = run_pystoned_model(
+        result = egen_körning(run_pystoned_model(
             df,
             rts=rts_val,
             fun=fun_val,
@@ -184,7 +246,15 @@ elif modellval == "PyStoned":
             output_cols=output_cols,
             outlier_filter=use_outlier_filter,
             kravmetod=kravmetod,
-        )
+        ))
+        st.session_state["senaste_pystoned"] = result.attrs["run_id"]
+        körd = result
+        visa_prestanda(result.attrs.get("prestanda"), "Denna PyStoned-körning")
+
+    if st.session_state.get("senaste_pystoned"):
+        run_id = st.session_state["senaste_pystoned"]
+        tabell = resultattabell(körd, run_id, ["Företag", "Effektivitet", "Effkrav_proc", "is_outlier"])
+        result = tabell.to_pandas()
 
         n_outliers = result["is_outlier"].sum()
         if n_outliers > 0:
@@ -193,30 +263,93 @@ elif modellval == "PyStoned":
         else:
             st.info("Inga outliers identifierades i denna körning.")
 
-        st.dataframe(result[["Företag", "Effektivitet", "Effkrav_proc"]])
+        paged_table(tabell.drop_columns(["is_outlier"]), key="pystoned_resultat")
         plot_efficiency_histogram(result["Effektivitet"], title="PyStoned: Effektivitet")
         plot_efficiency_histogram(result["Effkrav_proc"] * 100, title="PyStoned: Årligt effektiviseringskrav (%)")
 
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            result.to_excel(writer, sheet_name="Resultat", index=False)
-        st.download_button(
-            label=f"📄 Ladda ned resultat för {modellval}-modellen som Excel",
-            data=buffer.getvalue(),
-            file_name=f"resultat_{modellval.lower()}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        run_download_buttons(
+            run_id, f"resultat_{modellval.lower()}", f"📄 Ladda ned resultat för {modellval}-modellen"
         )
     else:
         st.info("⚙️ Välj modellspecifikationer och klicka på 'Kör PyStoned-modellen' för att se resultat.")
 
 
+elif modellval == "Partiell front":
+    from app.partial_frontier import run_partial_frontier_model
+
+    st.header("Partiell front (order-m / order-α)")
+    st.markdown(
+        "Inputorienterad FDH-baserad front där varje företag jämförs med ett urval av de företag "
+        "som producerar minst lika mycket av varje output. Robust mot extrema företag utan "
+        "separat outlierpass och utan LP. Med många outputvariabler blir jämförelsegrupperna små "
+        "och fler företag hamnar på fronten."
+    )
+
+    st.sidebar.subheader("Parametrar för partiell front")
+    all_inputs = ["CAPEX", "OPEXp"]
+    all_outputs = ["CU", "MW", "NS", "MWhl", "MWhh"]
+    input_cols = st.sidebar.multiselect("Välj inputvariabler", all_inputs, default=all_inputs)
+    output_cols = st.sidebar.multiselect("Välj outputvariabler", all_outputs, default=["CU", "MW", "NS"])
+
+    if not input_cols or not output_cols:
+        st.warning("Välj minst en input och en output för att köra modellen.")
+        st.stop()
+
+    st.sidebar.caption("**Metod**\n"
+                       "- `order-m`: förväntad bästa praxis bland m slumpvis valda jämförbara företag.\n"
+                       "- `order-α`: fronten sätts vid α-kvantilen i stället för vid det bästa företaget.")
+    pf_metod = st.sidebar.selectbox("Metod", ["order-m", "order-α"])
+    if pf_metod == "order-m":
+        pf_m = st.sidebar.slider("m (antal jämförelseföretag)", 1, 200, 25,
+                                 help="Högre m → närmare FDH-fronten (m → ∞ ger FDH).")
+        pf_alpha = 0.95
+    else:
+        pf_m = 25
+        pf_alpha = st.sidebar.slider("α", 0.80, 1.0, 0.95, step=0.01,
+                                     help="α = 1 ger FDH-fronten.")
+    pf_trunk_min = st.sidebar.slider("Minsta trunkering", 0.0, 0.3, 0.162416, step=0.005)
+    pf_trunk_max = st.sidebar.slider("Högsta trunkering", 0.1, 0.5, 0.3, step=0.005)
+
+    körd = None
+    if st.sidebar.button("🔁 Kör partiell front"):
+        result = egen_körning(run_partial_frontier_model(
+            df,
+            metod=pf_metod,
+            m=pf_m,
+            alpha=pf_alpha,
+            trunkering_min=pf_trunk_min,
+            trunkering_max=pf_trunk_max,
+            input_cols=input_cols,
+            output_cols=output_cols,
+        ))
+        st.session_state["senaste_partiell_front"] = (result.attrs["run_id"], pf_metod)
+        körd = result
+        visa_prestanda(result.attrs.get("prestanda"), "Denna körning (partiell front)")
+
+    if st.session_state.get("senaste_partiell_front"):
+        run_id, körd_metod = st.session_state["senaste_partiell_front"]
+        tabell = resultattabell(körd, run_id, ["Företag", "Effektivitet", "Supereffektivitet", "Effkrav_proc"])
+        result = tabell.to_pandas()
+
+        utanför = int((result["Supereffektivitet"] > 1).sum())
+        st.info(f"{utanför} företag ligger utanför den partiella fronten (supereffektivitet > 1).")
+        paged_table(tabell, key="partiell_front_resultat")
+        plot_efficiency_histogram(result["Effektivitet"], title=f"{körd_metod}: Effektivitet")
+        plot_efficiency_histogram(result["Supereffektivitet"], title=f"{körd_metod}: Supereffektivitet")
+        plot_efficiency_histogram(result["Effkrav_proc"] * 100, title=f"{körd_metod}: Årligt effektiviseringskrav (%)")
+
+        run_download_buttons(run_id, "resultat_partiell_front", "📥 Ladda ned resultat för partiell front")
+    else:
+        st.info("⚙️ Välj modellspecifikationer och klicka på 'Kör partiell front' för att se resultat.")
+
+
 elif modellval == "Jämför körningar":
     st.header("Jämför två modellkörningar")
 
-    from app.run_logger import list_runs, load_run
-    import matplotlib.pyplot as plt
 
-    runs = list_runs()
+    # Vänta in körningar som fortfarande skrivs i bakgrunden
+    flush_runs()
+    runs = list_runs(EFFEKTIVITETSMODELLER)
     if len(runs) < 2:
         st.warning("Minst två körningar krävs för att göra en jämförelse.")
         st.stop()
@@ -228,8 +361,8 @@ elif modellval == "Jämför körningar":
         st.warning("Välj två olika körningar.")
         st.stop()
 
-    params_a, df_a = load_run(run_id_a)
-    params_b, df_b = load_run(run_id_b)
+    params_a, _ = delad_körning(run_id_a)
+    params_b, _ = delad_körning(run_id_b)
 
     # --- Visa modellspecifikationer i två tabeller ---
     st.subheader("Modellspecifikationer")
@@ -243,31 +376,44 @@ elif modellval == "Jämför körningar":
         df_b_spec = pd.DataFrame(params_b.items(), columns=["Parameter", "Värde"])
         st.table(df_b_spec)
 
-    # --- Sammanfoga gemensamma företag ---
-    merged = df_a[["Företag", "Effektivitet"]].rename(columns={"Effektivitet": "Eff_A"}).merge(
-        df_b[["Företag", "Effektivitet"]].rename(columns={"Effektivitet": "Eff_B"}),
-        on="Företag",
-        how="inner"
-    ).dropna()
+    # --- Sammanfoga gemensamma företag (Arrow direkt från run store) ---
+    import pyarrow.compute as pc
+
+    kolumner = ["Företag", "Effektivitet", "Effkrav_proc"]
+    tabell_a = delad_körningstabell(run_id_a, kolumner)
+    tabell_b = delad_körningstabell(run_id_b, kolumner)
+    har_krav = "Effkrav_proc" in tabell_a.column_names and "Effkrav_proc" in tabell_b.column_names
+    namn_a = {"Effektivitet": "Eff_A", "Effkrav_proc": "Krav_A"}
+    namn_b = {"Effektivitet": "Eff_B", "Effkrav_proc": "Krav_B"}
+    merged = tabell_a.rename_columns([namn_a.get(k, k) for k in tabell_a.column_names]).join(
+        tabell_b.rename_columns([namn_b.get(k, k) for k in tabell_b.column_names]),
+        keys="Företag",
+        join_type="inner",
+    )
+    # Samma urval som tidigare dropna(): bara företag med effektivitet i båda körningarna
+    merged = merged.filter(pc.and_(pc.is_finite(merged["Eff_A"]), pc.is_finite(merged["Eff_B"])))
 
-    if merged.empty:
+    if merged.num_rows == 0:
         st.info("Inga gemensamma företag att jämföra.")
         st.stop()
 
-    merged["Diff"] = merged["Eff_B"] - merged["Eff_A"]
-    corr = merged["Eff_A"].corr(merged["Eff_B"])
+    merged = merged.append_column("Diff", pc.subtract(merged["Eff_B"], merged["Eff_A"]))
+    corr = np.corrcoef(merged["Eff_A"].to_numpy(), merged["Eff_B"].to_numpy())[0, 1]
+    visade = ["Företag", "Eff_A", "Eff_B", "Diff"]
 
     st.subheader("Effektivitetsjämförelse")
     st.markdown(f"**Pearson-korrelation mellan effektivitet A och B:** `{corr:.4f}`")
     st.markdown("#### Största skillnader (Eff_B − Eff_A)")
-    st.dataframe(merged.sort_values("Diff", key=abs, ascending=False).head(10))
+    störst = pc.array_sort_indices(pc.abs(merged["Diff"]), order="descending")
+    st.dataframe(merged.select(visade).take(störst[:10]).to_pandas(), hide_index=True)
     st.markdown("#### Samtliga gemensamma företag")
-    st.dataframe(merged.sort_values("Företag"))
+    paged_table(merged.select(visade), key="jämför_företag", sortering="Företag")
 
     # --- Lägg till effektivitetskrav för scatterplot ---
-    if "Effkrav_proc" in df_a.columns and "Effkrav_proc" in df_b.columns:
-        merged["Krav_A"] = df_a.set_index("Företag").loc[merged["Företag"], "Effkrav_proc"].values * 100
-        merged["Krav_B"] = df_b.set_index("Företag").loc[merged["Företag"], "Effkrav_proc"].values * 100
+    if har_krav:
+        merged = merged.to_pandas()
+        merged["Krav_A"] = merged["Krav_A"] * 100
+        merged["Krav_B"] = merged["Krav_B"] * 100
     else:
         st.warning("Effektivitetskrav saknas i en eller båda körningarna – scatterplot för krav kan inte visas.")
         st.stop()
@@ -277,27 +423,25 @@ elif modellval == "Jämför körningar":
 
     with col1:
         st.subheader("Scatterplot: Effektivitet – A vs B")
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.scatter(merged["Eff_A"], merged["Eff_B"], alpha=0.7)
-        ax.plot([0, 1], [0, 1], color="gray", linestyle="--")
-        ax.set_xlabel("Effektivitet – Körning A")
-        ax.set_ylabel("Effektivitet – Körning B")
-        ax.set_title("Effektivitet A vs B")
-        ax.grid(True)
-        st.pyplot(fig, use_container_width=False)
+        plot_scatter_interactive(
+            merged, "Eff_A", "Eff_B",
+            title="Effektivitet A vs B",
+            x_title="Effektivitet – Körning A",
+            y_title="Effektivitet – Körning B",
+            diagonal=True,
+            domain=(0, 1),
+        )
 
     with col2:
         st.subheader("Scatterplot: Effektivitetskrav (%) – A vs B")
-        fig_k, ax_k = plt.subplots(figsize=(5, 5))
-        ax_k.scatter(merged["Krav_A"], merged["Krav_B"], alpha=0.7)
-        ax_k.plot([1, 2], [1, 2], color="gray", linestyle="--")
-        ax_k.set_xlim(1.0, 2.0)
-        ax_k.set_ylim(1.0, 2.0)
-        ax_k.set_xlabel("Effektiviseringskrav (%) – Körning A")
-        ax_k.set_ylabel("Effektiviseringskrav (%) – Körning B")
-        ax_k.set_title("Effektiviseringskrav A vs B")
-        ax_k.grid(True)
-        st.pyplot(fig_k, use_container_width=False)
+        plot_scatter_interactive(
+            merged, "Krav_A", "Krav_B",
+            title="Effektiviseringskrav A vs B",
+            x_title="Effektiviseringskrav (%) – Körning A",
+            y_title="Effektiviseringskrav (%) – Körning B",
+            diagonal=True,
+            domain=(1.0, 2.0),
+        )
 
 
 elif modellval == "Företagsanalys":
@@ -309,11 +453,12 @@ elif modellval == "Företagsanalys":
         "Detta innebär att resultatet inte är direkt jämförbart med den ursprungliga modellkörningen."
     )
 
-    from app.run_logger import list_runs, load_run
 
-    runs = list_runs()
+    flush_runs()
+    runs = list_runs(EFFEKTIVITETSMODELLER)
     run_id = st.selectbox("Välj tidigare körning", runs)
-    params, df = load_run(run_id)
+    params, df = delad_körning(run_id)
+    visa_prestanda(params.get("prestanda"), f"Sparad körning {run_id}")
 
     if "TOTEX" not in df.columns and "OPEXp" in df.columns and "CAPEX" in df.columns:
         df["TOTEX"] = df["OPEXp"] + df["CAPEX"]
@@ -333,6 +478,82 @@ elif modellval == "Företagsanalys":
     if "is_outlier" in df.columns and row["is_outlier"]:
         st.warning("⚠️ Det här företaget identifierades som outlier i vald modellkörning och exkluderades från beräkning.")
 
+    analysläge = st.radio("Analysläge", ["Enskild simulering", "Scenariorutnät"], horizontal=True)
+
+    if analysläge == "Scenariorutnät":
+        from app.scenario_grid import run_scenario_grid, procentsteg, MAX_SCENARIER
+        from app.plots import plot_response_surface
+
+        st.caption(
+            "Alla kombinationer av de valda förändringarna utvärderas med DEA mot körningens fasta referensgrupp "
+            "(icke-outliers utom valt företag). Fronten byggs inte om per scenario."
+        )
+        körparametrar = params.get("parametrar", {})
+        if params.get("modell", "DEA") != "DEA":
+            st.info("Scenariorutnätet räknar alltid med DEA; referensgruppen hämtas från vald körning.")
+
+        grid_vars = st.multiselect(
+            "Variabler att variera", ["OPEXp", "CAPEX", "CU", "MW", "NS", "MWhl", "MWhh"], default=["OPEXp", "CAPEX"]
+        )
+        variationer = {}
+        for var in grid_vars:
+            c1, c2 = st.columns([3, 1])
+            intervall = c1.slider(f"{var}: förändring (%)", -50, 50, (-20, 20), key=f"grid_{var}_intervall")
+            steg = c2.number_input("Steg (%)", min_value=1, max_value=50, value=5, key=f"grid_{var}_steg")
+            variationer[var] = procentsteg(intervall[0], intervall[1], steg)
+
+        grid_rts = st.selectbox("RTS", ["crs", "vrs"], index=["crs", "vrs"].index(körparametrar.get("rts", "crs")))
+        grid_outputs = st.multiselect(
+            "Outputvariabler", ["CU", "MW", "NS", "MWhl", "MWhh"],
+            default=körparametrar.get("output_cols", ["CU", "MW", "NS", "MWhl", "MWhh"]),
+        )
+        grid_trunk_min = st.slider("Min trunkering", 0.0, 0.3, float(körparametrar.get("trunkering_min", 0.162416)))
+        grid_trunk_max = st.slider("Max trunkering", 0.1, 0.5, float(körparametrar.get("trunkering_max", 0.3)))
+        grid_kr_bas = st.selectbox("Bas för krav i kr", ["OPEXp", "TOTEX"])
+
+        antal = int(np.prod([len(v) for v in variationer.values()])) if variationer else 0
+        st.write(f"Antal scenarier: {antal} (max {MAX_SCENARIER})")
+
+        if st.button("Kör scenariorutnät", disabled=not variationer or not grid_outputs or antal > MAX_SCENARIER):
+            with st.spinner(f"Löser {antal} scenarier..."):
+                st.session_state["grid_resultat"] = run_scenario_grid(
+                    df, selected_firm, variationer,
+                    rts=grid_rts,
+                    input_cols=["CAPEX", "OPEXp"],
+                    output_cols=grid_outputs,
+                    trunkering_min=grid_trunk_min,
+                    trunkering_max=grid_trunk_max,
+                    kr_bas_col=grid_kr_bas,
+                )
+                st.session_state["grid_företag"] = selected_firm
+
+        grid = st.session_state.get("grid_resultat")
+        if grid is not None and st.session_state.get("grid_företag") == selected_firm:
+            st.caption(f"Referensgrupp: {grid.attrs.get('referensgrupp', '?')} företag.")
+            delta_cols = [c for c in grid.columns if c.startswith("Δ ")]
+            x_col = delta_cols[0]
+            y_col = delta_cols[1] if len(delta_cols) > 1 else None
+            if len(delta_cols) > 2:
+                st.info("Fler än två variabler: ytan visar de två första, övriga ligger kvar i tabellen.")
+                övriga = {c: 0.0 if 0.0 in set(grid[c]) else grid[c].iloc[0] for c in delta_cols[2:]}
+                yta = grid[np.logical_and.reduce([grid[c] == v for c, v in övriga.items()])]
+            else:
+                yta = grid
+
+            c1, c2 = st.columns(2)
+            with c1:
+                plot_response_surface(yta, x_col, "Effektivitet", y_col, title="Effektivitet")
+            with c2:
+                plot_response_surface(yta, x_col, "Effkrav (kr)", y_col, title="Effkrav (kr)", value_format=",.0f", omvänd=True)
+
+            visade = delta_cols + ["Effektivitet", "Supereffektivitet", "Effkrav (%)", "Effkrav (kr)"]
+            paged_table(grid[visade], key="grid_tabell")
+
+            xlsx_download_button(
+                {"Scenarier": grid}, f"scenariorutnat_{selected_firm}.xlsx", "📄 Ladda ned scenariorutnät som Excel"
+            )
+        st.stop()
+
     st.write("Redigera indata:")
     edited_row = {}
     for col in ["OPEXp", "CAPEX", "TOTEX", "CU", "MW", "NS", "MWhl", "MWhh"]:
@@ -377,7 +598,9 @@ elif modellval == "Företagsanalys":
         df_combined = pd.concat([df_ref, df_sim], ignore_index=True)
 
         if modelltyp == "DEA":
-            result = run_dea_model(
+            from app.dea_model import run_dea_model
+
+            result = egen_körning(run_dea_model(
                 df_combined,
                 rts=rts_val,
                 trunkering_min=trunk_min,
@@ -385,9 +608,11 @@ elif modellval == "Företagsanalys":
                 input_cols=input_cols,
                 output_cols=output_cols,
                 outlier_filter=use_outlier_filter
-            )
+            ))
         elif modelltyp == "PyStoned":
-            result = run_pystoned_model(
+            from app.pystoned_model import run_pystoned_model
+
+            result = egen_körning(run_pystoned_model(
                 df_combined,
                 rts=rts_val,
                 fun=fun_val,
@@ -398,7 +623,7 @@ elif modellval == "Företagsanalys":
                 output_cols=output_cols,
                 outlier_filter=use_outlier_filter,
                 kravmetod=kravmetod_val
-            )
+            ))
 
         res_firm = result[result["Företag"] == selected_firm].copy()
         effkrav_kr = res_firm["Effkrav_proc"].values[0] * res_firm[kr_bas_col].values[0]
@@ -474,32 +699,183 @@ elif modellval == "Företagsanalys":
     input_df = pd.DataFrame(st.session_state["sim_inputs"])
     st.dataframe(input_df)
 
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-        hist_df.to_excel(writer, sheet_name="Resultat", index=False)
-        input_df.to_excel(writer, sheet_name="Antaganden", index=False)
-    st.download_button(
-        label="📄 Ladda ned resultatöversikt som Excel",
-        data=buffer.getvalue(),
-        file_name=f"simulering_{selected_firm}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    xlsx_download_button(
+        {"Resultat": hist_df, "Antaganden": input_df},
+        f"simulering_{selected_firm}.xlsx",
+        "📄 Ladda ned resultatöversikt som Excel",
+    )
+
+
+elif modellval == "Peer-analys (DEA)":
+    from app.peer_influence import run_peer_influence, har_peers, KR_BASER
+    from app.plots import plot_influence_matrix
+
+    st.subheader("Peer-påverkan (leave-one-peer-out)")
+    st.caption(
+        "Varje effektivt företag (peer) tas bort i tur och ordning. Bara de företag som "
+        "refererade till peern löses om – övriga påverkas inte."
+    )
+
+    flush_runs()
+    runs = [r for r in list_runs(["DEA"]) if har_peers(r)]
+    if not runs:
+        st.warning("Inga DEA-körningar med sparade peers hittades – kör DEA-modellen igen.")
+        st.stop()
+
+    kol1, kol2 = st.columns([3, 1])
+    run_id = kol1.selectbox("DEA-körning", runs, index=len(runs) - 1)
+    kr_bas = kol2.selectbox("Bas för krav i kr", KR_BASER)
+
+    if st.button("Kör peer-analys"):
+        with st.spinner("Löser om refererande företag per peer..."):
+            st.session_state["peer_påverkan"] = run_peer_influence(run_id, kr_bas)
+
+    resultat = st.session_state.get("peer_påverkan")
+    if resultat is None or resultat.run_id != run_id:
+        st.info("⚙️ Välj körning och klicka på 'Kör peer-analys'.")
+        st.stop()
+
+    st.caption(f"{resultat.antal_lp} omlösningar på {resultat.sekunder:.2f} s.")
+    rangordning = resultat.rangordning().drop(columns="peer_rad")
+
+    st.markdown("**Rangordning av peers**")
+    paged_table(
+        rangordning, key="peer_rangordning",
+        format={
+            "Summa λ": "{:.3f}", "Summa Δ Effektivitet": "{:.4f}", "Max Δ Effektivitet": "{:.4f}",
+            "Summa Δ Effkrav (pp)": "{:.3f}", "Summa Δ Effkrav (kr)": "{:,.0f}",
+        },
+        gradient=["Summa Δ Effektivitet"], cmap="Reds",
+    )
+
+    st.markdown("**Influensmatris**")
+    matrisvärde = st.radio("Värde", ["Δ Effektivitet", "Δ Effkrav (pp)", "Δ Effkrav (kr)"], horizontal=True)
+    matris = resultat.influensmatris(matrisvärde)
+    plot_influence_matrix(
+        matris[rangordning["Peer"]], matrisvärde,
+        value_format=".4f" if matrisvärde == "Δ Effektivitet" else ",.2f",
+        omvänd=matrisvärde != "Δ Effektivitet",
+    )
+
+    st.markdown("**Per företag**")
+    valt_företag = st.selectbox("Företag", sorted(resultat.påverkan["Företag"].unique()))
+    st.dataframe(
+        resultat.för_företag(valt_företag).drop(columns=["Företag", "peer_rad", "rad"]).style.format({
+            "lambda": "{:.3f}", "Supereffektivitet före": "{:.4f}", "Supereffektivitet efter": "{:.4f}",
+            "Effektivitet före": "{:.4f}", "Effektivitet efter": "{:.4f}",
+            "Effkrav (%) före": "{:.2f}", "Effkrav (%) efter": "{:.2f}",
+            "Δ Effektivitet": "{:.4f}", "Δ Effkrav (pp)": "{:.3f}", "Δ Effkrav (kr)": "{:,.0f}",
+        }, thousands=" "),
+        hide_index=True, width="stretch",
+    )
+
+    xlsx_download_button(
+        {
+            "Rangordning": rangordning,
+            "Influensmatris": resultat.influensmatris().reset_index(),
+            "Påverkan": resultat.påverkan,
+        },
+        f"peer_paverkan_{run_id}.xlsx",
+        "📄 Ladda ned peer-analysen som Excel",
+    )
+
+
+elif modellval == "Intäktsram":
+    from app.revenue_cap import KOSTNADSBASER, PERIODLÄNGD
+
+    st.subheader("Effekt på intäktsramen över tillsynsperioden")
+    st.caption(
+        f"Årligt effektiviseringskrav tillämpat på kostnadsbasen under {PERIODLÄNGD} år, "
+        "för alla företag och valda körningar samtidigt."
+    )
+
+    flush_runs()
+    runs = list_runs(EFFEKTIVITETSMODELLER)
+    if not runs:
+        st.warning("Inga modellkörningar hittades.")
+        st.stop()
+
+    valda_runs = st.multiselect("Körningar (scenarier)", runs, default=runs[-min(len(runs), 5):])
+    kol1, kol2, kol3 = st.columns(3)
+    kostnadsbas = kol1.selectbox("Bas för krav i kr", KOSTNADSBASER)
+    kapitalbas_runs = list_runs(["Kapitalbas"])
+    kapitalkälla = kol2.selectbox("Kapitalkostnad", ["CAPEX i körningen"] + kapitalbas_runs)
+    startår = kol3.number_input("Första år i perioden", min_value=2000, max_value=2100, value=2024, step=1)
+
+    if not valda_runs:
+        st.info("Välj minst en körning.")
+        st.stop()
+
+    # Cachad per (körningar, bas, kapitalkälla, startår) – byte av värde eller företag räknar inte om
+    projektion = delad_projektion(
+        tuple(valda_runs),
+        kostnadsbas,
+        None if kapitalkälla == "CAPEX i körningen" else kapitalkälla,
+        int(startår),
+    )
+    per_år = projektion.per_år()
+
+    st.markdown("**Samtliga företag per år**")
+    st.line_chart(per_år, x="År", y="Effkrav (kr)", color="Scenario")
+    st.dataframe(
+        per_år.style.format({"Effkrav (kr)": "{:,.0f}", "Intäktsram": "{:,.0f}"}, thousands=" "),
+        hide_index=True, width="stretch",
+    )
+
+    def kr(värde):
+        return f"{värde:,.0f}".replace(",", " ")
+
+    st.markdown("**Per företag – summa över perioden**")
+    periodvärde = st.radio("Värde", ["Effkrav (kr)", "Intäktsram"], horizontal=True)
+    periodsumma = projektion.periodsumma(periodvärde)
+    paged_table(
+        periodsumma, key="intäktsram_per_företag",
+        format={run_id: kr for run_id in valda_runs},
+        sortering=valda_runs[0], fallande=True,
+    )
+
+    företagsnamn = dict(zip(projektion.reid, projektion.företag))
+    valt_reid = st.selectbox(
+        "Visa företag", projektion.reid,
+        format_func=lambda r: f"{företagsnamn[r]} ({r})" if isinstance(företagsnamn[r], str) else r,
+    )
+    företag_år = projektion.för_företag(valt_reid)
+    st.line_chart(företag_år, x="År", y="Intäktsram", color="Scenario")
+    paged_table(
+        företag_år, key="intäktsram_företag", sökbar=False,
+        format={
+            "Effkrav (%)": "{:.2f}", "Påverkbara kostnader": kr,
+            "Effkrav (kr)": kr, "Intäktsram": kr,
+        },
+    )
+
+    xlsx_download_button(
+        lambda: {"Per år": per_år, "Per företag": periodsumma, "Alla rader": projektion.lång()},
+        "intaktsram_projektion.xlsx",
+        "📄 Ladda ned projektionen som Excel",
     )
 
 
 elif modellval == "Geografisk karta":
-    from app.run_logger import list_runs, load_run
-    from heatmap_view import show_heatmap, load_shapes
-    from spatial_analysis import lägg_till_grannsnitt
+    from heatmap_view import show_heatmap, grann_underlag, grann_koordinater, grann_kontiguitet
+    from spatial_analysis import lägg_till_grannsnitt, lägg_till_lisa
 
-    runs = list_runs()
+    flush_runs()
+    runs = list_runs(EFFEKTIVITETSMODELLER)
     if not runs:
         st.warning("Inga modellkörningar hittades.")
         st.stop()
 
     run_id = st.selectbox("Välj körning", runs, index=0)
-    _, df_resultat = load_run(run_id)
-
-    karttyp = st.selectbox("Välj karttyp", ["Statisk", "Dynamisk"])
+    _, df_resultat = delad_körning(run_id)
+
+    karttyp = st.selectbox("Välj karttyp", ["Statisk", "Dynamisk", "Vektortiles"])
+    detaljnivå = "medel"
+    if karttyp == "Dynamisk":
+        detaljnivå = st.selectbox(
+            "Detaljnivå (förenkling av gränser)", ["låg", "medel", "hög"], index=1,
+            help="Lägre detaljnivå ger mindre data till webbläsaren och snabbare karta."
+        )
 
     möjliga_indikatorer = ["Effektivitet"]
     if "Supereffektivitet" in df_resultat.columns:
@@ -510,43 +886,40 @@ elif modellval == "Geografisk karta":
 
     if visa_karta:
         # Visa heatmap
-        show_heatmap(df_resultat, karttyp=karttyp, indikator=indikator)
+        show_heatmap(df_resultat, karttyp=karttyp, indikator=indikator, detaljnivå=detaljnivå, run_id=run_id)
 
         # Grannsnittsanalys
         st.subheader("🔍 Relativ effektivitet: Grannanalys")
 
-        gdf_shapes = load_shapes()
-        df_merge = df_resultat[["REId", indikator]].copy()
-        gdf_shapes = gdf_shapes.merge(df_merge, on="REId", how="left")
-
-        # Sätt geometri aktiv om den tappats
-        gdf_shapes = gpd.GeoDataFrame(gdf_shapes, geometry="geometry", crs=gdf_shapes.crs)
+        gdf_shapes = grann_underlag(df_resultat, indikator)
 
         # Val av metod för grannanalys
         st.subheader("Parametrar för grannanalys")
-        metod = st.selectbox("Metod för grannanalys", ["knn", "distanceband"], index=0)
+        metod = st.selectbox("Metod för grannanalys", ["knn", "distanceband", "queen", "rook"], index=0)
         avståndsviktning = st.checkbox("Använd avståndsviktning", value=False)
 
         if metod == "knn":
             k_val = st.slider("Antal närmaste grannar (k)", 1, 10, 4)
-            gdf_analys = lägg_till_grannsnitt(
-                gdf_shapes,
-                indikator=indikator,
-                method="knn",
-                k=k_val,
-                avståndsviktning=avståndsviktning
-            )
+            grann_parametrar = {"method": "knn", "k": k_val}
             metodtext = f"{k_val} närmaste grannar (centroid-baserat)"
-        else:
+        elif metod == "distanceband":
             d_val = st.slider("Maximalt avstånd (meter)", 1000, 100000, 50000, step=1000)
-            gdf_analys = lägg_till_grannsnitt(
-                gdf_shapes,
-                indikator=indikator,
-                method="distanceband",
-                distance_threshold=d_val,
-                avståndsviktning=avståndsviktning
-            )
+            grann_parametrar = {"method": "distanceband", "distance_threshold": d_val}
             metodtext = f"alla grannar inom {d_val} meter (centroid-baserat)"
+        else:
+            grann_parametrar = {"method": metod, "kontiguitet": grann_kontiguitet(metod)}
+            metodtext = (
+                "grannar som delar gräns eller hörn (queen)" if metod == "queen"
+                else "grannar som delar en gränssträcka (rook)"
+            )
+
+        gdf_analys = lägg_till_grannsnitt(
+            gdf_shapes,
+            indikator=indikator,
+            avståndsviktning=avståndsviktning,
+            koordinater=grann_koordinater(),
+            **grann_parametrar
+        )
 
         # Visa tabell
         with st.expander("Visa grannsnittsanalys"):
@@ -554,9 +927,43 @@ elif modellval == "Geografisk karta":
             vikttext = "med avståndsviktning" if avståndsviktning else "utan avståndsviktning"
             st.markdown(f"_Baseras på {indikator.lower()} och {metodtext}, {vikttext}._")
 
-            df_grann = gdf_analys[["REId", indikator, "grannsnitt", "eff_gap"]].dropna().copy()
-            df_grann = df_grann.sort_values("eff_gap")
+            df_grann = gdf_analys[["REId", indikator, "grannsnitt", "eff_gap"]].dropna()
+
+            # Färgskalan räknas bara för den synliga sidan, med gränser från hela kolumnen
+            paged_table(df_grann, key="grannsnitt", gradient=["eff_gap"], cmap="RdYlGn", sortering="eff_gap")
 
-            st.dataframe(df_grann.style
-                        .background_gradient(cmap="RdYlGn", subset=["eff_gap"]),
-                        use_container_width=True)
+        # Rumslig autokorrelation
+        with st.expander("Rumslig autokorrelation (Moran's I / LISA)"):
+            st.markdown(
+                "Testar om indikatorn är geografiskt klustrad med samma grannar och viktning som ovan. "
+                "P-värden från (villkorliga) permutationer."
+            )
+            permutationer = st.selectbox("Antal permutationer", [999, 4999, 9999], index=0)
+
+            if st.button("Beräkna Moran's I och LISA"):
+                gdf_lisa, moran = lägg_till_lisa(
+                    gdf_shapes,
+                    indikator=indikator,
+                    avståndsviktning=avståndsviktning,
+                    koordinater=grann_koordinater(),
+                    permutationer=permutationer,
+                    seed=12345,
+                    **grann_parametrar
+                )
+
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Moran's I", f"{moran['I']:.4f}", help=f"Förväntat vid slumpmässighet: {moran['EI']:.4f}")
+                col2.metric("p-värde (permutation)", f"{moran['p_sim']:.4f}")
+                col3.metric("z (permutation)", f"{moran['z_sim']:.2f}")
+
+                st.markdown("**Signifikanta lokala kluster (p ≤ 0,05)**")
+                st.dataframe(
+                    gdf_lisa[gdf_lisa["signifikant"]]["kvadrant"]
+                    .value_counts()
+                    .rename_axis("Kvadrant")
+                    .reset_index(name="Antal områden")
+                )
+                paged_table(
+                    gdf_lisa.loc[gdf_lisa["signifikant"], ["REId", indikator, "Ii", "p_sim", "kvadrant"]],
+                    key="lisa", sortering="p_sim",
+                )
@@ -1,8 +1,98 @@
+import os
 import streamlit as st
+import pandas as pd
+
+from app.run_logger import list_runs
+from app.shared_cache import delat_anläggningsregister, delad_körning, delad_körningstabell
+from app.tables import paged_table
+from app.export import run_download_buttons
 
 if "access_granted" not in st.session_state or not st.session_state.access_granted:
     st.stop()
 
 st.set_page_config(page_title="Kapitalbas – Dashboard", layout="wide")
-st.title("Kapitalbas (under utveckling)")
-st.info("Denna del utvecklas senare.")
+st.title("Kapitalbas")
+st.markdown("Kapitalbas och kapitalkostnad per REId beräknad från anläggningsregistret.")
+
+
+def mnkr(kronor):
+    return f"{kronor / 1e6:,.1f}".replace(",", " ")
+
+
+def kr(kronor):
+    return f"{kronor:,.0f}".replace(",", " ")
+
+
+# --- Anläggningsregister ---
+DATA_DIR = "data"
+REGISTER_ÄNDELSER = (".xlsx", ".parquet", ".csv")
+register_filer = sorted(
+    f for f in os.listdir(DATA_DIR)
+    if f.lower().endswith(REGISTER_ÄNDELSER) and f != "Data_modeller.xlsx"
+) if os.path.isdir(DATA_DIR) else []
+
+st.sidebar.subheader("Beräkning")
+if register_filer:
+    register_fil = st.sidebar.selectbox("Anläggningsregister", register_filer)
+else:
+    register_fil = None
+    st.sidebar.info(f"Lägg ett anläggningsregister ({', '.join(REGISTER_ÄNDELSER)}) i {DATA_DIR}/.")
+
+metod = st.sidebar.radio("Avskrivningsmetod", ["annuitet", "linjär"], format_func=lambda m: f"Real {m}")
+kalkylränta = st.sidebar.number_input("Real kalkylränta (%)", min_value=0.0, max_value=20.0, value=4.53, step=0.01) / 100
+använd_prisindex = st.sidebar.checkbox("Räkna om med prisindex", value=True)
+
+if st.sidebar.button("Beräkna kapitalbas", disabled=register_fil is None):
+    from app.kapitalbas import run_kapitalbas
+
+    with st.spinner("Läser register och beräknar..."):
+        register = delat_anläggningsregister(os.path.join(DATA_DIR, register_fil))
+        resultat = run_kapitalbas(register, metod, kalkylränta, använd_prisindex)
+    st.session_state["kapitalbas_run_id"] = resultat.attrs["run_id"]
+
+# --- Resultat: beräknade aggregat läses från run store ---
+runs = list_runs(["Kapitalbas"])
+senaste = st.session_state.get("kapitalbas_run_id")
+if senaste is not None and senaste not in runs:
+    runs.append(senaste)  # sparas fortfarande i bakgrunden
+if not runs:
+    st.info("⚙️ Välj register och parametrar och klicka på 'Beräkna kapitalbas'.")
+    st.stop()
+
+runs = sorted(runs, reverse=True)
+run_id = st.selectbox("Körning", runs, index=runs.index(senaste) if senaste in runs else 0)
+params, df = delad_körning(run_id)
+parametrar = params.get("parametrar", {})
+
+
+antal_komponenter = f"{parametrar.get('antal_komponenter', 0):,}".replace(",", " ")
+st.caption(
+    f"Real {parametrar.get('metod')}, kalkylränta {parametrar.get('kalkylränta', 0) * 100:.2f} %, "
+    f"{'med' if parametrar.get('använd_prisindex') else 'utan'} prisindex, {antal_komponenter} komponenter"
+)
+
+kol1, kol2, kol3, kol4 = st.columns(4)
+kol1.metric("NUAK (mnkr)", mnkr(df["NUAK"].sum()))
+kol2.metric("Kapitalbas (mnkr)", mnkr(df["Kapitalbas"].sum()))
+kol3.metric("Kapitalkostnad (mnkr/år)", mnkr(df["Kapitalkostnad"].sum()))
+kol4.metric("Ogiltiga rader", int(df["Ogiltiga rader"].sum()))
+
+st.subheader("Kapitalkostnad per REId (största 20)")
+topp = df.nlargest(20, "Kapitalkostnad").set_index("REId")
+st.bar_chart(topp[["Avskrivning", "Avkastning"]] / 1e6, y_label="mnkr/år")
+
+st.subheader("Per REId")
+paged_table(
+    delad_körningstabell(run_id), key="kapitalbas_per_reid",
+    format={
+        "NUAK": kr, "Kapitalbas": kr, "Avskrivning": kr, "Avkastning": kr,
+        "Kapitalkostnad": kr, "Andel fullt avskrivet": "{:.1%}", "Medelålder": "{:.1f}",
+    },
+    sortering="Kapitalkostnad", fallande=True,
+)
+run_download_buttons(run_id, f"kapitalbas_{run_id}", "📥 Ladda ner")
+
+if params.get("prestanda"):
+    with st.expander("⏱️ Prestanda"):
+        st.markdown(f"Totalt {params['prestanda']['totalt_s']:.2f} s")
+        st.dataframe(pd.DataFrame(params["prestanda"]["steg"]), hide_index=True, width="stretch")
@@ -3,63 +3,432 @@ Beräknar geografisk grannsnittseffektivitet och effektivitetsgap (eff_gap) med
 
 Modellspecifikation:
 - Relativ effektivitet definieras som skillnaden mellan ett företags effektivitet och medeleffektiviteten bland geografiska grannar.
-- Två metoder stöds:
+- Fyra metoder stöds:
     - KNN: närmaste k grannar baserat på centroidavstånd.
     - DistanceBand: alla grannar inom angivet avstånd (t.ex. 50 km).
+    - Queen: polygoner som delar minst en gränspunkt (eller överlappar).
+    - Rook: polygoner som delar en gränssträcka (eller överlappar).
 
 Motivering:
 Jämförelse med geografiska grannar möjliggör identifiering av lokal förbättringspotential respektive strukturella hinder.
 
+Grannindex:
+Geometrin ändras inte mellan anrop, så ett KD-träd över centroiderna byggs en gång och cachas
+(hämta_grannindex). Ur det förberäknas en tabell med de K_MAX närmaste grannarna och en tabell
+med alla grannar inom MAX_AVSTÅND, båda sorterade på avstånd. Varje k respektive avståndsgräns
+blir då ett prefix per rad i tabellerna och bara själva medelvärdesbildningen görs per anrop.
+
+Kontiguitet:
+Queen/Rook ger rätt grannar för långa, smala landsbygdsområden där centroiderna ligger långt
+ifrån de faktiska grannarna. Kandidatpar hämtas med ett STRtree (boundingbox-filter) och
+prövas sedan exakt. Resultatet för geometrilagrets polygoner sparas på disk i lagrets katalog
+(hämta_kontiguitet) och räknas därmed bara om när lagret byggs om.
+
 Parametrar:
 - gdf: GeoDataFrame med kolumnerna 'REId', 'geometry' och t.ex. 'Effektivitet'
 - indikator: vilken kolumn som ska analyseras (default = 'Effektivitet')
-- method: 'knn' eller 'distanceband' (default = 'knn')
+- method: 'knn', 'distanceband', 'queen' eller 'rook' (default = 'knn')
 - k: antal grannar (om method='knn')
 - distance_threshold: gräns i meter (om method='distanceband')
+- koordinater: (n, 2)-array med centroider i gdf:s ordning; beräknas från gdf om den saknas
+- kontiguitet: förberäknade (indptr, indices) för queen/rook i gdf:s ordning; beräknas från gdf om den saknas
+
+Avståndsviktning:
+Vikten för en granne är 1 / avstånd (minst 1 m). Vikterna byggs direkt som en gles CSR-matris
+från grannlistorna, så minnet växer med antalet grannpar och inte med n².
 
 Returnerar:
 - GeoDataFrame med kolumnerna 'grannsnitt' och 'eff_gap'
 """
 
+import os
+import hashlib
+import threading
+
 import geopandas as gpd
 import numpy as np
-from libpysal.weights import KNN, DistanceBand
+from scipy import sparse
+
+from app.instrumentation import Mätning
+
+K_MAX = 10
+MAX_AVSTÅND = 100000
+KONTIGUITET = ("queen", "rook")
+
+
+class GrannIndex:
+    """
+    KD-träd över punkter med förberäknade, avståndssorterade grannlistor.
+
+    Grannar returneras i CSR-form: (indptr, indices, avstånd), där grannarna
+    till punkt i är indices[indptr[i]:indptr[i + 1]].
+    """
+
+    def __init__(self, koordinater, k_max=K_MAX, max_avstånd=MAX_AVSTÅND):
+        from scipy.spatial import cKDTree
+
+        self.koordinater = np.asarray(koordinater, dtype=float)
+        self.n = len(self.koordinater)
+        self.tree = cKDTree(self.koordinater)
+        self._lock = threading.Lock()
+        self._bygg_knn(k_max)
+        self._band = None
+        self._band_avstånd = 0.0
+        self._bygg_band(max_avstånd)
+
+    def _bygg_knn(self, k_max):
+        k_max = min(k_max, self.n - 1)
+        dist, idx = self.tree.query(self.koordinater, k=k_max + 1)
+        dist = dist.reshape(self.n, -1)
+        idx = idx.reshape(self.n, -1)
+
+        # Ta bort punkten själv. Vid många sammanfallande punkter kan den
+        # hamna utanför de k_max + 1 träffarna – ta då bort den sista.
+        själv = idx == np.arange(self.n)[:, None]
+        saknas = ~själv.any(axis=1)
+        själv[saknas, -1] = True
+        self.knn_idx = idx[~själv].reshape(self.n, k_max)
+        self.knn_dist = dist[~själv].reshape(self.n, k_max)
+        self.k_max = k_max
+
+    def _bygg_band(self, max_avstånd):
+        par = self.tree.query_pairs(max_avstånd, output_type="ndarray")
+        i = np.concatenate([par[:, 0], par[:, 1]])
+        j = np.concatenate([par[:, 1], par[:, 0]])
+        d = np.linalg.norm(self.koordinater[i] - self.koordinater[j], axis=1)
+
+        # Sammanfallande punkter räknas inte som grannar i avståndsbandet
+        # (samma beteende som libpysal.DistanceBand)
+        skilda = d > 0
+        i, j, d = i[skilda], j[skilda], d[skilda]
+
+        ordning = np.lexsort((d, i))
+        indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(i, minlength=self.n), out=indptr[1:])
+        self._band = (indptr, j[ordning], d[ordning])
+        self._band_avstånd = max_avstånd
+
+    def knn(self, k):
+        if self.k_max < k < self.n:
+            with self._lock:
+                if self.k_max < k:
+                    self._bygg_knn(k)
+        k = min(k, self.k_max)
+        indptr = np.arange(self.n + 1, dtype=np.int64) * k
+        return indptr, self.knn_idx[:, :k].ravel(), self.knn_dist[:, :k].ravel()
+
+    def avståndsband(self, avstånd):
+        if avstånd > self._band_avstånd:
+            with self._lock:
+                if avstånd > self._band_avstånd:
+                    self._bygg_band(avstånd)
+        indptr, indices, dist = self._band
+        behåll = dist <= avstånd
+        rader = np.repeat(np.arange(self.n), np.diff(indptr))
+        ny_indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rader[behåll], minlength=self.n), out=ny_indptr[1:])
+        return ny_indptr, indices[behåll], dist[behåll]
+
+
+_grannindex_cache = {}
+_grannindex_lock = threading.Lock()
+_GRANNINDEX_MAX = 4
+
+
+def hämta_grannindex(koordinater) -> GrannIndex:
+    """Cachat GrannIndex för givna koordinater (nyckel: hash av koordinaterna)."""
+    koordinater = np.ascontiguousarray(koordinater, dtype=float)
+    nyckel = hashlib.blake2b(koordinater.tobytes(), digest_size=16).hexdigest()
+    with _grannindex_lock:
+        index = _grannindex_cache.get(nyckel)
+    if index is None:
+        index = GrannIndex(koordinater)
+        with _grannindex_lock:
+            if len(_grannindex_cache) >= _GRANNINDEX_MAX:
+                _grannindex_cache.pop(next(iter(_grannindex_cache)))
+            _grannindex_cache[nyckel] = index
+    return index
+
+
+def centroid_koordinater(gdf) -> np.ndarray:
+    centroider = gdf.geometry.centroid
+    return np.column_stack([centroider.x.to_numpy(), centroider.y.to_numpy()])
+
+
+def _csr_från_par(i, j, n):
+    ordning = np.lexsort((j, i))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(i, minlength=n), out=indptr[1:])
+    return indptr, j[ordning].astype(np.int64)
+
+
+def kontiguitetsgrannar(geometrier, typ="queen", tolerans=0.0):
+    """
+    Kontiguitetsgrannar (queen eller rook) för polygoner, i CSR-form (indptr, indices).
+
+    tolerans (meter) låter polygoner med små glapp mellan gränserna räknas som grannar.
+    """
+    import shapely
+
+    if typ not in KONTIGUITET:
+        raise ValueError(f"Ogiltig kontiguitet: {typ}. Välj 'queen' eller 'rook'.")
+
+    geometrier = np.asarray(geometrier)
+    tree = shapely.STRtree(geometrier)
+    if tolerans > 0:
+        i, j = tree.query(geometrier, predicate="dwithin", distance=tolerans)
+    else:
+        i, j = tree.query(geometrier, predicate="intersects")
+    olika = i != j
+    i, j = i[olika], j[olika]
+
+    if typ == "rook":
+        # Kräver en gemensam gränssträcka; en delad hörnpunkt räcker inte
+        gränser = shapely.boundary(geometrier)
+        gräns_i = shapely.buffer(gränser[i], tolerans) if tolerans > 0 else gränser[i]
+        delad = shapely.length(shapely.intersection(gräns_i, gränser[j]))
+        överlapp = shapely.area(shapely.intersection(geometrier[i], geometrier[j])) > 0
+        behåll = (delad > 2 * tolerans) | överlapp
+        i, j = i[behåll], j[behåll]
+
+    return _csr_från_par(i, j, len(geometrier))
+
+
+def _polygoner_till_rader(indptr, indices, poly_idx):
+    """Expanderar polygongrannar till rader: rader på grannpolygoner och på samma polygon."""
+    import pandas as pd
+
+    n_poly = len(indptr) - 1
+    p = np.concatenate([np.repeat(np.arange(n_poly), np.diff(indptr)), np.arange(n_poly)])
+    q = np.concatenate([indices, np.arange(n_poly)])
+    rader = pd.DataFrame({"poly": poly_idx, "rad": np.arange(len(poly_idx))})
+
+    par = (
+        pd.DataFrame({"p": p, "q": q})
+        .merge(rader.rename(columns={"poly": "p", "rad": "i"}), on="p")
+        .merge(rader.rename(columns={"poly": "q", "rad": "j"}), on="q")
+    )
+    par = par[par["i"] != par["j"]]
+    return _csr_från_par(par["i"].to_numpy(), par["j"].to_numpy(), len(poly_idx))
+
+
+def hämta_kontiguitet(store, typ="queen", tolerans=0.0):
+    """
+    Kontiguitetsgrannar för raderna i geometrilagrets REId-tabell (CSR: indptr, indices).
+
+    Polygongrannarna cachas på disk i lagrets katalog, som byts ut när lagret
+    byggs om. I minnet cachas de per lager av anroparen (heatmap_view._grann_kontiguitet).
+    """
+    sökväg = os.path.join(store.katalog, f"kontiguitet_{typ}_{tolerans:g}.npz")
+    indptr = None
+    if os.path.isfile(sökväg):
+        with np.load(sökväg) as data:
+            indptr, indices = data["indptr"], data["indices"]
+        if len(indptr) != len(store.polygoner) + 1:
+            indptr = None  # skriven för ett annat lager i samma katalog
+    if indptr is None:
+        indptr, indices = kontiguitetsgrannar(store.polygoner.geometry.values, typ, tolerans)
+        tmp = f"{sökväg}.tmp-{os.getpid()}-{threading.get_ident()}.npz"
+        np.savez(tmp, indptr=indptr, indices=indices)
+        os.replace(tmp, sökväg)
+
+    return _polygoner_till_rader(indptr, indices, store.poly_idx)
+
 
-def lägg_till_grannsnitt(gdf, indikator="Effektivitet", method="knn", k=4, distance_threshold=50000, avståndsviktning=False):
+def grannvikter(koordinater, method="knn", k=4, distance_threshold=50000, avståndsviktning=False, kontiguitet=None):
+    """Gles viktmatris (CSR, n × n) över grannarna enligt vald metod."""
+    if method in KONTIGUITET:
+        if kontiguitet is None:
+            raise ValueError("Kontiguitetsgrannar (indptr, indices) krävs för queen/rook.")
+        koordinater = np.asarray(koordinater, dtype=float)
+        indptr, indices = kontiguitet
+        n = len(indptr) - 1
+        rader = np.repeat(np.arange(n), np.diff(indptr))
+        dist = np.linalg.norm(koordinater[rader] - koordinater[indices], axis=1)
+    else:
+        index = hämta_grannindex(koordinater)
+        n = index.n
+        if method == "knn":
+            indptr, indices, dist = index.knn(k)
+        elif method == "distanceband":
+            indptr, indices, dist = index.avståndsband(distance_threshold)
+        else:
+            raise ValueError("Ogiltig metod. Välj 'knn', 'distanceband', 'queen' eller 'rook'.")
+
+    if avståndsviktning:
+        vikter = 1 / np.maximum(dist, 1)  # undvik delning med 0
+    else:
+        vikter = np.ones(len(indices))
+    return sparse.csr_matrix((vikter, indices, indptr), shape=(n, n))
+
+
+def lägg_till_grannsnitt(gdf, indikator="Effektivitet", method="knn", k=4, distance_threshold=50000, avståndsviktning=False, koordinater=None, kontiguitet=None):
     if not isinstance(gdf, gpd.GeoDataFrame):
         raise TypeError("Förväntar GeoDataFrame som input")
     if gdf.crs is None:
         raise ValueError("GeoDataFrame saknar CRS – projicera innan du räknar avstånd")
 
+    mätning = Mätning("lägg_till_grannsnitt")
     gdf = gdf.copy()
-    gdf["centroid"] = gdf.geometry.centroid
-    värden = gdf[indikator].values
-
-    if method == "knn":
-        w = KNN.from_dataframe(gdf.set_geometry("centroid"), k=k)
-        dists = w.full()[1]
-    elif method == "distanceband":
-        w = DistanceBand.from_dataframe(
-            gdf.set_geometry("centroid"),
-            threshold=distance_threshold,
-            silence_warnings=True,
-            binary=not avståndsviktning
-        )
-        dists = w.full()[1]
-    else:
-        raise ValueError("Ogiltig metod. Välj 'knn' eller 'distanceband'.")
+    värden = gdf[indikator].to_numpy(dtype=float)
+    if koordinater is None:
+        with mätning.steg("centroider"):
+            koordinater = centroid_koordinater(gdf)
+    if method in KONTIGUITET and kontiguitet is None:
+        with mätning.steg("kontiguitet"):
+            kontiguitet = kontiguitetsgrannar(gdf.geometry.values, method)
 
-    if avståndsviktning:
-        weights = 1 / np.maximum(dists, 1)  # undvik delning med 0
-        weighted_vals = w.sparse.multiply(weights) @ värden
-        norm = w.sparse.multiply(weights).sum(axis=1).A1
-        grannsnitt = weighted_vals / norm
-    else:
-        card = np.array(list(w.cardinalities.values()))
-        grannsnitt = (w.sparse @ värden) / card
+    with mätning.steg(f"grannvikter ({method})"):
+        w = grannvikter(koordinater, method, k, distance_threshold, avståndsviktning, kontiguitet)
+    with mätning.steg("grannsnitt"):
+        norm = np.asarray(w.sum(axis=1)).ravel()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grannsnitt = (w @ värden) / norm
 
     gdf["grannsnitt"] = grannsnitt
     gdf["eff_gap"] = gdf[indikator] - gdf["grannsnitt"]
-    gdf = gdf.drop(columns=["centroid"])
+    gdf.attrs["prestanda"] = mätning.avsluta().som_dict()
 
     return gdf
+
+
+# === Rumslig autokorrelation: global Moran's I och LISA ===
+# Inferens via (villkorliga) permutationer. Globala permutationer räknas som en
+# gles matrisprodukt W @ Z över en hel permutationsmatris Z (n × P) åt gången.
+# LISA använder villkorlig permutation: för varje område dras grannvärdena
+# slumpmässigt bland övriga områden. Dragningarna delas mellan områdena (som i
+# PySAL/esda) och beräknas blockvis, fördelat på trådar.
+
+KVADRANTER = {1: "HH", 2: "LH", 3: "LL", 4: "HL"}
+
+
+def _radstandardisera(w):
+    radsumma = np.asarray(w.sum(axis=1)).ravel()
+    skala = np.divide(1.0, radsumma, out=np.zeros_like(radsumma), where=radsumma > 0)
+    return sparse.diags(skala) @ w
+
+
+def _p_sim(observerat, simulerat, permutationer):
+    större = (simulerat >= observerat[..., None]).sum(axis=-1)
+    större = np.minimum(större, permutationer - större)
+    return (större + 1.0) / (permutationer + 1.0)
+
+
+def _antal_trådar(n_jobs):
+    import os
+    return n_jobs or min(8, os.cpu_count() or 1)
+
+
+def morans_i(värden, w, permutationer=999, seed=None, n_jobs=None, blockstorlek=100):
+    """
+    Global Moran's I för värden med radstandardiserade vikter w (gles n × n).
+
+    Returnerar dict med I, förväntat värde EI, permutations-p (p_sim) och z_sim.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    y = np.asarray(värden, dtype=float)
+    w = _radstandardisera(sparse.csr_matrix(w))
+    n = len(y)
+    z = y - y.mean()
+    z2 = z @ z
+    s0 = w.sum()
+    I = n / s0 * (z @ (w @ z)) / z2
+
+    rng = np.random.default_rng(seed)
+    frön = rng.integers(0, 2**63 - 1, size=-(-permutationer // blockstorlek))
+
+    def block(b):
+        p = min(blockstorlek, permutationer - b * blockstorlek)
+        Z = np.random.default_rng(frön[b]).permuted(np.repeat(z[:, None], p, axis=1), axis=0)
+        return n / s0 * np.einsum("ij,ij->j", Z, w @ Z) / z2
+
+    with ThreadPoolExecutor(max_workers=_antal_trådar(n_jobs)) as pool:
+        simulerat = np.concatenate(list(pool.map(block, range(len(frön)))))
+
+    return {
+        "I": float(I),
+        "EI": -1.0 / (n - 1),
+        "p_sim": float(_p_sim(np.array(I), simulerat, permutationer)),
+        "z_sim": float((I - simulerat.mean()) / simulerat.std()),
+        "permutationer": permutationer,
+    }
+
+
+def lisa(värden, w, permutationer=999, seed=None, n_jobs=None, signifikans=0.05, max_element=8_000_000):
+    """
+    Lokal Moran (LISA) med villkorliga permutations-p-värden.
+
+    Returnerar DataFrame med Ii, p_sim, kvadrant (HH/LH/LL/HL) och signifikant.
+    """
+    import pandas as pd
+    from concurrent.futures import ThreadPoolExecutor
+
+    y = np.asarray(värden, dtype=float)
+    w = _radstandardisera(sparse.csr_matrix(w))
+    n = len(y)
+    z = y - y.mean()
+    justering = (n - 1) / (z @ z)
+    lag = w @ z
+    Ii = justering * z * lag
+
+    # Grannvikterna per rad utfyllda till lika längd (k_max)
+    antal = np.diff(w.indptr)
+    k_max = max(int(antal.max()), 1)
+    vikter = np.zeros((n, k_max))
+    rader = np.repeat(np.arange(n), antal)
+    kolumn = np.arange(w.nnz) - np.repeat(w.indptr[:-1], antal)
+    vikter[rader, kolumn] = w.data
+
+    # Slumpade index bland de n - 1 övriga områdena, delade mellan alla områden
+    rng = np.random.default_rng(seed)
+    rids = np.array([rng.choice(n - 1, size=min(k_max, n - 1), replace=False) for _ in range(permutationer)])
+
+    block = max(1, max_element // (permutationer * k_max))
+
+    def kör(start):
+        i = np.arange(start, min(start + block, n))
+        # Index ≥ i flyttas ett steg så att området självt aldrig dras
+        kandidater = rids[None, :, :] + (rids[None, :, :] >= i[:, None, None])
+        lag_sim = np.einsum("bpk,bk->bp", z[kandidater], vikter[i, : rids.shape[1]])
+        return justering * z[i, None] * lag_sim
+
+    with ThreadPoolExecutor(max_workers=_antal_trådar(n_jobs)) as pool:
+        simulerat = np.vstack(list(pool.map(kör, range(0, n, block))))
+
+    p = _p_sim(Ii, simulerat, permutationer)
+    kvadrant = np.where(z > 0, np.where(lag > 0, 1, 4), np.where(lag > 0, 2, 3))
+    return pd.DataFrame({
+        "Ii": Ii,
+        "p_sim": p,
+        "kvadrant": pd.Series(kvadrant).map(KVADRANTER).to_numpy(),
+        "signifikant": p <= signifikans,
+    })
+
+
+def lägg_till_lisa(gdf, indikator="Effektivitet", method="knn", k=4, distance_threshold=50000, avståndsviktning=False, koordinater=None, permutationer=999, seed=None, kontiguitet=None):
+    """
+    Global Moran's I och LISA för indikatorn med samma grannvikter som lägg_till_grannsnitt.
+
+    Rader utan värde utesluts. Returnerar (GeoDataFrame med LISA-kolumner, dict med global Moran's I).
+    """
+    if koordinater is None:
+        koordinater = centroid_koordinater(gdf)
+    värden = gdf[indikator].to_numpy(dtype=float)
+    giltiga = np.isfinite(värden)
+
+    if method in KONTIGUITET:
+        # Kontiguitet är given för alla rader – plocka ut delmatrisen för de giltiga
+        if kontiguitet is None:
+            kontiguitet = kontiguitetsgrannar(gdf.geometry.values, method)
+        w = grannvikter(koordinater, method, avståndsviktning=avståndsviktning, kontiguitet=kontiguitet)
+        w = w[giltiga][:, giltiga].tocsr()
+    else:
+        w = grannvikter(np.asarray(koordinater)[giltiga], method, k, distance_threshold, avståndsviktning)
+    globalt = morans_i(värden[giltiga], w, permutationer=permutationer, seed=seed)
+    lokalt = lisa(värden[giltiga], w, permutationer=permutationer, seed=seed)
+
+    gdf = gdf[giltiga].copy()
+    for kolumn in lokalt.columns:
+        gdf[kolumn] = lokalt[kolumn].to_numpy()
+    return gdf, globalt
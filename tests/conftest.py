@@ -0,0 +1,79 @@
+# tests/conftest.py
+
+"""
+Gemensamma fixturer. Testerna körs från repots rot:
+
+    python -m pytest -q
+
+Körningar skrivs till en temporär run store (RUNS_DIR är relativ, så arbets-
+katalogen byts för varje test som använder run_store).
+"""
+
+import os
+
+import pytest
+
+ROT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATAFIL = os.path.join(ROT, "data", "Data_modeller.xlsx")
+
+
+@pytest.fixture
+def run_store(tmp_path, monkeypatch):
+    """Tom run store i en temporär katalog."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "runs"
+
+
+@pytest.fixture(scope="session")
+def nätdata():
+    """Företagsdata ur data/Data_modeller.xlsx (riktiga skalor: MWh kring 1e5–1e7)."""
+    from app.data_loader import load_data
+
+    return load_data(DATAFIL)
+
+
+@pytest.fixture(scope="session")
+def dea_körning(nätdata, tmp_path_factory):
+    """(katalog, run_id, resultat) för en DEA-körning (CRS) i en egen run store."""
+    from app.dea_model import run_dea_model
+    from app.run_logger import wait_for_run
+
+    katalog = tmp_path_factory.mktemp("dea")
+    tidigare = os.getcwd()
+    os.chdir(katalog)
+    try:
+        resultat = run_dea_model(nätdata, rts="crs")
+        wait_for_run(resultat.attrs["run_id"])
+    finally:
+        os.chdir(tidigare)
+    return katalog, resultat.attrs["run_id"], resultat
+
+
+@pytest.fixture
+def shapefil(tmp_path):
+    """Liten shapefil: 4 × 4 rutor à 10 km (SWEREF99 TM) med Redovisnin som i Ei:s fil."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rutor, redovisning = [], []
+    for rad in range(4):
+        for kol in range(4):
+            k = rad * 4 + kol
+            x, y = 500_000 + kol * 10_000, 6_500_000 + rad * 10_000
+            rutor.append(box(x, y, x + 10_000, y + 10_000))
+            # Varannan ruta redovisas av två REId, som "R1, R2" i originalfilen
+            redovisning.append(f"R{k}" if k % 2 else f"R{k}, R{k + 1}")
+    # Samma polygon på två rader (ska bli en unik polygon i lagret)
+    rutor.append(rutor[0])
+    redovisning.append("R99")
+
+    sökväg = tmp_path / "områden.shp"
+    gpd.GeoDataFrame({"Redovisnin": redovisning}, geometry=rutor, crs="EPSG:3006").to_file(sökväg)
+    return str(sökväg)
+
+
+@pytest.fixture
+def geometrilager(shapefil, tmp_path):
+    from app.geometry_store import build_geometry_store
+
+    return build_geometry_store(shapefil, str(tmp_path / "geometri"))
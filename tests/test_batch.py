@@ -0,0 +1,45 @@
+# tests/test_batch.py
+
+import pytest
+
+from app.batch import FEL_SPECIFIKATION, SpecifikationsFel, läs_specifikation, main, sammanfattning
+
+
+@pytest.mark.parametrize("innehåll", [
+    "körningar:\n  - DEA\n",                                   # post som inte är en mappning
+    "körningar:\n  - [DEA]\n",
+    "- modell: DEA\n",                                          # lista i stället för mappning
+    "körningar:\n  - modell: DEA\n    parametrar: [crs]\n",    # parametrar som lista
+    "körningar:\n  - modell: XYZ\n",
+    "körningar:\n  - modell: DEA\n    parametrar:\n      okänd: 1\n",
+    "körningar: []\n",
+])
+def test_ogiltig_specifikation_ger_kod_2(tmp_path, innehåll, capsys):
+    spec = tmp_path / "spec.yaml"
+    spec.write_text(innehåll)
+    with pytest.raises(SpecifikationsFel):
+        läs_specifikation(str(spec))
+    assert main([str(spec), "--data", str(tmp_path / "saknas.xlsx")]) == FEL_SPECIFIKATION
+    assert "Fel:" in capsys.readouterr().err
+
+
+def test_namn_och_parametrar_fylls_i(tmp_path):
+    spec = tmp_path / "spec.yaml"
+    spec.write_text("körningar:\n  - modell: DEA\n  - modell: DEA\n    namn: 7\n    parametrar:\n      rts: vrs\n")
+    körningar = läs_specifikation(str(spec))["körningar"]
+    assert [k["namn"] for k in körningar] == ["dea_1", "7"]
+    assert körningar[0]["parametrar"] == {} and körningar[1]["parametrar"] == {"rts": "vrs"}
+
+
+def test_sammanfattningens_kolumner_är_rakt_under_varandra():
+    utfall = [
+        {"namn": "dea_crs", "modell": "DEA", "status": "ok", "sekunder": 1.25, "run_id": "dea_x"},
+        {"namn": "order_m", "modell": "PartiellFront", "status": "ok", "sekunder": 0.5, "run_id": "partiellfront_y"},
+        {"namn": "sfa", "modell": "SFA", "status": "fel", "sekunder": 12.0},
+    ]
+    rader = sammanfattning(utfall, 13.0).splitlines()[:4]
+    # Status- och run_id-kolumnerna börjar på samma position på alla rader
+    status = rader[0].index("Status")
+    assert [r[status:status + 4].strip() for r in rader[1:]] == ["ok", "ok", "fel"]
+    run_id = rader[0].index("run_id")
+    assert [r[run_id:] for r in rader[1:]] == ["dea_x", "partiellfront_y", "–"]
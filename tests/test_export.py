@@ -0,0 +1,58 @@
+# tests/test_export.py
+
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app.export import export_run, to_xlsx
+from app.run_logger import save_run
+
+
+def _läs_xlsx(data, blad):
+    openpyxl = pytest.importorskip("openpyxl")
+    ark = openpyxl.load_workbook(io.BytesIO(data), read_only=True)[blad]
+    return [list(rad) for rad in ark.iter_rows(values_only=True)]
+
+
+def test_inf_skrivs_som_text():
+    """VRS-supereffektivitet kan vara inf (t.ex. i scenariorutnätet och peer-analysen)."""
+    df = pd.DataFrame({
+        "Företag": ["A", "B", "C", "D"],
+        "Supereffektivitet": [1.2, np.inf, -np.inf, np.nan],
+        "float32": np.array([np.inf, 1.5, np.nan, 2.0], dtype=np.float32),
+    })
+    rader = _läs_xlsx(to_xlsx({"Scenarier": df}), "Scenarier")
+
+    assert rader[0] == ["Företag", "Supereffektivitet", "float32"]
+    assert rader[1:] == [
+        ["A", 1.2, "inf"],
+        ["B", "inf", 1.5],
+        ["C", "-inf", None],
+        ["D", None, 2.0],
+    ]
+
+
+def test_arrow_tabell_med_inf_och_outliers():
+    tabell = pa.table({
+        "Effektivitet": [0.9, None, 1.0],
+        "Supereffektivitet": [0.9, None, float("inf")],
+        "Ränta": [float("nan"), 1.0, 2.0],
+    })
+    rader = _läs_xlsx(to_xlsx({"Resultat": tabell}, outlier_kolumner=["Effektivitet", "Supereffektivitet"]), "Resultat")
+
+    assert rader[1:] == [
+        [0.9, 0.9, None],
+        ["OUTLIER", "OUTLIER", 1.0],
+        [1.0, "inf", 2.0],
+    ]
+
+
+def test_körning_med_inf_exporteras(run_store):
+    df = pd.DataFrame({"Företag": ["A", "B"], "Supereffektivitet": [np.inf, 0.8]})
+    run_id = save_run("DEA", {}, df, vänta=True)
+
+    rader = _läs_xlsx(export_run(run_id, "xlsx"), "Resultat")
+    assert [rad[1] for rad in rader[1:]] == ["inf", 0.8]
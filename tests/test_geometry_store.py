@@ -0,0 +1,78 @@
+# tests/test_geometry_store.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.geometry_store import (
+    build_geometry_store, load_geometry_store, load_geojson, polygon_means, row_values,
+)
+
+
+@pytest.fixture
+def resultat():
+    """Effektivitet per REId; R3 saknas, R5 har ett saknat värde och R7 finns två gånger."""
+    rng = np.random.default_rng(0)
+    reid = [f"R{k}" for k in range(18) if k != 3] + ["R7", "R99"]
+    df = pd.DataFrame({"REId": reid, "Effektivitet": rng.uniform(0.5, 1.0, len(reid))})
+    df.loc[df["REId"] == "R5", "Effektivitet"] = np.nan
+    return df
+
+
+def test_lagret_delar_upp_redovisning(geometrilager):
+    assert len(geometrilager.polygoner) == 16
+    assert {"R0", "R1", "R15", "R99"} <= set(geometrilager.reid["REId"])
+    # Samma polygon för R0 och R99
+    rad = geometrilager.reid.set_index("REId")["geom_id"]
+    assert rad["R0"] == rad["R99"]
+
+
+def test_polygon_means_som_merge_och_groupby(geometrilager, resultat):
+    """Samma värden som den tidigare merge på REId följt av groupby("geom_id").mean()."""
+    gammal = (
+        geometrilager.exploded()
+        .merge(resultat, on="REId", how="left")
+        .groupby("geom_id")["Effektivitet"].mean()
+        .reindex(geometrilager.polygoner["geom_id"])
+        .to_numpy()
+    )
+    np.testing.assert_allclose(polygon_means(geometrilager, resultat, "Effektivitet"), gammal, equal_nan=True)
+
+
+def test_row_values_som_merge(geometrilager, resultat):
+    per_reid = resultat.groupby("REId")["Effektivitet"].mean()
+    förväntat = per_reid.reindex(geometrilager.reid["REId"]).to_numpy()
+    np.testing.assert_allclose(row_values(geometrilager, resultat, "Effektivitet"), förväntat, equal_nan=True)
+
+
+def test_geojson_bär_bara_geom_id(geometrilager):
+    import json
+
+    data = json.loads(load_geojson(geometrilager, "låg"))
+    assert len(data["features"]) == 16
+    assert all(list(f["properties"]) == ["geom_id"] for f in data["features"])
+    with pytest.raises(ValueError):
+        load_geojson(geometrilager, "extrem")
+
+
+def test_samtidiga_byggen(shapefil, tmp_path):
+    store_dir = str(tmp_path / "data" / "geometri")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        lager = list(pool.map(lambda _: build_geometry_store(shapefil, store_dir), range(4)))
+    assert all(len(l.polygoner) == 16 for l in lager)
+    assert os.listdir(tmp_path / "data") == ["geometri"]
+    assert len(load_geometry_store(store_dir, shapefil).polygoner) == 16
+
+
+def test_byggs_om_när_källan_ändras(shapefil, tmp_path):
+    import geopandas as gpd
+
+    store_dir = str(tmp_path / "geometri")
+    före = load_geometry_store(store_dir, shapefil)
+    gdf = gpd.read_file(shapefil)
+    gpd.GeoDataFrame(gdf.iloc[:-2], crs=gdf.crs).to_file(shapefil)
+    efter = load_geometry_store(store_dir, shapefil)
+    assert len(före.polygoner) == 16 and len(efter.polygoner) == 15
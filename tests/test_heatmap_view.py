@@ -0,0 +1,107 @@
+# tests/test_heatmap_view.py
+
+import json
+
+import pytest
+
+heatmap_view = pytest.importorskip("heatmap_view")
+
+
+@pytest.fixture
+def lager_i_tmp(shapefil, tmp_path, monkeypatch):
+    """Geometrilagret och källfilen pekar på den syntetiska shapefilen."""
+    import app.geometry_store as gs
+
+    monkeypatch.setattr(gs, "SHP_PATH", shapefil)
+    monkeypatch.setattr(gs, "STORE_DIR", str(tmp_path / "geometri"))
+    return shapefil
+
+
+def _ta_bort_två_rutor(shapefil):
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shapefil)
+    gpd.GeoDataFrame(gdf.iloc[:-2], crs=gdf.crs).to_file(shapefil)
+
+
+def test_cacher_följer_ombyggt_lager(lager_i_tmp):
+    före = json.loads(heatmap_view.load_simplified_geojson("låg"))
+    assert heatmap_view.load_simplified_geojson("låg") is heatmap_view.load_simplified_geojson("låg")
+    karta_före = heatmap_view._static_map(heatmap_view._lagernyckel())
+    koordinater_före = heatmap_view.grann_koordinater()
+
+    _ta_bort_två_rutor(lager_i_tmp)
+
+    efter = json.loads(heatmap_view.load_simplified_geojson("låg"))
+    assert len(före["features"]) == 16 and len(efter["features"]) == 15
+    karta_efter = heatmap_view._static_map(heatmap_view._lagernyckel())
+    assert len(karta_före.collection.get_paths()) == 16
+    assert len(karta_efter.collection.get_paths()) == 15
+    assert len(heatmap_view.grann_koordinater()) == len(koordinater_före) - 2
+
+
+def test_klassgränser_täcker_alla_värden(lager_i_tmp):
+    """Effektivitet under 0.6 och supereffektivitet över 1 (och inf) ska gå att rita som choropleth."""
+    import folium
+    import numpy as np
+    import pandas as pd
+
+    värden = pd.DataFrame({"geom_id": np.arange(16), "Supereffektivitet": np.linspace(0.3, 1.4, 16)})
+    värden.loc[3, "Supereffektivitet"] = np.nan
+    värden.loc[4, "Supereffektivitet"] = np.inf
+
+    gränser = heatmap_view._klassgränser(värden["Supereffektivitet"])
+    assert gränser == [0.3, 0.7, 0.8, 0.9, 1.4]
+    assert heatmap_view._klassgränser([0.7, 0.95, np.nan]) == heatmap_view.KLASSGRÄNSER
+
+    värden["Supereffektivitet"] = värden["Supereffektivitet"].where(np.isfinite(värden["Supereffektivitet"]))
+    folium.Choropleth(
+        geo_data=heatmap_view.load_simplified_geojson("låg"),
+        data=värden,
+        columns=["geom_id", "Supereffektivitet"],
+        key_on="feature.properties.geom_id",
+        threshold_scale=gränser,
+    )
+    with pytest.raises(ValueError):
+        folium.Choropleth(
+            geo_data=heatmap_view.load_simplified_geojson("låg"),
+            data=värden,
+            columns=["geom_id", "Supereffektivitet"],
+            key_on="feature.properties.geom_id",
+            threshold_scale=heatmap_view.KLASSGRÄNSER,
+        )
+    lager, skala = heatmap_view._vector_tile_layer(värden, "Supereffektivitet", gränser)
+    assert list(skala.index) == gränser
+
+
+def test_kontiguitet_följer_ombyggt_lager(lager_i_tmp):
+    """Lagret byggs om i samma katalog – grannarna ska gälla de nya polygonerna."""
+    import numpy as np
+    from spatial_analysis import hämta_kontiguitet, kontiguitetsgrannar
+
+    def par(kontiguitet):
+        indptr, indices = kontiguitet
+        return set(zip(np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)).tolist(), indices.tolist()))
+
+    def förväntat(store):
+        polygonpar = par(kontiguitetsgrannar(store.polygoner.geometry.values, "queen"))
+        poly = store.poly_idx.tolist()
+        # Rader på grannpolygoner eller på samma polygon (men inte raden själv)
+        return {
+            (i, j) for i in range(len(poly)) for j in range(len(poly))
+            if i != j and (poly[i] == poly[j] or (poly[i], poly[j]) in polygonpar)
+        }
+
+    store_före = heatmap_view.load_store()
+    före = heatmap_view.grann_kontiguitet("queen")
+    assert len(före[0]) - 1 == len(store_före.reid)
+    assert par(före) == förväntat(store_före)
+
+    _ta_bort_två_rutor(lager_i_tmp)
+
+    store_efter = heatmap_view.load_store()
+    assert store_efter.katalog == store_före.katalog
+    efter = heatmap_view.grann_kontiguitet("queen")
+    assert len(efter[0]) - 1 == len(store_efter.reid) < len(store_före.reid)
+    assert par(efter) == förväntat(store_efter)
+    assert par(hämta_kontiguitet(store_efter, "queen")) == par(efter)
@@ -0,0 +1,26 @@
+# tests/test_import_profile.py
+
+import ast
+
+from app.import_profile import SIDA, sidans_importer
+
+
+def _modellval(sida):
+    """Alternativen i sidans selectbox "Välj modell"."""
+    with open(sida, encoding="utf-8") as f:
+        for nod in ast.walk(ast.parse(f.read())):
+            if isinstance(nod, ast.Call) and nod.args and getattr(nod.args[0], "value", None) == "Välj modell":
+                return [e.value for e in nod.args[1].elts]
+
+
+def test_basen_är_sidans_toppnivåimporter():
+    bas, _ = sidans_importer()
+    assert {"streamlit", "app.shared_cache", "app.tables", "app.export", "app.instrumentation"} <= set(bas)
+
+
+def test_alla_vyer_på_sidan_mäts():
+    _, vyer = sidans_importer()
+    assert set(_modellval(SIDA)) <= set(vyer)
+    assert "Kapitalbas" in vyer
+    assert vyer["Peer-analys (DEA)"] == ["app.peer_influence"]
+    assert {"heatmap_view", "spatial_analysis"} <= set(vyer["Geografisk karta"])
@@ -0,0 +1,148 @@
+# tests/test_kapitalbas.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.kapitalbas import kapitalkostnad, run_kapitalbas
+
+
+def _annuitet_för_hand(nuak, ålder, livslängd, r):
+    """Annuiteten och nuvärdet av de återstående (hela) annuiteterna, år för år."""
+    annuitet = nuak * r / (1 - (1 + r) ** -livslängd)
+    kvar = max(livslängd - ålder, 0)
+    kapitalbas = sum(annuitet / (1 + r) ** t for t in range(1, kvar + 1))
+    return annuitet, kapitalbas
+
+
+@pytest.mark.parametrize("ålder", [0, 1, 7, 19])
+def test_annuitet_som_sluten_form(ålder):
+    nuak, livslängd, r = 1_000_000.0, 20, 0.0453
+    annuitet, förväntad_bas = _annuitet_för_hand(nuak, ålder, livslängd, r)
+
+    kapitalbas, avskrivning, avkastning = kapitalkostnad([nuak], [ålder], [livslängd], r, "annuitet")
+
+    assert kapitalbas[0] == pytest.approx(förväntad_bas, rel=1e-12)
+    assert avkastning[0] == pytest.approx(r * förväntad_bas, rel=1e-12)
+    # Avskrivning + avkastning = annuiteten så länge komponenten har minst ett år kvar
+    assert avskrivning[0] + avkastning[0] == pytest.approx(annuitet, rel=1e-12)
+
+
+def test_ny_komponent_har_hela_nuak_som_kapitalbas():
+    kapitalbas, _, _ = kapitalkostnad([500.0, 800.0], [0, 0], [10, 40], 0.05, "annuitet")
+    np.testing.assert_allclose(kapitalbas, [500.0, 800.0], rtol=1e-12)
+
+
+def test_linjär():
+    nuak = np.array([1000.0, 2000.0, 3000.0])
+    ålder = np.array([0.0, 5.0, 30.0])
+    livslängd = np.array([10.0, 20.0, 40.0])
+    r = 0.03
+
+    kapitalbas, avskrivning, avkastning = kapitalkostnad(nuak, ålder, livslängd, r, "linjär")
+
+    np.testing.assert_allclose(kapitalbas, [1000.0, 1500.0, 750.0])
+    np.testing.assert_allclose(avskrivning, [100.0, 100.0, 75.0])
+    np.testing.assert_allclose(avkastning, r * kapitalbas)
+
+
+def test_ränta_noll_ger_linjär():
+    rng = np.random.default_rng(0)
+    nuak = rng.uniform(1e3, 1e6, 50)
+    livslängd = rng.integers(5, 50, 50).astype(float)
+    ålder = rng.uniform(0, 60, 50)
+
+    annuitet = kapitalkostnad(nuak, ålder, livslängd, 0.0, "annuitet")
+    linjär = kapitalkostnad(nuak, ålder, livslängd, 0.0, "linjär")
+    for a, b in zip(annuitet, linjär):
+        np.testing.assert_array_equal(a, b)
+    assert np.all(annuitet[2] == 0)
+    # Liten ränta: annuiteten närmar sig den linjära
+    nära = kapitalkostnad(nuak, ålder, livslängd, 1e-9, "annuitet")
+    np.testing.assert_allclose(nära[0], linjär[0], rtol=1e-6)
+
+
+@pytest.mark.parametrize("metod", ["annuitet", "linjär"])
+def test_fullt_avskriven_och_mindre_än_ett_år_kvar(metod):
+    # kvar = 0 (ålder = livslängd), ålder > livslängd och ett halvår kvar
+    nuak = np.array([1000.0, 1000.0, 1000.0])
+    ålder = np.array([10.0, 15.0, 9.5])
+    livslängd = np.array([10.0, 10.0, 10.0])
+
+    kapitalbas, avskrivning, avkastning = kapitalkostnad(nuak, ålder, livslängd, 0.05, metod)
+
+    np.testing.assert_array_equal(kapitalbas[:2], 0)
+    np.testing.assert_array_equal(avskrivning[:2], 0)
+    np.testing.assert_array_equal(avkastning[:2], 0)
+    # Avskrivningen begränsas till restvärdet
+    assert 0 < kapitalbas[2] < nuak[2] / livslängd[2]
+    assert avskrivning[2] == kapitalbas[2]
+
+
+def test_okänd_metod():
+    with pytest.raises(ValueError):
+        kapitalkostnad([1.0], [0.0], [10.0], 0.05, "degressiv")
+
+
+@pytest.fixture
+def register():
+    """R1: två giltiga komponenter och en utan livslängd; R2: en med livslängd 0; två rader utan REId."""
+    return pd.DataFrame({
+        "REId": pd.Categorical(["R1", "R1", "R1", "R2", "R2", None, None]),
+        "Normvärde": [100.0, 50.0, 10.0, 80.0, 20.0, 1.0, 1.0],
+        "Antal": [10.0, 4.0, 1.0, 1.0, 5.0, 1.0, 1.0],
+        "Prisindex": [1.1, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+        "Ålder": [5.0, 40.0, 1.0, 2.0, 3.0, 1.0, 1.0],
+        "Livslängd": [20.0, 40.0, np.nan, 0.0, 10.0, 10.0, 10.0],
+    })
+
+
+def test_run_kapitalbas_per_reid(register):
+    r = 0.04
+    resultat = run_kapitalbas(register, "linjär", r, använd_prisindex=True, spara=False)
+    per_reid = resultat.set_index("REId", drop=False)
+
+    r1 = per_reid.loc["R1"]
+    assert r1["Antal komponenter"] == 2 and r1["Ogiltiga rader"] == 1
+    assert r1["NUAK"] == pytest.approx(1100.0 + 200.0)
+    assert r1["Kapitalbas"] == pytest.approx(1100.0 * 15 / 20)  # 200 är fullt avskriven
+    assert r1["Avskrivning"] == pytest.approx(1100.0 / 20)
+    assert r1["Kapitalkostnad"] == pytest.approx(1100.0 / 20 + r * 1100.0 * 15 / 20)
+    assert r1["Andel fullt avskrivet"] == pytest.approx(200.0 / 1300.0)
+    assert r1["Medelålder"] == pytest.approx((5 * 1100 + 40 * 200) / 1300)
+
+    r2 = per_reid.loc["R2"]
+    assert r2["Antal komponenter"] == 1 and r2["Ogiltiga rader"] == 1
+    assert r2["Kapitalbas"] == pytest.approx(100.0 * 7 / 10)
+
+
+def test_rader_utan_reid_räknas_som_ogiltiga(register):
+    resultat = run_kapitalbas(register, "annuitet", 0.05, spara=False)
+
+    assert resultat["Ogiltiga rader"].sum() == 4
+    utan = resultat[resultat["REId"].isna()]
+    assert len(utan) == 1
+    assert utan["Ogiltiga rader"].item() == 2
+    assert utan["Antal komponenter"].item() == 0 and utan["Kapitalkostnad"].item() == 0
+
+    # Utan sådana rader finns ingen extra rad
+    utan_saknade = run_kapitalbas(register.dropna(subset=["REId"]), "annuitet", 0.05, spara=False)
+    assert utan_saknade["REId"].notna().all()
+    assert len(utan_saknade) == resultat["REId"].notna().sum()
+
+
+def test_utan_prisindex(register):
+    med = run_kapitalbas(register, "linjär", 0.04, använd_prisindex=True, spara=False)
+    utan = run_kapitalbas(register, "linjär", 0.04, använd_prisindex=False, spara=False)
+    assert med.loc[med["REId"] == "R1", "NUAK"].item() == pytest.approx(1300.0)
+    assert utan.loc[utan["REId"] == "R1", "NUAK"].item() == pytest.approx(1200.0)
+
+
+def test_körningen_sparas(register, run_store):
+    from app.run_logger import load_run_table, wait_for_run
+
+    resultat = run_kapitalbas(register, "annuitet", 0.05)
+    run_id = resultat.attrs["run_id"]
+    assert wait_for_run(run_id)
+    sparad = load_run_table(run_id).to_pandas()
+    pd.testing.assert_frame_equal(sparad, resultat.reset_index(drop=True), check_dtype=False)
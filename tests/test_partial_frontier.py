@@ -0,0 +1,108 @@
+# tests/test_partial_frontier.py
+
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.partial_frontier import order_alpha, order_m, run_partial_frontier_model
+
+
+@pytest.fixture
+def data():
+    """40 företag, två inputs och två outputs."""
+    rng = np.random.default_rng(4)
+    X = rng.uniform(1, 10, (40, 2))
+    Y = rng.uniform(1, 10, (40, 2))
+    return X, Y
+
+
+def _dominerande_kvoter(X, Y, o):
+    """r_oj = max_k x_jk / x_ok för alla j med y_j ≥ y_o, räknat företag för företag."""
+    return np.array([
+        max(X[j, k] / X[o, k] for k in range(X.shape[1]))
+        for j in range(len(X))
+        if all(Y[j] >= Y[o])
+    ])
+
+
+def _fdh(X, Y):
+    return np.array([_dominerande_kvoter(X, Y, o).min() for o in range(len(X))])
+
+
+def test_order_m_som_monte_carlo(data):
+    """Väntevärdet i sluten form mot medelvärdet av min över m dragningar med återläggning."""
+    X, Y = data
+    m, dragningar = 5, 20000
+    rng = np.random.default_rng(5)
+    theta = order_m(X, Y, m)
+    for o in range(len(X)):
+        r = _dominerande_kvoter(X, Y, o)
+        minima = r[rng.integers(0, len(r), (dragningar, m))].min(axis=1)
+        medelfel = minima.std() / np.sqrt(dragningar)
+        assert abs(theta[o] - minima.mean()) <= 4 * medelfel + 1e-12
+
+
+def test_order_m_med_m_1_är_medelkvoten(data):
+    X, Y = data
+    förväntat = [_dominerande_kvoter(X, Y, o).mean() for o in range(len(X))]
+    np.testing.assert_allclose(order_m(X, Y, 1), förväntat, rtol=1e-12)
+
+
+@pytest.mark.parametrize("alpha", [0.5, 0.8, 0.9, 0.95, 0.99])
+def test_order_alpha_som_kvantil(data, alpha):
+    """θ_α = minsta r där andelen dominerande med kvot ≤ r överstiger 1 − α (exakt aritmetik)."""
+    X, Y = data
+    gräns = 1 - Fraction(str(alpha))
+    förväntat = []
+    for o in range(len(X)):
+        r = np.sort(_dominerande_kvoter(X, Y, o))
+        förväntat.append(next(v for v in r if Fraction(int((r <= v).sum()), len(r)) > gräns))
+    np.testing.assert_array_equal(order_alpha(X, Y, alpha), förväntat)
+
+
+def test_gränsfallen_ger_fdh(data):
+    X, Y = data
+    fdh = _fdh(X, Y)
+    assert np.all(fdh <= 1)
+    np.testing.assert_array_equal(order_alpha(X, Y, 1.0), fdh)
+    np.testing.assert_allclose(order_m(X, Y, 5000), fdh, rtol=1e-9)
+
+
+def test_partiell_front_ligger_över_fdh(data):
+    X, Y = data
+    fdh = _fdh(X, Y)
+    assert np.all(order_m(X, Y, 10) >= fdh - 1e-12)
+    assert np.all(order_alpha(X, Y, 0.9) >= fdh)
+
+
+def test_blockvis_som_utan_block(data, monkeypatch):
+    import app.partial_frontier as pf
+
+    X, Y = data
+    hela_m, hela_alpha = order_m(X, Y, 10), order_alpha(X, Y, 0.9)
+    monkeypatch.setattr(pf, "_BLOCK", 7)
+    np.testing.assert_array_equal(order_m(X, Y, 10), hela_m)
+    np.testing.assert_array_equal(order_alpha(X, Y, 0.9), hela_alpha)
+
+
+def test_körning_utesluter_ogiltiga_rader(data, run_store):
+    from app.run_logger import load_run_table, wait_for_run
+
+    X, Y = data
+    df = pd.DataFrame(np.hstack([X, Y]), columns=["CAPEX", "OPEXp", "CU", "MW"])
+    df.loc[3, "CAPEX"] = 0
+    df.loc[7, "MW"] = np.nan
+    resultat = run_partial_frontier_model(df, "order-α", alpha=0.9, output_cols=["CU", "MW"])
+
+    assert resultat.loc[[3, 7], "Effektivitet"].isna().all()
+    giltig = ~resultat.index.isin([3, 7])
+    förväntat = order_alpha(X[giltig], Y[giltig], 0.9)
+    np.testing.assert_array_equal(resultat.loc[giltig, "Supereffektivitet"], förväntat)
+    np.testing.assert_array_equal(resultat.loc[giltig, "Effektivitet"], np.minimum(förväntat, 1))
+
+    run_id = resultat.attrs["run_id"]
+    assert wait_for_run(run_id)
+    sparad = load_run_table(run_id).to_pandas()
+    np.testing.assert_array_equal(sparad["Supereffektivitet"], resultat["Supereffektivitet"])
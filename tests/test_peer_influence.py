@@ -0,0 +1,56 @@
+# tests/test_peer_influence.py
+
+import numpy as np
+import pytest
+
+from app.dea_model import run_dea_model
+from app.peer_influence import run_peer_influence
+
+
+@pytest.fixture(scope="module")
+def påverkan(dea_körning):
+    katalog, run_id, _ = dea_körning
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(katalog)
+        return run_peer_influence(run_id, n_jobs=2)
+
+
+def test_före_matchar_körningen(påverkan, dea_körning):
+    """Utan borttagen peer ska omlösningen ge körningens supereffektivitet."""
+    _, _, körning = dea_körning
+    lagrad = körning["Supereffektivitet"].to_numpy(dtype=float)[påverkan.påverkan["rad"]]
+    np.testing.assert_allclose(påverkan.påverkan["Supereffektivitet före"], lagrad, atol=1e-6)
+
+
+def test_borttagen_peer_matchar_ny_dea_körning(påverkan, dea_körning, nätdata, run_store):
+    """En peer borttagen ur data och en full run_dea_model ger samma θ som analysen."""
+    _, _, körning = dea_körning
+    rangordning = påverkan.rangordning()
+    for peer in rangordning["peer_rad"]:
+        utan_peer = run_dea_model(nätdata.drop(index=nätdata.index[peer]), rts="crs")
+        kvar = np.delete(np.arange(len(körning)), peer)
+        # Jämförelsen förutsätter att outlierklassningen inte ändras av borttagningen
+        if np.array_equal(utan_peer["is_outlier"].to_numpy(), körning["is_outlier"].to_numpy()[kvar]):
+            break
+    else:
+        pytest.skip("Varje peer ändrar outlierklassningen")
+
+    ny = dict(zip(kvar, utan_peer["Supereffektivitet"].to_numpy(dtype=float)))
+    rader = påverkan.påverkan[påverkan.påverkan["peer_rad"] == peer]
+    assert len(rader) > 0
+    for i, efter in zip(rader["rad"], rader["Supereffektivitet efter"]):
+        assert efter == pytest.approx(ny[i], abs=1e-6)
+
+    # Företag som inte refererade till peern påverkas inte
+    orörda = [i for i in kvar if i not in set(rader["rad"]) and not körning["is_outlier"].iloc[i]]
+    gammal = körning["Supereffektivitet"].to_numpy(dtype=float)
+    np.testing.assert_allclose([ny[i] for i in orörda], gammal[orörda], atol=1e-6)
+
+
+def test_rangordning_och_matris(påverkan):
+    rangordning = påverkan.rangordning()
+    assert rangordning["Summa Δ Effektivitet"].is_monotonic_decreasing
+    assert rangordning["Antal refererande"].sum() == len(påverkan.påverkan)
+    matris = påverkan.influensmatris()
+    assert matris.notna().sum().sum() == len(påverkan.påverkan)
+    assert (påverkan.påverkan["Δ Effektivitet"] >= -1e-6).all()
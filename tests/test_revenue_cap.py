@@ -0,0 +1,154 @@
+# tests/test_revenue_cap.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.revenue_cap import project_revenue_cap
+from app.run_logger import save_run
+
+
+@pytest.fixture
+def körningar(run_store):
+    """
+    Två scenarier. R3 saknar Effkrav_proc i DEA (outlier) och saknas helt i
+    PyStoned; R4 finns bara i PyStoned.
+    """
+    dea = pd.DataFrame({
+        "REId": ["R1", "R2", "R3"],
+        "Företag": ["Ett", "Två", "Tre"],
+        "Effkrav_proc": [0.01, 0.02, np.nan],
+        "OPEXp": [100.0, 200.0, 300.0],
+        "CAPEX": [50.0, 80.0, 90.0],
+    })
+    pystoned = pd.DataFrame({
+        "REId": ["R4", "R1", "R2"],
+        "Företag": ["Fyra", "Ett", "Två"],
+        "Effkrav_proc": [0.05, 0.03, 0.0],
+        "OPEXp": [400.0, 100.0, 200.0],
+        "CAPEX": [10.0, 50.0, 80.0],
+    })
+    return [save_run("DEA", {}, dea, vänta=True), save_run("PyStoned", {}, pystoned, vänta=True)]
+
+
+def _värde(projektion, fält, scenario, reid, år):
+    s = projektion.scenarier.index(scenario)
+    f = list(projektion.reid).index(reid)
+    return getattr(projektion, fält)[s, f, år - 1]
+
+
+def test_opexp_räknat_för_hand(körningar):
+    dea, pystoned = körningar
+    p = project_revenue_cap(körningar, "OPEXp", startår=2024)
+
+    assert list(p.reid) == ["R1", "R2", "R3", "R4"]
+    assert list(p.företag) == ["Ett", "Två", "Tre", "Fyra"]
+    assert list(p.år) == [2024, 2025, 2026, 2027]
+    assert p.modeller == ["DEA", "PyStoned"]
+
+    # R1 i DEA: 100 · 0,99^2 = 98,01 efter två år; kapitalkostnaden 50 läggs till oförändrad
+    assert _värde(p, "påverkbar", dea, "R1", 2) == pytest.approx(98.01)
+    assert _värde(p, "krav_kr", dea, "R1", 2) == pytest.approx(1.99)
+    assert _värde(p, "intäktsram", dea, "R1", 2) == pytest.approx(148.01)
+    # R1 i PyStoned år 4: 100 · 0,97^4
+    assert _värde(p, "intäktsram", pystoned, "R1", 4) == pytest.approx(100 * 0.97**4 + 50)
+    # Inget krav: oförändrad intäktsram
+    assert _värde(p, "krav_kr", pystoned, "R2", 4) == 0
+    assert _värde(p, "intäktsram", pystoned, "R2", 4) == pytest.approx(280.0)
+
+
+def test_saknade_reid_ger_nan(körningar):
+    dea, pystoned = körningar
+    p = project_revenue_cap(körningar, "OPEXp")
+
+    for scenario, reid in [(dea, "R3"), (dea, "R4"), (pystoned, "R3")]:
+        for år in range(1, 5):
+            assert np.isnan(_värde(p, "krav_kr", scenario, reid, år))
+            assert np.isnan(_värde(p, "intäktsram", scenario, reid, år))
+
+    summa = p.periodsumma().set_index("REId")
+    assert summa.loc["R3"].drop("Företag").isna().all()
+    assert np.isnan(summa.loc["R4", dea])
+    assert summa.loc["R4", pystoned] == pytest.approx(sum(400 * (1 - 0.95**t) for t in range(1, 5)))
+
+
+def test_per_år_summerar_bara_företag_med_krav(körningar):
+    dea, pystoned = körningar
+    p = project_revenue_cap(körningar, "OPEXp")
+    per_år = p.per_år().set_index(["Scenario", "År"])
+
+    assert per_år.loc[(dea, 2024), "Antal företag"] == 2
+    assert per_år.loc[(pystoned, 2024), "Antal företag"] == 3
+    assert per_år.loc[(dea, 2024), "Effkrav (kr)"] == pytest.approx(100 * 0.01 + 200 * 0.02)
+    assert per_år.loc[(pystoned, 2024), "Intäktsram"] == pytest.approx(
+        400 * 0.95 + 10 + 100 * 0.97 + 50 + 200 + 80
+    )
+
+
+def test_totex_lägger_kravet_på_kapitalkostnaden(körningar):
+    dea, _ = körningar
+    p = project_revenue_cap(körningar, "TOTEX")
+
+    # R1 i DEA: (100 + 50) · 0,99^2 = 147,015, inget läggs till utanför kravet
+    assert _värde(p, "påverkbar", dea, "R1", 2) == pytest.approx(147.015)
+    assert _värde(p, "krav_kr", dea, "R1", 2) == pytest.approx(2.985)
+    assert _värde(p, "intäktsram", dea, "R1", 2) == pytest.approx(147.015)
+    assert np.all(p.kapital == 0)
+
+
+def test_kapitalbas_ersätter_capex(körningar):
+    dea, pystoned = körningar
+    kapitalbas = save_run("Kapitalbas", {}, pd.DataFrame({
+        "REId": ["R1", "R2", "R4", "R9"],
+        "Kapitalkostnad": [70.0, 20.0, 5.0, 1000.0],
+    }), vänta=True)
+    p = project_revenue_cap(körningar, "OPEXp", kapitalbas_run_id=kapitalbas)
+
+    assert _värde(p, "intäktsram", dea, "R1", 2) == pytest.approx(98.01 + 70)
+    assert _värde(p, "intäktsram", pystoned, "R4", 1) == pytest.approx(400 * 0.95 + 5)
+    # R9 finns bara i kapitalbasen och ingår inte
+    assert "R9" not in p.reid
+
+
+def test_lång_följer_arrayerna(körningar):
+    p = project_revenue_cap(körningar, "TOTEX")
+    lång = p.lång()
+
+    assert len(lång) == 2 * 4 * 4
+    np.testing.assert_array_equal(lång["Intäktsram"], p.intäktsram.ravel())
+    rad = lång[(lång["Scenario"] == körningar[1]) & (lång["REId"] == "R4") & (lång["År"] == 2026)]
+    assert rad["Effkrav (%)"].item() == pytest.approx(5.0)
+    assert rad["Intäktsram"].item() == pytest.approx(410 * 0.95**3)
+
+
+def test_ogiltiga_argument(körningar):
+    with pytest.raises(ValueError):
+        project_revenue_cap(körningar, "CAPEX")
+    with pytest.raises(ValueError):
+        project_revenue_cap([], "OPEXp")
+
+
+def test_för_företag_som_lång(körningar):
+    p = project_revenue_cap(körningar, "OPEXp")
+    lång = p.lång()
+    for reid in p.reid:
+        förväntat = lång[lång["REId"] == reid].drop(columns=["REId", "Företag"]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(p.för_företag(reid), förväntat)
+    with pytest.raises(KeyError):
+        p.för_företag("R9")
+
+
+def test_delad_projektion_räknas_en_gång(körningar, monkeypatch):
+    import app.revenue_cap as rc
+    from app.shared_cache import KÖRNINGAR, delad_projektion
+
+    anrop = []
+    original = rc.project_revenue_cap
+    monkeypatch.setattr(rc, "project_revenue_cap", lambda *a, **k: anrop.append(a) or original(*a, **k))
+    KÖRNINGAR.rensa()
+
+    första = delad_projektion(tuple(körningar), "TOTEX", None, 2024)
+    assert delad_projektion(tuple(körningar), "TOTEX", None, 2024) is första
+    assert delad_projektion(tuple(körningar), "OPEXp", None, 2024) is not första
+    assert len(anrop) == 2
+    np.testing.assert_array_equal(första.intäktsram, project_revenue_cap(körningar, "TOTEX").intäktsram)
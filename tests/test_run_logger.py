@@ -0,0 +1,82 @@
+# tests/test_run_logger.py
+
+import pandas as pd
+import pytest
+
+from app import run_logger
+from app.run_logger import (
+    RunWriteError, load_run, load_run_artifact, pop_write_errors, save_run, wait_for_run,
+)
+
+
+def test_spara_och_läs(run_store):
+    df = pd.DataFrame({"Företag": ["A", "B"], "Effektivitet": [0.9, 1.0]})
+    run_id = save_run("DEA", {"rts": "crs"}, df, artefakter={"peers": pd.DataFrame({"rad": [0]})})
+    assert wait_for_run(run_id)
+    params, lästa = load_run(run_id)
+    assert params["parametrar"] == {"rts": "crs"} and params["artefakter"] == ["peers"]
+    assert lästa["Effektivitet"].tolist() == [0.9, 1.0]
+    assert load_run_artifact(run_id, "peers")["rad"].tolist() == [0]
+    assert load_run_artifact(run_id, "saknas") is None
+
+
+def test_skrivaren_behåller_inga_poster(run_store):
+    for _ in range(5):
+        run_id = save_run("DEA", {}, pd.DataFrame({"x": [1.0]}))
+    run_logger.flush_runs()
+    assert wait_for_run(run_id)
+    assert run_logger._writer._done == {} and run_logger._writer._errors == {}
+
+
+def test_skrivfel_rapporteras_en_gång(run_store):
+    # Blandade typer i en objektkolumn kan inte skrivas som feather
+    run_id = save_run("DEA", {}, pd.DataFrame({"x": [1.0, "OUTLIER"]}))
+    with pytest.raises(RunWriteError):
+        wait_for_run(run_id)
+    assert run_logger._writer._errors == {}
+    assert wait_for_run(run_id) is False
+
+    annat = save_run("DEA", {}, pd.DataFrame({"x": [1.0, "OUTLIER"]}))
+    run_logger.flush_runs()
+    assert [r for r, _ in pop_write_errors([annat])] == [annat]
+    assert pop_write_errors([annat]) == []
+
+
+def test_skrivfel_hämtas_bara_av_egna_körningar(run_store):
+    """Felen är processgemensamma; en session ser bara fel för de run_id den skapat."""
+    min = save_run("DEA", {}, pd.DataFrame({"x": [1.0, "OUTLIER"]}))
+    annans = save_run("DEA", {}, pd.DataFrame({"x": [1.0, "OUTLIER"]}))
+    lyckad = save_run("DEA", {}, pd.DataFrame({"x": [1.0]}))
+    run_logger.flush_runs()
+
+    assert run_logger.pending_runs() == set()
+    assert [r for r, _ in pop_write_errors({min, lyckad})] == [min]
+    # Ägaren till den andra körningen får fortfarande sitt fel
+    with pytest.raises(RunWriteError):
+        wait_for_run(annans)
+
+
+def test_skrivfelen_är_begränsade(run_store, monkeypatch):
+    monkeypatch.setattr(run_logger, "MAX_SKRIVFEL", 2)
+    run_ids = [save_run("DEA", {}, pd.DataFrame({"x": [1.0, "OUTLIER"]})) for _ in range(4)]
+    run_logger.flush_runs()
+    assert list(run_logger._writer._errors) == run_ids[-2:]
+    assert [r for r, _ in pop_write_errors(run_ids)] == run_ids[-2:]
+
+
+def test_överlämning_utan_kopior(run_store, monkeypatch):
+    """Ramen lämnas över som den är; skrivaren ändrar inte anroparens prestanda-dict."""
+    prestanda = {"totalt_s": 1.0, "steg": [{"steg": "lösare", "sekunder": 1.0}]}
+    df = pd.DataFrame({"Effektivitet": [0.5]})
+    överlämnat = []
+    submit = run_logger._writer.submit
+    monkeypatch.setattr(run_logger._writer, "submit", lambda *args: (överlämnat.append(args), submit(*args)))
+
+    run_id = save_run("DEA", {}, df, prestanda=prestanda)
+    wait_for_run(run_id)
+
+    assert överlämnat[0][2] is df
+    assert prestanda == {"totalt_s": 1.0, "steg": [{"steg": "lösare", "sekunder": 1.0}]}
+    params, lästa = load_run(run_id)
+    assert lästa["Effektivitet"].tolist() == [0.5]
+    assert params["prestanda"]["steg"][-1]["steg"] == "save_run (skrivning)"
@@ -0,0 +1,53 @@
+# tests/test_scenario_grid.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.scenario_grid import _SuperEffektivitetLP, procentsteg, run_scenario_grid, scenario_grid
+
+
+def test_procentsteg_inkluderar_ändpunkter():
+    assert procentsteg(-20, 20, 5) == [-20, -15, -10, -5, 0, 5, 10, 15, 20]
+
+
+def test_scenario_grid_räknar_om_totex():
+    grid = scenario_grid({"OPEXp": 100.0, "CAPEX": 50.0, "TOTEX": 150.0}, {"OPEXp": [-10, 0, 10]})
+    assert grid["OPEXp"].tolist() == pytest.approx([90.0, 100.0, 110.0])
+    assert grid["TOTEX"].tolist() == pytest.approx([140.0, 150.0, 160.0])
+
+
+def test_nollscenario_matchar_körningen(dea_körning):
+    """0 % förändring ska ge samma supereffektivitet som DEA-körningen (pulp/CBC)."""
+    _, _, körning = dea_körning
+    icke_outliers = körning[~körning["is_outlier"]]
+    for företag, lagrad in zip(icke_outliers["Företag"], icke_outliers["Supereffektivitet"]):
+        grid = run_scenario_grid(körning, företag, {"OPEXp": [0]}, rts="crs", n_jobs=1)
+        assert grid["Supereffektivitet"].iloc[0] == pytest.approx(float(lagrad), abs=1e-6), företag
+
+
+def test_lp_mot_pulp_med_olika_skalor():
+    """Kolumner i storleksordningarna 1e0–1e7 i samma LP ska ge pulp/CBC:s optimum."""
+    from pulp import LpMinimize, LpProblem, LpVariable, lpSum, value, PULP_CBC_CMD
+
+    rng = np.random.default_rng(3)
+    n = 40
+    X = rng.uniform(1, 10, (n, 2)) * [1e3, 1e6]
+    Y = rng.uniform(1, 10, (n, 3)) * [1e0, 1e5, 1e7]
+    for rts in ("crs", "vrs"):
+        lp = _SuperEffektivitetLP(X[1:], Y[1:], rts)
+        for i in range(1, 6):
+            modell = LpProblem("DEA", LpMinimize)
+            theta = LpVariable("theta", lowBound=0)
+            lambdas = [LpVariable(f"l{j}", lowBound=0) for j in range(n)]
+            modell += theta
+            andra = [j for j in range(1, n) if j != i]
+            for r in range(Y.shape[1]):
+                modell += lpSum(lambdas[j] * Y[j, r] for j in andra) >= Y[i, r]
+            for k in range(X.shape[1]):
+                modell += lpSum(lambdas[j] * X[j, k] for j in andra) <= theta * X[i, k]
+            if rts == "vrs":
+                modell += lpSum(lambdas[j] for j in andra) == 1
+            modell.solve(PULP_CBC_CMD(msg=False))
+            förväntat = value(theta) if modell.status == 1 else np.inf
+            assert lp.lös(X[i], Y[i], utesluten=i - 1) == pytest.approx(förväntat, rel=1e-6)
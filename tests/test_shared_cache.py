@@ -0,0 +1,120 @@
+# tests/test_shared_cache.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.shared_cache import SharedLRU
+
+
+def _array(kb):
+    return np.zeros(kb * 1000, dtype=np.uint8)
+
+
+def test_lru_efter_antal_poster():
+    cache = SharedLRU("test", max_bytes=10**9, max_poster=2)
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    cache.get_or_load("a", lambda: pytest.fail("a ska vara cachad"))  # a senast använd
+    cache.get_or_load("c", lambda: 3)  # b kastas ut
+
+    laddade = []
+    assert cache.get_or_load("b", lambda: laddade.append("b") or 2) == 2
+    assert laddade == ["b"]
+    assert cache.statistik()["poster"] == 2
+
+
+def test_lru_efter_storlek():
+    cache = SharedLRU("test", max_bytes=25_000, max_poster=10)
+    for nyckel in "abc":
+        cache.get_or_load(nyckel, lambda: _array(10), kopia=False)
+    # 30 kB > 25 kB: den äldsta (a) kastas ut
+    assert cache._bytes == 20_000
+    assert list(cache._poster) == ["b", "c"]
+
+
+def test_för_stor_post_lämnas_ut_men_behålls_inte():
+    cache = SharedLRU("test", max_bytes=25_000, max_poster=10)
+    cache.get_or_load("liten", lambda: _array(10), kopia=False)
+    stor = cache.get_or_load("stor", lambda: _array(30), kopia=False)
+
+    assert stor.nbytes == 30_000
+    assert list(cache._poster) == ["liten"]
+    assert cache._bytes == 10_000
+
+
+def test_en_laddning_för_samtidiga_anrop():
+    cache = SharedLRU("test", max_bytes=10**9, max_poster=4)
+    anrop = []
+    startad, släpp = threading.Event(), threading.Event()
+
+    def laddare():
+        anrop.append(threading.get_ident())
+        startad.set()
+        släpp.wait(5)
+        return pd.DataFrame({"x": [1, 2, 3]})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        svar = [pool.submit(cache.get_or_load, "nyckel", laddare) for _ in range(8)]
+        assert startad.wait(5)
+        time.sleep(0.2)  # låt övriga trådar hinna köa på nyckelns lås
+        släpp.set()
+        resultat = [s.result(timeout=5) for s in svar]
+
+    assert len(anrop) == 1
+    assert all(r["x"].tolist() == [1, 2, 3] for r in resultat)
+    statistik = cache.statistik()
+    assert (statistik["missar"], statistik["träffar"]) == (1, 7)
+
+
+def test_olika_nycklar_laddas_parallellt():
+    cache = SharedLRU("test", max_bytes=10**9, max_poster=4)
+    barriär = threading.Barrier(2, timeout=5)
+
+    def laddare():
+        barriär.wait()  # går bara igenom om båda laddningarna pågår samtidigt
+        return 1
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        svar = [pool.submit(cache.get_or_load, nyckel, laddare) for nyckel in ("a", "b")]
+        assert [s.result(timeout=10) for s in svar] == [1, 1]
+
+
+def test_misslyckad_laddning_sparas_inte():
+    cache = SharedLRU("test", max_bytes=10**9, max_poster=4)
+
+    def fel():
+        raise OSError("läsfel")
+
+    with pytest.raises(OSError):
+        cache.get_or_load("a", fel)
+    assert cache.get_or_load("a", lambda: 5) == 5
+    assert cache.statistik()["poster"] == 1
+    assert not cache._laddar
+
+
+def test_kopia_skyddar_cachad_dataframe():
+    cache = SharedLRU("test", max_bytes=10**9, max_poster=4)
+    df = pd.DataFrame({"x": [1.0, 2.0]})
+    df.attrs["run_id"] = "dea_1"
+    cache.get_or_load("df", lambda: df)
+
+    första = cache.get_or_load("df", lambda: None)
+    första["y"] = 0.0
+    första.attrs["run_id"] = "ändrad"
+
+    andra = cache.get_or_load("df", lambda: None)
+    assert list(andra.columns) == ["x"]
+    assert andra.attrs["run_id"] == "dea_1"
+    assert cache.get_or_load("df", lambda: None, kopia=False) is df
+
+
+def test_rensa():
+    cache = SharedLRU("test", max_bytes=10**9, max_poster=4)
+    cache.get_or_load("a", lambda: _array(1))
+    cache.rensa()
+    assert cache.statistik()["poster"] == 0 and cache._bytes == 0
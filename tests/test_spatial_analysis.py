@@ -0,0 +1,109 @@
+# tests/test_spatial_analysis.py
+
+import numpy as np
+import pytest
+
+from spatial_analysis import grannvikter, kontiguitetsgrannar, lisa, morans_i
+
+libpysal = pytest.importorskip("libpysal")
+esda = pytest.importorskip("esda")
+
+
+@pytest.fixture
+def punkter():
+    """6 × 6 rutnät med 10 km mellan punkterna och lite brus (inga lika avstånd vid knn)."""
+    rng = np.random.default_rng(1)
+    x, y = np.meshgrid(np.arange(6) * 10000.0, np.arange(6) * 10000.0)
+    return np.column_stack([x.ravel(), y.ravel()]) + rng.uniform(-1500, 1500, (36, 2))
+
+
+@pytest.fixture
+def rutor():
+    """5 × 5 rutor om 10 km (delade kanter och hörn)."""
+    from shapely.geometry import box
+
+    return [box(c * 10000, r * 10000, (c + 1) * 10000, (r + 1) * 10000) for r in range(5) for c in range(5)]
+
+
+@pytest.fixture
+def värden(punkter):
+    """Rumsligt mönster (trend i x) plus brus."""
+    rng = np.random.default_rng(2)
+    return punkter[:, 0] / 10000 + rng.normal(0, 1, len(punkter))
+
+
+def _som_libpysal(w):
+    """Libpysal-vikter som tät matris i samma radordning."""
+    return w.sparse.toarray()
+
+
+@pytest.mark.parametrize("k", [1, 4, 8])
+def test_knn_som_libpysal(punkter, k):
+    egen = grannvikter(punkter, "knn", k=k).toarray()
+    np.testing.assert_array_equal(egen, _som_libpysal(libpysal.weights.KNN(punkter, k=k, silence_warnings=True)))
+
+
+@pytest.mark.parametrize("gräns", [12000, 25000])
+def test_avståndsband_som_libpysal(punkter, gräns):
+    egen = grannvikter(punkter, "distanceband", distance_threshold=gräns).toarray()
+    förväntat = libpysal.weights.DistanceBand(punkter, threshold=gräns, binary=True, silence_warnings=True)
+    np.testing.assert_array_equal(egen, _som_libpysal(förväntat))
+
+
+def test_avståndsviktning_som_libpysal(punkter):
+    egen = grannvikter(punkter, "distanceband", distance_threshold=25000, avståndsviktning=True).toarray()
+    förväntat = libpysal.weights.DistanceBand(punkter, threshold=25000, binary=False, alpha=-1.0, silence_warnings=True)
+    np.testing.assert_allclose(egen, _som_libpysal(förväntat), rtol=1e-12)
+
+
+@pytest.mark.parametrize("typ, klass", [("queen", "Queen"), ("rook", "Rook")])
+def test_kontiguitet_som_libpysal(rutor, typ, klass):
+    import geopandas as gpd
+
+    kontiguitet = kontiguitetsgrannar(np.array(rutor, dtype=object), typ)
+    centroider = np.array([[g.centroid.x, g.centroid.y] for g in rutor])
+    egen = grannvikter(centroider, typ, kontiguitet=kontiguitet).toarray()
+    förväntat = getattr(libpysal.weights, klass).from_dataframe(
+        gpd.GeoDataFrame(geometry=rutor), use_index=False, silence_warnings=True
+    )
+    np.testing.assert_array_equal(egen, _som_libpysal(förväntat))
+
+
+def test_morans_i_som_esda(punkter, värden):
+    w = grannvikter(punkter, "knn", k=4)
+    egen = morans_i(värden, w, permutationer=499, seed=0)
+
+    wl = libpysal.weights.KNN(punkter, k=4)
+    wl.transform = "r"
+    förväntat = esda.Moran(värden, wl, permutations=499)
+
+    assert egen["I"] == pytest.approx(förväntat.I, abs=1e-12)
+    assert egen["EI"] == pytest.approx(förväntat.EI, abs=1e-12)
+    # Tydlig trend: båda permutationstesten förkastar
+    assert egen["p_sim"] <= 0.01 and förväntat.p_sim <= 0.01
+    assert egen["z_sim"] > 3
+
+
+def test_morans_i_utan_mönster(punkter):
+    """Slumpvärden: p_sim ska inte vara signifikant och I nära EI."""
+    rng = np.random.default_rng(3)
+    w = grannvikter(punkter, "knn", k=4)
+    resultat = morans_i(rng.normal(size=len(punkter)), w, permutationer=999, seed=0)
+    assert resultat["p_sim"] > 0.05
+    assert abs(resultat["I"] - resultat["EI"]) < 0.2
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning:esda.*")
+def test_lisa_som_esda(punkter, värden):
+    w = grannvikter(punkter, "knn", k=4)
+    egen = lisa(värden, w, permutationer=999, seed=0)
+
+    wl = libpysal.weights.KNN(punkter, k=4)
+    wl.transform = "r"
+    förväntat = esda.Moran_Local(värden, wl, permutations=999, seed=0)
+
+    np.testing.assert_allclose(egen["Ii"], förväntat.Is, rtol=1e-10)
+    kvadranter = {1: "HH", 2: "LH", 3: "LL", 4: "HL"}
+    assert list(egen["kvadrant"]) == [kvadranter[q] for q in förväntat.q]
+    # Permutationerna skiljer sig; p-värdena ska ändå ligga nära varandra
+    assert np.abs(egen["p_sim"].to_numpy() - förväntat.p_sim).max() < 0.1
@@ -0,0 +1,40 @@
+# tests/test_vector_tiles.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from app.vector_tiles import build_vector_tiles, ensure_vector_tiles, tiles_are_current
+
+
+def test_samtidiga_byggen_ger_en_hel_uppsättning(geometrilager, tmp_path):
+    tile_dir = str(tmp_path / "static" / "tiles")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        antal = list(pool.map(lambda _: build_vector_tiles(geometrilager, tile_dir, 4, 8), range(4)))
+
+    assert len(set(antal)) == 1 and antal[0] > 0
+    assert tiles_are_current(geometrilager, tile_dir)
+    skrivna = sum(len(filer) for _, _, filer in os.walk(tile_dir) if filer) - 1  # minus tiles.yaml
+    assert skrivna == antal[0]
+    # Inga kvarlämnade temporära kataloger
+    assert os.listdir(tmp_path / "static") == ["tiles"]
+
+
+def test_inga_tiles_skriver_ändå_metadata(geometrilager, tmp_path):
+    tile_dir = str(tmp_path / "tiles")
+    assert build_vector_tiles(geometrilager, tile_dir, min_zoom=5, max_zoom=4) == 0
+    with open(os.path.join(tile_dir, "tiles.yaml")) as f:
+        assert yaml.safe_load(f)["lager"] == "omraden"
+
+
+def test_ensure_bygger_bara_när_lagret_ändrats(geometrilager, tmp_path, monkeypatch):
+    import app.vector_tiles as vt
+
+    tile_dir = str(tmp_path / "tiles")
+    anrop = []
+    original = vt.build_vector_tiles
+    monkeypatch.setattr(vt, "build_vector_tiles", lambda *a, **k: anrop.append(1) or original(*a, **k))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: ensure_vector_tiles(geometrilager, tile_dir), range(4)))
+    assert len(anrop) == 1